@@ -1,15 +1,34 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
-from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-import numpy as np
-import pandas as pd
-from datetime import datetime
+from startup import StartupReport, LazyComponent
+
+startup_report = StartupReport()
+
+with startup_report.phase('import web framework'):
+    from flask import Flask, render_template, request, jsonify, session, redirect, url_for, g
+    from flask_sqlalchemy import SQLAlchemy
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from sqlalchemy.exc import IntegrityError
+    from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
+    from werkzeug.security import generate_password_hash, check_password_hash
+from datetime import datetime, date, timedelta, timezone
+from zoneinfo import ZoneInfo
+from itertools import islice
+from collections import deque
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import threading
+import time
+import hmac
 import json
 import os
 from dotenv import load_dotenv
-from deep_learning.food_recommender import FoodRecommender
-from deep_learning.nutrition_calculator import NutritionCalculator
+import sqlite3
+from deep_learning.recommendation_cache import RecommendationCache
+from database.migrations import apply_pragmas, migrate
+from database.write_behind import WriteBehindQueue
+from deep_learning.artifact_loader import ArtifactLoader
+from instrumentation import registry, span, record_span, start_request, request_spans, finish_request, \
+    server_timing, SlowRequestProfiler
+from config import Config
 import logging
 
 # Load environment variables
@@ -17,10 +36,101 @@ load_dotenv()
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-here')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///food_recommendation.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = Config.SQLALCHEMY_DATABASE_URI
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 db = SQLAlchemy(app)
+
+@event.listens_for(Engine, 'connect')
+def tune_sqlite_connection(dbapi_connection, connection_record):
+    """WAL, relaxed fsync, a larger page cache and a busy timeout for every SQLite connection"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        apply_pragmas(dbapi_connection, {
+            'journal_mode': 'WAL',
+            'synchronous': Config.SQLITE_SYNCHRONOUS,
+            'cache_size': -Config.SQLITE_CACHE_SIZE_KB,
+            'busy_timeout': Config.SQLITE_BUSY_TIMEOUT_MS,
+            'temp_store': 'MEMORY'
+        })
+# Per-process request and write timings, reported by /write_stats. With WAL,
+# readers never wait; a writer waits for the write lock (up to busy_timeout)
+# in its first INSERT/UPDATE/DELETE, so time in write statements is where
+# lock contention shows up.
+db_timing = {'requests': 0, 'request_seconds': 0.0, 'write_statements': 0, 'write_seconds': 0.0}
+db_timing_lock = threading.Lock()
+
+# Prometheus metrics served on /metrics (see instrumentation)
+REQUEST_SECONDS = registry.histogram(
+    'foodai_http_request_duration_seconds', 'Request latency by endpoint', ['endpoint', 'method', 'status']
+)
+STATEMENT_SECONDS = registry.histogram(
+    'foodai_db_statement_duration_seconds', 'SQLAlchemy statement execution time', ['kind']
+)
+profiler = SlowRequestProfiler(
+    Config.PROFILE_DIR,
+    threshold_ms=Config.PROFILE_SLOW_MS,
+    interval_ms=Config.PROFILE_INTERVAL_MS,
+    enabled=Config.PROFILE_SLOW_REQUESTS
+)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info['statement_started'] = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_statement_time(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('statement_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    record_span('db_query', elapsed)
+    if statement.lstrip().upper().startswith('SELECT'):
+        STATEMENT_SECONDS.observe(elapsed, kind='read')
+        return
+    STATEMENT_SECONDS.observe(elapsed, kind='write')
+    with db_timing_lock:
+        db_timing['write_statements'] += 1
+        db_timing['write_seconds'] += elapsed
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    start_request()
+    profiler.begin()
+
+@app.after_request
+def add_server_timing(response):
+    g.response_status = response.status_code
+    if Config.SERVER_TIMING_HEADER:
+        response.headers['Server-Timing'] = server_timing(
+            request_spans(), time.perf_counter() - g.request_started
+        )
+    return response
+
+@app.teardown_request
+def record_request_time(exc=None):
+    started = g.pop('request_started', None)
+    spans = finish_request()
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    with db_timing_lock:
+        db_timing['requests'] += 1
+        db_timing['request_seconds'] += elapsed
+    
+    # Unmatched URLs share one label so scanners cannot blow up the series count
+    endpoint = request.endpoint or 'unmatched'
+    REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, method=request.method,
+                            status=g.get('response_status', 500))
+    if profiler.end(endpoint, elapsed):
+        logger.info(f"Span breakdown of slow {endpoint}: "
+                    + ', '.join(f'{name}={seconds * 1000:.1f}ms' for name, seconds in spans.items()))
+
+def json_response(payload):
+    """jsonify, timed as the json_serialization span"""
+    with span('json_serialization'):
+        return jsonify(payload)
+
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
@@ -29,9 +139,138 @@ login_manager.login_view = 'login'
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load models
-recommender = FoodRecommender()
-nutrition_calc = NutritionCalculator()
+# Load models lazily: the catalog and numeric stack are only imported on first use
+def build_recommender():
+    """Import the recommender stack, load the food catalog and any neural model"""
+    with startup_report.phase('import deep_learning.food_recommender'):
+        from deep_learning.food_recommender import FoodRecommender
+    with startup_report.phase('load food catalog'):
+        if Config.CATALOG_SOURCE == 'db':
+            store = catalog_store.get()
+            # Only the first process to start against an empty catalog loads the CSV
+            store.seed_csv(Config.FOOD_DATA_PATH)
+            version, foods = store.load_catalog()
+            recommender = FoodRecommender(food_data=foods, catalog_version=version)
+        else:
+            recommender = FoodRecommender(data_path=Config.FOOD_DATA_PATH)
+    recommender.meal_planner.time_budget_ms = Config.MEAL_PLAN_TIME_BUDGET_MS
+    
+    # Neural re-ranking prefers the NumPy serving export, which avoids importing TensorFlow
+    neural_model = None
+    if Config.NEURAL_RERANK and os.path.exists(Config.SERVING_MODEL_PATH):
+        with startup_report.phase('load serving model'):
+            from deep_learning.serving import NumpyFoodModel
+            neural_model = NumpyFoodModel(Config.SERVING_MODEL_PATH)
+    elif Config.NEURAL_RERANK and os.path.exists(Config.MODEL_PATH):
+        with startup_report.phase('load keras model'):
+            from deep_learning.model import FoodRecommendationModel
+            neural_model = FoodRecommendationModel()
+            neural_model.load_model(Config.MODEL_PATH, Config.SCALER_PATH, Config.ENCODER_PATH)
+    
+    if neural_model is not None:
+        recommender.model = neural_model
+        recommender.rerank_weight = Config.RERANK_WEIGHT
+        
+        if os.path.exists(Config.EMBEDDINGS_PATH):
+            from deep_learning.embedding_index import EmbeddingIndex
+            recommender.set_embedding_index(EmbeddingIndex.load(Config.EMBEDDINGS_PATH))
+    
+    return recommender
+
+def build_nutrition_calculator():
+    """Import and create the nutrition calculator"""
+    from deep_learning.nutrition_calculator import NutritionCalculator
+    return NutritionCalculator()
+
+def build_catalog_db():
+    """Pooled DatabaseHandler on the app database, for food catalog queries"""
+    from database.db_handler import DatabaseHandler
+    # db.engine needs an app context, which warm-up threads do not have
+    with app.app_context():
+        handler = DatabaseHandler(db.engine.url.database)
+    # Make sure the foods table and its FTS index exist before the first search
+    with handler.get_connection() as conn:
+        migrate(conn)
+    return handler
+
+def build_catalog_store():
+    """Versioned food catalog store, sharing the catalog_db connection pool"""
+    from database.catalog_store import CatalogStore
+    return CatalogStore(pool=catalog_db.get().pool)
+
+recommender = LazyComponent('recommender', build_recommender, startup_report)
+nutrition_calc = LazyComponent('nutrition_calculator', build_nutrition_calculator, startup_report)
+catalog_db = LazyComponent('catalog_db', build_catalog_db, startup_report)
+catalog_store = LazyComponent('catalog_store', build_catalog_store, startup_report)
+catalog_sync_lock = threading.Lock()
+catalog_synced_at = 0.0
+
+def artifact_paths():
+    """Files the recommender is built from
+    
+    With the catalog in the database, dataset changes are merged once with
+    `python -m database.catalog_store load` and reach every worker through
+    the catalog sync, so only the model files are watched.
+    """
+    paths = [] if Config.CATALOG_SOURCE == 'db' else [Config.FOOD_DATA_PATH]
+    if Config.NEURAL_RERANK:
+        paths += [Config.SERVING_MODEL_PATH, Config.MODEL_PATH, Config.SCALER_PATH,
+                  Config.ENCODER_PATH, Config.EMBEDDINGS_PATH]
+    return paths
+
+def reload_recommender():
+    """Rebuild the recommender from the current artifacts and swap it in"""
+    updated = build_recommender()
+    with catalog_sync_lock:
+        recommender.swap(updated)
+        recommendation_cache.clear()
+
+artifact_loader = ArtifactLoader(
+    artifact_paths(), reload_recommender, interval=Config.ARTIFACT_POLL_INTERVAL, name='recommender-artifacts'
+)
+
+def get_recommender():
+    """The recommender, first applying catalog edits from other processes when due
+    
+    A sync swaps in an updated copy (see FoodRecommender.sync_catalog), so
+    requests already holding the previous recommender are not affected.
+    """
+    global catalog_synced_at
+    if Config.ARTIFACT_RELOAD:
+        artifact_loader.ensure_started()
+    current = recommender.get()
+    if Config.CATALOG_SOURCE != 'db' or time.monotonic() - catalog_synced_at < Config.CATALOG_SYNC_INTERVAL:
+        return current
+    
+    # One thread syncs; the others keep serving the current catalog meanwhile
+    if not catalog_sync_lock.acquire(blocking=False):
+        return current
+    try:
+        current = recommender.get()
+        updated = current.sync_catalog(catalog_store.get())
+        if updated is not current:
+            recommender.swap(updated)
+            recommendation_cache.clear()
+            logger.info(f"Food catalog updated to version {updated.catalog_version} ({len(updated.catalog)} foods)")
+        return updated
+    except Exception as e:
+        logger.error(f"Error syncing food catalog: {str(e)}")
+        return current
+    finally:
+        catalog_synced_at = time.monotonic()
+        catalog_sync_lock.release()
+
+# Recent /search_foods latencies (ms) for the p99 target
+search_latencies = deque(maxlen=1000)
+
+if Config.WARMUP_ON_START:
+    recommender.warm_up()
+
+recommendation_cache = RecommendationCache(
+    max_size=Config.RECOMMENDATION_CACHE_SIZE,
+    ttl=Config.CACHE_DEFAULT_TIMEOUT,
+    enabled=Config.CACHE_TYPE != 'null'
+)
 
 # Database Models
 class User(UserMixin, db.Model):
@@ -54,7 +293,15 @@ class User(UserMixin, db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+# Logins and registration look users up case-insensitively
+db.Index('ix_user_username_lower', db.func.lower(User.username))
+
 class UserFoodLog(db.Model):
+    __table_args__ = (
+        # Per-user listings ordered by time (dashboard, analysis windows)
+        db.Index('ix_user_food_log_user_id_timestamp', 'user_id', 'timestamp'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     food_name = db.Column(db.String(200), nullable=False)
@@ -73,6 +320,187 @@ class UserPreferences(db.Model):
     disliked_foods = db.Column(db.String(200))
     favorite_foods = db.Column(db.String(200))
 
+class UserDailyNutrition(db.Model):
+    """Per-user, per-day totals of UserFoodLog, updated together with every log write"""
+    __table_args__ = {'sqlite_with_rowid': False}
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    calories = db.Column(db.Float, nullable=False, default=0)
+    protein = db.Column(db.Float, nullable=False, default=0)
+    carbs = db.Column(db.Float, nullable=False, default=0)
+    fat = db.Column(db.Float, nullable=False, default=0)
+    meal_count = db.Column(db.Integer, nullable=False, default=0)
+
+def record_daily_intake(user_id, calories=0, protein=0, carbs=0, fat=0, meal_count=1, day=None):
+    """Add logged nutrition to the user's rollup row for day (today, UTC, by default)
+    
+    The increment is a single UPDATE so concurrent writers cannot lose each
+    other's totals; the row is inserted on the day's first log. Nothing is
+    committed here, so the rollup lands in the same transaction as the logs.
+    Raises RuntimeError if neither the update nor the insert took effect.
+    """
+    day = day or datetime.utcnow().date()
+    totals = {
+        'calories': calories or 0, 'protein': protein or 0, 'carbs': carbs or 0,
+        'fat': fat or 0, 'meal_count': meal_count
+    }
+    increment = {
+        getattr(UserDailyNutrition, field): getattr(UserDailyNutrition, field) + value
+        for field, value in totals.items()
+    }
+    
+    for _ in range(2):
+        updated = UserDailyNutrition.query.filter_by(user_id=user_id, day=day)\
+            .update(increment, synchronize_session=False)
+        if updated:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(UserDailyNutrition(user_id=user_id, day=day, **totals))
+            return
+        except IntegrityError:
+            # Another request created today's row first; add to it instead
+            continue
+    
+    # The row kept appearing and disappearing under us; failing keeps the
+    # logs and the rollup in step, as the caller's transaction rolls back
+    raise RuntimeError(f"Could not record daily intake for user {user_id} on {day}")
+
+def rebuild_daily_nutrition(user_id=None):
+    """Recompute the daily rollups from UserFoodLog (backfill, or after bulk log edits)"""
+    day = db.func.date(UserFoodLog.timestamp)
+    query = db.session.query(
+        UserFoodLog.user_id,
+        day,
+        db.func.coalesce(db.func.sum(UserFoodLog.calories), 0),
+        db.func.coalesce(db.func.sum(UserFoodLog.protein), 0),
+        db.func.coalesce(db.func.sum(UserFoodLog.carbs), 0),
+        db.func.coalesce(db.func.sum(UserFoodLog.fat), 0),
+        db.func.count(UserFoodLog.id)
+    ).group_by(UserFoodLog.user_id, day)
+    existing = UserDailyNutrition.query
+    if user_id is not None:
+        query = query.filter(UserFoodLog.user_id == user_id)
+        existing = existing.filter_by(user_id=user_id)
+    
+    existing.delete(synchronize_session=False)
+    for log_user_id, log_day, calories, protein, carbs, fat, meal_count in query:
+        db.session.add(UserDailyNutrition(
+            user_id=log_user_id,
+            day=log_day if isinstance(log_day, date) else date.fromisoformat(log_day),
+            calories=calories,
+            protein=protein,
+            carbs=carbs,
+            fat=fat,
+            meal_count=meal_count
+        ))
+    db.session.commit()
+
+def build_food_log(user_id, entry, meal_type=None):
+    """UserFoodLog from a request entry; raises KeyError/ValueError on bad input"""
+    timestamp = datetime.fromisoformat(entry['timestamp']) if entry.get('timestamp') else datetime.utcnow()
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return UserFoodLog(
+        user_id=user_id,
+        food_name=entry.get('food_name') or entry['name'],
+        calories=float(entry['calories']),
+        protein=float(entry.get('protein') or 0),
+        carbs=float(entry.get('carbs') or 0),
+        fat=float(entry.get('fat') or 0),
+        meal_type=meal_type or entry.get('meal_type', 'other'),
+        timestamp=timestamp
+    )
+
+def write_food_logs(batch):
+    """Insert [(user_id, [UserFoodLog, ...]), ...] and their rollups in one transaction"""
+    totals = {}
+    for user_id, logs in batch:
+        for log in logs:
+            db.session.add(log)
+            day_totals = totals.setdefault((user_id, log.timestamp.date()), {
+                'calories': 0, 'protein': 0, 'carbs': 0, 'fat': 0, 'meal_count': 0
+            })
+            for field in ('calories', 'protein', 'carbs', 'fat'):
+                day_totals[field] += getattr(log, field) or 0
+            day_totals['meal_count'] += 1
+    
+    for (user_id, day), day_totals in totals.items():
+        record_daily_intake(user_id, day=day, **day_totals)
+    db.session.commit()
+
+def write_food_log_batch(batch):
+    """write_food_logs for the write-behind thread, which has no request context"""
+    with app.app_context():
+        try:
+            write_food_logs(batch)
+        except Exception:
+            db.session.rollback()
+            raise
+
+# Optional group commit of log writes from many requests (see WriteBehindQueue for durability)
+write_behind = WriteBehindQueue(
+    write_food_log_batch,
+    flush_interval_ms=Config.WRITE_BEHIND_INTERVAL_MS,
+    max_batch=Config.WRITE_BEHIND_MAX_BATCH
+) if Config.WRITE_BEHIND_ENABLED else None
+
+def save_food_logs(user_id, logs):
+    """Persist a user's new logs; True once committed, False if only queued"""
+    if write_behind is None:
+        write_food_logs([(user_id, logs)])
+        return True
+    
+    try:
+        future = write_behind.submit((user_id, logs))
+        if Config.WRITE_BEHIND_WAIT:
+            future.result(timeout=Config.WRITE_BEHIND_TIMEOUT)
+            return True
+    except FutureTimeoutError:
+        # The logs stay queued and are still written; reporting an error
+        # here would make the client retry and log them twice
+        logger.warning(f"Write-behind commit for user {user_id} still pending after "
+                       f"{Config.WRITE_BEHIND_TIMEOUT}s; reporting the logs as queued")
+    except Exception as e:
+        # The group commit rolled these logs back (or the queue is shut down),
+        # so nothing was written; write them in this request instead
+        logger.warning(f"Write-behind commit for user {user_id} failed ({str(e)}); writing synchronously")
+        write_food_logs([(user_id, logs)])
+        return True
+    return False
+
+def iter_food_log_chunks(user_id, since, chunk_size=1000):
+    """Yield the user's food logs since a datetime as lists of row tuples, chunk_size at a time"""
+    rows = db.session.query(
+        UserFoodLog.timestamp,
+        UserFoodLog.food_name,
+        UserFoodLog.calories,
+        UserFoodLog.protein,
+        UserFoodLog.carbs,
+        UserFoodLog.fat,
+        UserFoodLog.meal_type
+    ).filter(
+        UserFoodLog.user_id == user_id,
+        UserFoodLog.timestamp >= since
+    ).yield_per(chunk_size)
+    
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def load_user_preferences(user_id):
+    """User preferences as a dict of lists (empty lists if none are stored)"""
+    preferences = UserPreferences.query.filter_by(user_id=user_id).first()
+    fields = ['preferred_cuisines', 'allergies', 'disliked_foods', 'favorite_foods']
+    return {
+        field: json.loads(getattr(preferences, field)) if preferences and getattr(preferences, field) else []
+        for field in fields
+    }
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -180,7 +608,17 @@ def logout():
 @login_required
 def dashboard():
     # Get user's nutrition stats
-    daily_stats = nutrition_calc.calculate_daily_nutrition(current_user)
+    daily_stats = nutrition_calc.get().calculate_daily_nutrition(current_user)
+    
+    # Today's intake is a primary-key lookup on the daily rollup
+    today = db.session.get(UserDailyNutrition, (current_user.id, datetime.utcnow().date()))
+    intake = {
+        'today_intake': round(today.calories) if today else 0,
+        'protein_intake': round(today.protein) if today else 0,
+        'carbs_intake': round(today.carbs) if today else 0,
+        'fat_intake': round(today.fat) if today else 0,
+        'meal_count': today.meal_count if today else 0
+    }
     
     # Get recent food logs
     recent_foods = UserFoodLog.query.filter_by(user_id=current_user.id)\
@@ -189,6 +627,7 @@ def dashboard():
     return render_template('dashboard.html', 
                          user=current_user,
                          stats=daily_stats,
+                         intake=intake,
                          recent_foods=recent_foods)
 
 @app.route('/recommendations')
@@ -211,60 +650,87 @@ def profile():
 def get_recommendations():
     data = request.json
     meal_type = data.get('meal_type', 'all')
-    preferences = UserPreferences.query.filter_by(user_id=current_user.id).first()
-    
-    # Convert preferences to dict
-    user_prefs = {
-        'preferred_cuisines': json.loads(preferences.preferred_cuisines) if preferences.preferred_cuisines else [],
-        'allergies': json.loads(preferences.allergies) if preferences.allergies else [],
-        'disliked_foods': json.loads(preferences.disliked_foods) if preferences.disliked_foods else [],
-        'favorite_foods': json.loads(preferences.favorite_foods) if preferences.favorite_foods else []
-    }
+    user_prefs = load_user_preferences(current_user.id)
     
-    # Get recommendations
-    recommendations = recommender.get_recommendations(
-        user_id=current_user.id,
-        user_data=current_user,
-        meal_type=meal_type,
-        preferences=user_prefs
+    # Get recommendations, reusing the cached ranking when nothing changed
+    # (including the catalog and model artifacts the ranking came from)
+    active = get_recommender()
+    cache_key = recommendation_cache.make_key(
+        current_user.id, meal_type, current_user, user_prefs,
+        data_version=(active.catalog_version, artifact_loader.version)
     )
+    recommendations = recommendation_cache.get(cache_key)
+    if recommendations is None:
+        recommendations = active.get_recommendations(
+            user_id=current_user.id,
+            user_data=current_user,
+            meal_type=meal_type,
+            preferences=user_prefs
+        )
+        recommendation_cache.set(cache_key, recommendations)
     
     # Add is_favorite flag
     favorites = user_prefs['favorite_foods']
     for rec in recommendations:
         rec['is_favorite'] = rec['name'] in favorites
     
-    return jsonify({'recommendations': recommendations})
+    return json_response({'recommendations': recommendations})
 
 @app.route('/log_food', methods=['POST'])
 @login_required
 def log_food():
     data = request.json
-    food_log = UserFoodLog(
-        user_id=current_user.id,
-        food_name=data['food_name'],
-        calories=data['calories'],
-        protein=data.get('protein', 0),
-        carbs=data.get('carbs', 0),
-        fat=data.get('fat', 0),
-        meal_type=data.get('meal_type', 'other')
-    )
-    
-    db.session.add(food_log)
-    db.session.commit()
+    try:
+        committed = save_food_logs(current_user.id, [build_food_log(current_user.id, data)])
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error logging food: {str(e)}")
+        return jsonify({'error': str(e)}), 500
     
+    if not committed:
+        return jsonify({'message': 'Food log queued'}), 202
     return jsonify({'message': 'Food logged successfully'})
 
+@app.route('/log_food_batch', methods=['POST'])
+@login_required
+def log_food_batch():
+    """Log many entries in one transaction: {"entries": [{food_name, calories, ...}, ...]}"""
+    entries = (request.json or {}).get('entries')
+    if not entries or not isinstance(entries, list):
+        return jsonify({'error': 'No entries provided'}), 400
+    if len(entries) > Config.LOG_BATCH_MAX_ENTRIES:
+        return jsonify({'error': f'At most {Config.LOG_BATCH_MAX_ENTRIES} entries per batch'}), 400
+    
+    try:
+        logs = [build_food_log(current_user.id, entry) for entry in entries]
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid entry: {str(e)}'}), 400
+    
+    try:
+        committed = save_food_logs(current_user.id, logs)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error logging food batch: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    
+    if not committed:
+        return jsonify({'message': 'Food logs queued', 'logged': len(logs)}), 202
+    return jsonify({'message': 'Food logged successfully', 'logged': len(logs)})
+
 @app.route('/generate_meal_plan', methods=['POST'])
 @login_required
 def generate_meal_plan():
     data = request.json
     days = data.get('days', 7)
+    strategy = data.get('strategy', Config.MEAL_PLAN_STRATEGY)
     
-    meal_plan = recommender.generate_weekly_meal_plan(
+    meal_plan = get_recommender().generate_weekly_meal_plan(
         user_id=current_user.id,
         user_data=current_user,
-        days=days
+        days=days,
+        preferences=load_user_preferences(current_user.id),
+        strategy=strategy,
+        targets=nutrition_calc.get().calculate_daily_nutrition(current_user)
     )
     
     # Calculate nutrition summary
@@ -292,7 +758,7 @@ def generate_meal_plan():
     else:
         nutrition_summary = {}
 
-    return jsonify({
+    return json_response({
         'meal_plan': meal_plan,
         'nutrition_summary': nutrition_summary
     })
@@ -308,22 +774,13 @@ def save_day_plan():
             return jsonify({'error': 'No meal plan provided'}), 400
             
         # Iterate through meals in the plan (breakfast, lunch, dinner, snack)
-        for meal_type, meal_data in plan.items():
-            if not meal_data:
-                continue
-                
-            food_log = UserFoodLog(
-                user_id=current_user.id,
-                food_name=meal_data['name'],
-                calories=meal_data['calories'],
-                protein=meal_data['protein'],
-                carbs=meal_data['carbs'],
-                fat=meal_data['fat'],
-                meal_type=meal_type
-            )
-            db.session.add(food_log)
+        logs = [
+            build_food_log(current_user.id, meal_data, meal_type=meal_type)
+            for meal_type, meal_data in plan.items() if meal_data
+        ]
         
-        db.session.commit()
+        if logs and not save_food_logs(current_user.id, logs):
+            return jsonify({'message': 'Day plan queued'}), 202
         return jsonify({'message': 'Day plan logged successfully'})
         
     except Exception as e:
@@ -334,9 +791,26 @@ def save_day_plan():
 @app.route('/nutrition_analysis')
 @login_required
 def nutrition_analysis():
-    # Get nutrition analysis for the user
-    analysis = nutrition_calc.analyze_user_nutrition(current_user.id)
-    return jsonify(analysis)
+    # Analyse the last 30 days of logs, streamed in chunks
+    started = time.perf_counter()
+    # Days and meal hours are local to APP_TIMEZONE; logs are stored in naive UTC
+    local_zone = ZoneInfo(Config.APP_TIMEZONE)
+    today = datetime.now(local_zone).date()
+    since = datetime.combine(today - timedelta(days=29), datetime.min.time(), tzinfo=local_zone)
+    analysis = nutrition_calc.get().analyze_user_nutrition(
+        current_user,
+        iter_food_log_chunks(current_user.id, since.astimezone(timezone.utc).replace(tzinfo=None),
+                             Config.ANALYSIS_CHUNK_SIZE),
+        today=today,
+        tz=Config.APP_TIMEZONE
+    )
+    
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms > Config.ANALYSIS_LATENCY_TARGET_MS:
+        logger.warning(f"Nutrition analysis for user {current_user.id} took {elapsed_ms:.0f}ms "
+                       f"(target {Config.ANALYSIS_LATENCY_TARGET_MS}ms)")
+    analysis['elapsed_ms'] = round(elapsed_ms, 1)
+    return json_response(analysis)
 
 @app.route('/update_profile', methods=['POST'])
 @login_required
@@ -354,6 +828,7 @@ def update_profile():
         current_user.dietary_goal = data['dietary_goal']
     
     db.session.commit()
+    recommendation_cache.invalidate(current_user.id)
     
     return jsonify({'message': 'Profile updated successfully'})
 
@@ -381,9 +856,182 @@ def toggle_favorite():
         
     prefs.favorite_foods = json.dumps(favorites)
     db.session.commit()
+    recommendation_cache.invalidate(current_user.id)
     
     return jsonify({'message': f'Food {action} to favorites', 'action': action})
 
+@app.route('/cache_stats', methods=['GET'])
+@login_required
+def cache_stats():
+    return jsonify(recommendation_cache.stats())
+
+@app.route('/search_foods', methods=['GET'])
+@login_required
+def search_foods():
+    """Typeahead search over the food catalog: ?q=<text>&limit=<n>"""
+    query = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', 8, type=int), 50))
+    if len(query) < Config.SEARCH_MIN_CHARS:
+        return jsonify({'results': []})
+    
+    started = time.perf_counter()
+    rows = catalog_db.get().suggest_foods(query, limit=limit)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    search_latencies.append(elapsed_ms)
+    if elapsed_ms > Config.SEARCH_P99_TARGET_MS:
+        logger.warning(f"Food search for '{query}' took {elapsed_ms:.1f}ms "
+                       f"(p99 target {Config.SEARCH_P99_TARGET_MS}ms)")
+    
+    results = [{
+        'food_id': row['id'],
+        'name': row['name'],
+        'category': row['category'],
+        'cuisine': row['cuisine'],
+        'calories': row['calories'],
+        'protein': row['protein'],
+        'carbs': row['carbs'],
+        'fat': row['fat'],
+        'health_score': row['health_score'],
+        'prep_time': row['prep_time'],
+        'meal_suitability': row['meal_type']
+    } for row in rows]
+    return json_response({'results': results, 'elapsed_ms': round(elapsed_ms, 2)})
+
+@app.route('/artifact_versions', methods=['GET'])
+@login_required
+def artifact_versions():
+    """Which dataset, model and catalog versions this worker is serving"""
+    report = artifact_loader.versions()
+    report['worker_pid'] = os.getpid()
+    if recommender.loaded:
+        active = recommender.get()
+        report['catalog_source'] = Config.CATALOG_SOURCE
+        report['catalog_version'] = active.catalog_version
+        report['catalog_size'] = len(active.catalog)
+        report['model'] = type(active.model).__name__ if active.model is not None else None
+        report['embedding_index'] = active.embedding_index is not None
+    return jsonify(report)
+
+@app.route('/search_stats', methods=['GET'])
+@login_required
+def search_stats():
+    """Latency percentiles of recent searches against the p99 target"""
+    samples = sorted(search_latencies)
+    
+    def percentile(p):
+        return round(samples[min(len(samples) - 1, int(p / 100 * len(samples)))], 2) if samples else None
+    
+    p99 = percentile(99)
+    return jsonify({
+        'count': len(samples),
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': p99,
+        'p99_target_ms': Config.SEARCH_P99_TARGET_MS,
+        'within_target': p99 is None or p99 <= Config.SEARCH_P99_TARGET_MS
+    })
+
+@app.route('/write_stats', methods=['GET'])
+@login_required
+def write_stats():
+    with db_timing_lock:
+        timing = dict(db_timing)
+    timing['write_share'] = round(timing['write_seconds'] / timing['request_seconds'], 4) \
+        if timing['request_seconds'] else 0.0
+    return jsonify({
+        'worker_pid': os.getpid(),
+        'db': timing,
+        'write_behind': write_behind.stats() if write_behind is not None else {'enabled': False}
+    })
+
+@registry.add_collector
+def component_metrics():
+    """Stats the app's components already keep, as Prometheus metric families"""
+    with db_timing_lock:
+        timing = dict(db_timing)
+    families = [
+        ('foodai_db_write_seconds_total', 'counter', 'Time in SQLAlchemy write statements',
+         [({}, timing['write_seconds'])]),
+        ('foodai_db_write_statements_total', 'counter', 'SQLAlchemy write statements executed',
+         [({}, timing['write_statements'])]),
+        ('foodai_uptime_seconds', 'gauge', 'Seconds since the app module was imported',
+         [({}, time.perf_counter() - startup_report.started_at)]),
+        ('foodai_component_loaded', 'gauge', 'Whether a lazily built component has been built',
+         [({'component': component.name}, component.loaded)
+          for component in (recommender, nutrition_calc, catalog_db, catalog_store)])
+    ]
+    
+    cache = recommendation_cache.stats()
+    families += [
+        ('foodai_recommendation_cache_hits_total', 'counter', 'Recommendation cache hits', [({}, cache['hits'])]),
+        ('foodai_recommendation_cache_misses_total', 'counter', 'Recommendation cache misses',
+         [({}, cache['misses'])]),
+        ('foodai_recommendation_cache_evictions_total', 'counter', 'Recommendation cache evictions',
+         [({}, cache['evictions'])]),
+        ('foodai_recommendation_cache_entries', 'gauge', 'Recommendation cache entries', [({}, cache['size'])])
+    ]
+    
+    if catalog_db.loaded:
+        pool = catalog_db.get().pool_stats()
+        families += [
+            ('foodai_db_pool_connections', 'gauge', 'Catalog connection pool connections by state',
+             [({'state': 'in_use'}, pool['in_use']), ({'state': 'idle'}, pool['idle'])]),
+            ('foodai_db_pool_checkouts_total', 'counter', 'Catalog connection pool checkouts',
+             [({}, pool['checkouts'])]),
+            ('foodai_db_pool_waits_total', 'counter', 'Checkouts that waited for a free connection',
+             [({}, pool['waits'])]),
+            ('foodai_db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a free connection',
+             [({}, pool['wait_seconds'])])
+        ]
+    
+    if write_behind is not None:
+        queue = write_behind.stats()
+        families += [
+            ('foodai_write_behind_queued', 'gauge', 'Food log writes waiting for a group commit',
+             [({}, queue['queued'])]),
+            ('foodai_write_behind_batches_total', 'counter', 'Group commits', [({}, queue['batches'])]),
+            ('foodai_write_behind_items_total', 'counter', 'Writes committed in groups', [({}, queue['items'])]),
+            ('foodai_write_behind_failures_total', 'counter', 'Failed group commits', [({}, queue['failures'])])
+        ]
+    
+    families.append(('foodai_artifact_version', 'gauge', 'Version of the loaded recommender artifacts',
+                     [({}, artifact_loader.version)]))
+    if recommender.loaded:
+        active = recommender.get()
+        families += [
+            ('foodai_catalog_version', 'gauge', 'Food catalog version being served',
+             [({}, active.catalog_version)]),
+            ('foodai_catalog_foods', 'gauge', 'Foods in the served catalog', [({}, len(active.catalog))])
+        ]
+    
+    profile = profiler.stats()
+    families += [
+        ('foodai_profiler_enabled', 'gauge', 'Whether slow requests are being profiled',
+         [({}, profile['enabled'])]),
+        ('foodai_profiler_dumps_total', 'counter', 'Slow request stack dumps written', [({}, profile['dumps'])])
+    ]
+    return families
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint (this worker's metrics only)"""
+    if not Config.METRICS_ENABLED:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    if Config.METRICS_TOKEN:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied.encode(), Config.METRICS_TOKEN.encode()):
+            return jsonify({'error': 'Unauthorized'}), 401
+    return registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.route('/startup_report', methods=['GET'])
+@login_required
+def get_startup_report():
+    report = startup_report.as_dict()
+    report['loaded'] = {
+        component.name: component.loaded for component in (recommender, nutrition_calc, catalog_db, catalog_store)
+    }
+    return jsonify(report)
+
 @app.route('/get_favorites', methods=['GET'])
 @login_required
 def get_favorites():
@@ -395,7 +1043,18 @@ def get_favorites():
         logger.error(f"Error fetching favorites: {str(e)}")
         return jsonify({'favorites': []})
 
+startup_report.mark('app module imported')
+
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        connection = db.engine.raw_connection()
+        try:
+            migrate(connection.driver_connection)
+        finally:
+            connection.close()
+        
+        # Backfill the daily rollups the first time they are created
+        if not UserDailyNutrition.query.first() and UserFoodLog.query.first():
+            rebuild_daily_nutrition()
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,309 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import numpy as np
+
+from deep_learning.features import as_user_record
+from deep_learning.food_recommender import FoodRecommender
+from deep_learning.nutrition_calculator import NutritionCalculator
+
+# Microbenchmarks for the recommendation hot paths across catalog sizes and
+# user counts. Catalogs are synthesized with the repo's own generators and
+# cached as CSVs, so repeated runs time the same data:
+#
+#   python -m benchmarks.bench_recommender run --sizes 1000 10000 100000 --out bench.json
+#   python -m benchmarks.bench_recommender compare baseline.json bench.json
+#
+# Every result is keyed by (benchmark, catalog_size, users); compare flags a
+# benchmark whose median got slower than the baseline by more than the
+# threshold (and by more than a small absolute noise floor).
+
+GENERATORS = ['sample', 'faker']
+GENDERS = ['male', 'female', 'other']
+ACTIVITY_LEVELS = ['sedentary', 'light', 'moderate', 'active', 'very_active']
+GOALS = ['weight_loss', 'weight_gain', 'maintenance', 'muscle_gain']
+
+
+def generate_catalog(size, generator='sample', data_dir=None, seed=42):
+    """Path of a synthetic food CSV with size rows, generated on first use"""
+    data_dir = data_dir or os.path.join(tempfile.gettempdir(), 'foodai-bench')
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f'foods-{generator}-{size}-{seed}.csv')
+    if os.path.exists(path):
+        return path
+
+    random.seed(seed)
+    if generator == 'faker':
+        # deep_learning/create_dataset.py needs Faker, which the app itself does not
+        from faker import Faker
+        from deep_learning.create_dataset import create_sample_dataset
+        Faker.seed(seed)
+        create_sample_dataset(size, output_path=path)
+    else:
+        FoodRecommender.create_sample_dataset(size).to_csv(path, index=False)
+    return path
+
+
+def synthetic_users(count, seed=42):
+    """User profiles with preferences, as the app passes them to the recommender"""
+    rng = random.Random(seed)
+    users, preferences = [], []
+    for i in range(count):
+        users.append(SimpleNamespace(
+            id=i + 1,
+            age=rng.randint(18, 75),
+            gender=rng.choice(GENDERS),
+            weight=round(rng.uniform(50, 110), 1),
+            height=round(rng.uniform(150, 195), 1),
+            activity_level=rng.choice(ACTIVITY_LEVELS),
+            dietary_goal=rng.choice(GOALS)
+        ))
+        preferences.append({
+            'preferred_cuisines': rng.sample(['Italian', 'Indian', 'Chinese', 'Mexican', 'Japanese'], 2),
+            'allergies': rng.sample(['nuts', 'dairy', 'gluten'], rng.randint(0, 1)),
+            'disliked_foods': [],
+            'favorite_foods': [f'Food Item {rng.randint(0, 999)}']
+        })
+    return users, preferences
+
+
+def summarize(name, catalog_size, users, samples, items=1):
+    """Result record for a list of per-call durations in seconds"""
+    samples_ms = np.asarray(samples) * 1000
+    total = samples_ms.sum() / 1000
+    return {
+        'benchmark': name,
+        'catalog_size': catalog_size,
+        'users': users,
+        'runs': len(samples_ms),
+        'mean_ms': round(float(samples_ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(samples_ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(samples_ms, 95)), 3),
+        'min_ms': round(float(samples_ms.min()), 3),
+        'items_per_second': round(items * len(samples_ms) / total, 1) if total > 0 else None
+    }
+
+
+def timed(fn, *args, **kwargs):
+    """(seconds, result) of one call"""
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def sample_calls(fn, calls, repeat=3):
+    """Durations of fn(*args) for every args in calls, repeat rounds after one warm-up call"""
+    fn(*calls[0])
+    return [timed(fn, *args)[0] for _ in range(repeat) for args in calls]
+
+
+def load_models(catalog, serving_model_path=None):
+    """(NumPy serving model, Keras model or None), or None if neither can be loaded
+
+    Without an exported model, an untrained Keras model is built and
+    exported; untrained weights cost exactly as much to evaluate.
+    """
+    if serving_model_path is not None:
+        from deep_learning.serving import NumpyFoodModel
+        return NumpyFoodModel(serving_model_path), None
+
+    try:
+        from sklearn.preprocessing import LabelEncoder
+        from deep_learning.model import FoodRecommendationModel
+    except ImportError as e:
+        print(f"  model inference skipped: {str(e)}", file=sys.stderr)
+        return None
+
+    from deep_learning.serving import NumpyFoodModel
+    keras_model = FoodRecommendationModel()
+    keras_model.build_model(input_shape=5)
+    keras_model.label_encoders['category'] = LabelEncoder().fit(catalog.columns['category'])
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'food_recommender.npz')
+        keras_model.export_serving(path)
+        serving = NumpyFoodModel(path)
+    return serving, keras_model
+
+
+def bench_model(models, catalog, users, keras_max_foods=10000, repeat=3):
+    """Inference timings for the NumPy serving model and, on small catalogs, Keras"""
+    serving, keras_model = models
+    size = len(catalog)
+    users = [as_user_record(user) for user in users]
+    one_by_one = [([user], catalog.columns, None, catalog) for user in users]
+    results = [
+        summarize('model.predict_batch', size, len(users),
+                  sample_calls(serving.predict_many, one_by_one, repeat), items=size),
+        summarize('model.predict_many', size, len(users),
+                  sample_calls(serving.predict_many, [(users, catalog.columns, None, catalog)], repeat),
+                  items=size * len(users))
+    ]
+    if keras_model is not None and size <= keras_max_foods:
+        results.append(summarize('model.keras_predict_batch', size, len(users),
+                                 sample_calls(keras_model.predict_many, one_by_one, repeat), items=size))
+    return results
+
+
+def run_benchmarks(sizes, user_counts, generator='sample', data_dir=None, plan_users=10,
+                   serving_model_path=None, keras_max_foods=10000, skip=(), seed=42, repeat=3):
+    """Run every benchmark for every catalog size; returns the list of result records
+
+    Calls are repeated repeat times after a warm-up call and summarized by
+    their median, which keeps single-shot timings comparable between runs.
+    """
+    from deep_learning.preprocess import FoodDataPreprocessor
+
+    results = []
+    calculator = NutritionCalculator()
+    for size in sizes:
+        path = generate_catalog(size, generator, data_dir, seed)
+        print(f"catalog of {size} foods ({path})", file=sys.stderr)
+
+        samples = sample_calls(FoodRecommender, [(path,)], repeat)
+        results.append(summarize('load_catalog', size, 0, samples, items=size))
+        recommender = FoodRecommender(path)
+
+        models = None if 'model' in skip else load_models(recommender.catalog, serving_model_path)
+        if models is not None:
+            samples = sample_calls(models[0].food_embeddings, [(recommender.catalog.columns,)], repeat)
+            results.append(summarize('model.food_embeddings', size, 0, samples, items=size))
+
+        for count in user_counts:
+            users, preferences = synthetic_users(count, seed)
+            targets = [calculator.calculate_daily_nutrition(user) for user in users]
+
+            if 'recommendations' not in skip:
+                calls = [(user.id, user, 'all', prefs) for user, prefs in zip(users, preferences)]
+                samples = sample_calls(recommender.get_recommendations, calls, repeat)
+                results.append(summarize('get_recommendations', size, count, samples))
+
+            if 'meal_plans' not in skip:
+                calls = list(zip(users, preferences, targets))[:plan_users]
+                for strategy in ('sample', 'optimize'):
+                    samples = sample_calls(recommender.generate_weekly_meal_plan, [
+                        (user.id, user, 7, prefs, strategy, user_targets) for user, prefs, user_targets in calls
+                    ], repeat)
+                    results.append(summarize(f'generate_weekly_meal_plan.{strategy}', size, len(calls), samples))
+
+                samples = sample_calls(recommender.generate_meal_plans,
+                                       [(users, 7, preferences, 'optimize', targets)], repeat)
+                results.append(summarize('generate_meal_plans.optimize', size, count, samples, items=count))
+
+            if models is not None:
+                results.extend(bench_model(models, recommender.catalog, users, keras_max_foods, repeat))
+
+        if 'health_score' not in skip:
+            samples = sample_calls(FoodDataPreprocessor().calculate_health_score, [(recommender.food_data,)], repeat)
+            results.append(summarize('calculate_health_score', size, 0, samples, items=size))
+
+    return results
+
+
+def result_key(result):
+    return (result['benchmark'], result['catalog_size'], result['users'])
+
+
+def compare_results(baseline, current, threshold=0.2, min_delta_ms=1.0):
+    """Rows comparing matching results by median; regressed is True past the threshold"""
+    baseline_by_key = {result_key(result): result for result in baseline['results']}
+    rows = []
+    for result in current['results']:
+        base = baseline_by_key.get(result_key(result))
+        if base is None:
+            continue
+        delta = result['p50_ms'] - base['p50_ms']
+        ratio = result['p50_ms'] / base['p50_ms'] if base['p50_ms'] > 0 else float('inf')
+        rows.append({
+            'benchmark': result['benchmark'],
+            'catalog_size': result['catalog_size'],
+            'users': result['users'],
+            'baseline_p50_ms': base['p50_ms'],
+            'p50_ms': result['p50_ms'],
+            'change': round(ratio - 1, 4),
+            'regressed': ratio > 1 + threshold and delta > min_delta_ms
+        })
+    return rows
+
+
+def print_comparison(rows):
+    print(f"{'benchmark':<36} {'foods':>8} {'users':>6} {'base p50':>10} {'p50':>10} {'change':>8}")
+    for row in rows:
+        flag = '  REGRESSION' if row['regressed'] else ''
+        print(f"{row['benchmark']:<36} {row['catalog_size']:>8} {row['users']:>6} "
+              f"{row['baseline_p50_ms']:>10.3f} {row['p50_ms']:>10.3f} {row['change']:>+8.1%}{flag}")
+
+
+def main():
+    """Time the recommendation hot paths, or compare two result files"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run = subparsers.add_parser('run', help='run the benchmarks and write JSON results')
+    run.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    run.add_argument('--users', type=int, nargs='+', default=[1, 50])
+    run.add_argument('--plan-users', type=int, default=10, help='users timed one by one for meal plans')
+    run.add_argument('--generator', choices=GENERATORS, default='sample')
+    run.add_argument('--data-dir', help='where generated catalogs are cached')
+    run.add_argument('--serving-model', help='exported .npz model (default: untrained weights, needs TensorFlow)')
+    run.add_argument('--keras-max-foods', type=int, default=10000)
+    run.add_argument('--skip', nargs='*', default=[],
+                     choices=['recommendations', 'meal_plans', 'model', 'health_score'])
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--repeat', type=int, default=3, help='timed rounds after one warm-up call')
+    run.add_argument('--out', default='bench_results.json')
+    run.add_argument('--baseline', help='compare against this result file after the run')
+    run.add_argument('--threshold', type=float, default=0.2)
+
+    compare = subparsers.add_parser('compare', help='flag regressions between two result files')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=0.2, help='allowed relative slowdown of the median')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        results = run_benchmarks(
+            args.sizes, args.users, args.generator, args.data_dir, args.plan_users,
+            args.serving_model, args.keras_max_foods, set(args.skip), args.seed, args.repeat
+        )
+        current = {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'generator': args.generator,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'results': results
+        }
+        with open(args.out, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f"Wrote {len(results)} results to {args.out}", file=sys.stderr)
+        if not args.baseline:
+            return
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+
+    rows = compare_results(baseline, current, args.threshold)
+    print_comparison(rows)
+    regressions = [row for row in rows if row['regressed']]
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
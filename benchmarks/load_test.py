@@ -0,0 +1,379 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+import numpy as np
+
+# End-to-end load test of the Flask endpoints against a local server and a
+# throwaway SQLite database; nothing leaves the machine:
+#
+#   python -m benchmarks.load_test --users 50 --concurrency 16 --duration 30
+#   python -m benchmarks.load_test --workers 4 --env WRITE_BEHIND_ENABLED=true --out load.json
+#
+# The fixture seeds users the way seed_db.py / create_demo_data.py do (a
+# profile, preferences and a few weeks of food logs each), starts gunicorn
+# on it, logs every user in and then drives a weighted mix of requests from
+# concurrency threads. The DB lock-wait share comes from the servers'
+# /write_stats counters: time spent in write statements, where SQLite waits
+# for the write lock, as a share of server-side request time.
+
+PASSWORD = 'load-test-password'
+USERNAME_PREFIX = 'loaduser'
+MEAL_TYPES = ['breakfast', 'lunch', 'dinner', 'snack', 'all']
+DEFAULT_MIX = 'recommendations=40,meal_plan=10,log_food=35,dashboard=15'
+
+
+def seed_fixture(db_path, n_users, history_days=14, seed=42):
+    """Create the app schema in db_path and seed n_users users with history"""
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(db_path)}'
+    from werkzeug.security import generate_password_hash
+    from app import app, db, User, UserFoodLog, UserPreferences, rebuild_daily_nutrition
+    from config import Config
+    from database.catalog_store import CatalogStore
+    from database.migrations import migrate
+    import pandas as pd
+
+    rng = random.Random(seed)
+    foods = pd.read_csv(Config.FOOD_DATA_PATH).to_dict('records')
+    # One hash for everyone: hashing is deliberately slow and the password is shared
+    password_hash = generate_password_hash(PASSWORD)
+
+    with app.app_context():
+        db.create_all()
+        connection = db.engine.raw_connection()
+        migrate(connection.driver_connection)
+        connection.close()
+        CatalogStore(db.engine.url.database).load_csv(Config.FOOD_DATA_PATH)
+
+        users = [
+            User(
+                username=f'{USERNAME_PREFIX}{i}',
+                email=f'{USERNAME_PREFIX}{i}@example.com',
+                password_hash=password_hash,
+                age=rng.randint(18, 75),
+                gender=rng.choice(['male', 'female']),
+                weight=round(rng.uniform(50, 110), 1),
+                height=round(rng.uniform(150, 195), 1),
+                activity_level=rng.choice(['sedentary', 'light', 'moderate', 'active', 'very_active']),
+                dietary_goal=rng.choice(['weight_loss', 'weight_gain', 'maintenance', 'muscle_gain']),
+                health_conditions=json.dumps([])
+            )
+            for i in range(n_users)
+        ]
+        db.session.add_all(users)
+        db.session.commit()
+
+        today = datetime.utcnow()
+        for user in users:
+            db.session.add(UserPreferences(
+                user_id=user.id,
+                preferred_cuisines=json.dumps(rng.sample(['Italian', 'American', 'Mediterranean', 'Japanese'], 2)),
+                allergies=json.dumps([]),
+                disliked_foods=json.dumps([]),
+                favorite_foods=json.dumps([rng.choice(foods)['name']])
+            ))
+            for day in range(history_days):
+                for meal_type, hour in (('breakfast', 8), ('lunch', 13), ('dinner', 19)):
+                    food = rng.choice([f for f in foods if f['meal_type'] == meal_type] or foods)
+                    db.session.add(UserFoodLog(
+                        user_id=user.id,
+                        food_name=food['name'],
+                        calories=food['calories'],
+                        protein=food['protein'],
+                        carbs=food['carbs'],
+                        fat=food['fat'],
+                        meal_type=meal_type,
+                        timestamp=(today - timedelta(days=day)).replace(hour=hour, minute=0)
+                    ))
+        db.session.commit()
+        rebuild_daily_nutrition()
+        db.session.remove()
+        db.engine.dispose()
+    return foods
+
+
+def start_server(server, port, workers, threads, env):
+    """Start gunicorn (or Flask's threaded server) on 127.0.0.1:port"""
+    if server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', str(threads),
+                   '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app']
+    else:
+        command = [sys.executable, '-c',
+                   f"from app import app; app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.Popen(command, cwd=root, env={**os.environ, **env})
+
+
+def wait_until_ready(host, port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request('GET', '/')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"Server on port {port} not ready after {timeout}s")
+
+
+class Client:
+    """One keep-alive HTTP connection; session cookies are passed in per request"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.conn = http.client.HTTPConnection(host, port, timeout=120)
+
+    def request(self, method, path, body=None, cookie=None):
+        """(status, body bytes, session cookie or None)"""
+        headers = {}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        if cookie:
+            headers['Cookie'] = cookie
+        for attempt in range(2):
+            try:
+                self.conn.request(method, path, body=data, headers=headers)
+                response = self.conn.getresponse()
+                payload = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # Server closed the kept-alive connection; reconnect once
+                self.conn.close()
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+                if attempt:
+                    raise
+        set_cookie = response.getheader('Set-Cookie')
+        return response.status, payload, set_cookie.split(';', 1)[0] if set_cookie else None
+
+
+def login_all(host, port, n_users):
+    """Session cookie of every seeded user"""
+    client = Client(host, port)
+    cookies = []
+    for i in range(n_users):
+        status, payload, cookie = client.request(
+            'POST', '/login', {'username': f'{USERNAME_PREFIX}{i}', 'password': PASSWORD}
+        )
+        if status != 200 or cookie is None:
+            raise RuntimeError(f"Login of {USERNAME_PREFIX}{i} failed ({status}): {payload[:200]!r}")
+        cookies.append(cookie)
+    return cookies
+
+
+def make_operations(foods):
+    """name -> function(rng) returning (method, path, body)"""
+    return {
+        'recommendations': lambda rng: ('POST', '/get_recommendations', {'meal_type': rng.choice(MEAL_TYPES)}),
+        'meal_plan': lambda rng: ('POST', '/generate_meal_plan', {'days': 7}),
+        'log_food': lambda rng: ('POST', '/log_food', log_entry(rng.choice(foods))),
+        'dashboard': lambda rng: ('GET', '/dashboard', None)
+    }
+
+
+def log_entry(food):
+    return {
+        'food_name': food['name'],
+        'calories': food['calories'],
+        'protein': food['protein'],
+        'carbs': food['carbs'],
+        'fat': food['fat'],
+        'meal_type': food['meal_type']
+    }
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, weight = part.split('=')
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def collect_write_stats(host, port, cookie, workers, polls_per_worker=10):
+    """Latest /write_stats per worker process (a fresh connection per poll spreads them over workers)"""
+    by_pid = {}
+    for _ in range(max(1, workers) * polls_per_worker):
+        status, payload, _ = Client(host, port).request('GET', '/write_stats', cookie=cookie)
+        if status == 200:
+            stats = json.loads(payload)
+            by_pid[stats['worker_pid']] = stats['db']
+        if len(by_pid) >= workers:
+            break
+    return by_pid
+
+
+def lock_wait_share(before, after):
+    """Write-statement seconds / request seconds across workers, from two collect_write_stats calls"""
+    write_seconds = request_seconds = 0.0
+    for pid, stats in after.items():
+        base = before.get(pid, {'write_seconds': 0.0, 'request_seconds': 0.0})
+        write_seconds += stats['write_seconds'] - base['write_seconds']
+        request_seconds += stats['request_seconds'] - base['request_seconds']
+    return {
+        'workers_sampled': len(after),
+        'write_seconds': round(write_seconds, 3),
+        'request_seconds': round(request_seconds, 3),
+        'lock_wait_share': round(write_seconds / request_seconds, 4) if request_seconds > 0 else None
+    }
+
+
+def run_load(host, port, cookies, foods, mix, concurrency, duration, warmup, seed=42):
+    """Drive the mix for warmup + duration seconds; returns (per-operation samples, elapsed)"""
+    operations = make_operations(foods)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples = {name: [] for name in names}
+    lock = threading.Lock()
+    started = time.monotonic()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        client = Client(host, port)
+        my_cookies = cookies[index::concurrency] or cookies
+        i = 0
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                return
+            name = rng.choices(names, weights)[0]
+            method, path, body = operations[name](rng)
+            request_started = time.perf_counter()
+            try:
+                status, _, _ = client.request(method, path, body, my_cookies[i % len(my_cookies)])
+            except OSError:
+                status = 0
+            elapsed = time.perf_counter() - request_started
+            i += 1
+            if now >= measure_from:
+                with lock:
+                    samples[name].append((elapsed, status))
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, duration
+
+
+def summarize(samples, elapsed):
+    """Per-operation throughput, error count and latency percentiles"""
+    report = {}
+    for name, entries in list(samples.items()) + [('all', [e for entries in samples.values() for e in entries])]:
+        if not entries:
+            continue
+        latencies = np.array([entry[0] for entry in entries]) * 1000
+        statuses = [entry[1] for entry in entries]
+        report[name] = {
+            'requests': len(entries),
+            'errors': sum(1 for status in statuses if not 200 <= status < 300),
+            'throughput_rps': round(len(entries) / elapsed, 2),
+            'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 2),
+            'p99_ms': round(float(np.percentile(latencies, 99)), 2),
+            'max_ms': round(float(latencies.max()), 2),
+            'statuses': {str(status): statuses.count(status) for status in sorted(set(statuses))}
+        }
+    return report
+
+
+def print_report(report, db):
+    print(f"{'endpoint':<16} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, row in report.items():
+        print(f"{name:<16} {row['requests']:>9} {row['errors']:>7} {row['throughput_rps']:>8.1f} "
+              f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}")
+    if db.get('lock_wait_share') is not None:
+        print(f"DB lock-wait share: {db['lock_wait_share']:.1%} of server request time in write statements "
+              f"({db['workers_sampled']} worker(s) sampled)")
+
+
+def main():
+    """Load-test the Flask endpoints on a seeded local SQLite fixture"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--users', type=int, default=50, help='seeded users (sessions shared by all threads)')
+    parser.add_argument('--history-days', type=int, default=14)
+    parser.add_argument('--concurrency', type=int, default=16, help='client threads')
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='unmeasured seconds before that')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='operation=weight,...')
+    parser.add_argument('--server', choices=['gunicorn', 'flask'], default='gunicorn')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--env', action='append', default=[], help='KEY=VALUE for the server, repeatable')
+    parser.add_argument('--url', help='test a running server already seeded with --users (skips the fixture)')
+    parser.add_argument('--keep', action='store_true', help='keep the fixture directory')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', help='write the report as JSON')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    workers = args.workers if args.server == 'gunicorn' else 1
+    process = None
+    workdir = None
+    try:
+        if args.url:
+            target = urlsplit(args.url)
+            host, port = target.hostname, target.port or 80
+            from config import Config
+            import pandas as pd
+            foods = pd.read_csv(Config.FOOD_DATA_PATH).to_dict('records')
+        else:
+            host, port = '127.0.0.1', args.port
+            workdir = tempfile.mkdtemp(prefix='foodai-load-')
+            db_path = os.path.join(workdir, 'food_recommendation.db')
+            print(f"Seeding {args.users} users into {db_path}", file=sys.stderr)
+            foods = seed_fixture(db_path, args.users, args.history_days, args.seed)
+            env = {'DATABASE_URL': f'sqlite:///{db_path}', 'WARMUP_ON_START': 'true'}
+            env.update(item.split('=', 1) for item in args.env)
+            process = start_server(args.server, port, workers, args.threads, env)
+        wait_until_ready(host, port, process)
+
+        cookies = login_all(host, port, args.users)
+        before = collect_write_stats(host, port, cookies[0], workers)
+        print(f"Running {args.concurrency} clients for {args.warmup:g}s warm-up + {args.duration:g}s",
+              file=sys.stderr)
+        samples, elapsed = run_load(host, port, cookies, foods, mix, args.concurrency,
+                                    args.duration, args.warmup, args.seed)
+        after = collect_write_stats(host, port, cookies[0], workers)
+
+        report = summarize(samples, elapsed)
+        db = lock_wait_share(before, after)
+        print_report(report, db)
+        if args.out:
+            with open(args.out, 'w') as f:
+                json.dump({
+                    'created_at': datetime.utcnow().isoformat(),
+                    'config': {key: value for key, value in vars(args).items() if key != 'out'},
+                    'endpoints': report,
+                    'db': db
+                }, f, indent=2)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        if workdir is not None and not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, date
+
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.dialects import sqlite
+
+from app import db, User, UserFoodLog, UserPreferences, UserDailyNutrition
+from database.migrations import migrate
+
+# The queries every request path depends on; each must be answered from an
+# index. Keep these in step with the queries in app.py.
+HOT_QUERIES = {
+    'load_user': select(User).where(User.id == 1),
+    'login by username': select(User).where(func.lower(User.username) == 'someone'),
+    'register email check': select(User).where(User.email == 'someone@example.com'),
+    'user preferences': select(UserPreferences).where(UserPreferences.user_id == 1).limit(1),
+    'dashboard recent logs': select(UserFoodLog).where(UserFoodLog.user_id == 1)
+        .order_by(UserFoodLog.timestamp.desc()).limit(5),
+    'dashboard daily intake': select(UserDailyNutrition).where(
+        UserDailyNutrition.user_id == 1, UserDailyNutrition.day == date.today()
+    ),
+    'analysis log window': select(
+        UserFoodLog.timestamp, UserFoodLog.food_name, UserFoodLog.calories,
+        UserFoodLog.protein, UserFoodLog.carbs, UserFoodLog.fat, UserFoodLog.meal_type
+    ).where(UserFoodLog.user_id == 1, UserFoodLog.timestamp >= datetime(2000, 1, 1))
+}
+
+# Plan details that mean a table is read in full or results are sorted in memory
+BAD_PLAN_STEPS = ('SCAN ', 'USE TEMP B-TREE', 'ERROR ')
+
+
+def query_plan(conn, statement):
+    """EXPLAIN QUERY PLAN detail lines for a SQLAlchemy statement"""
+    compiled = statement.compile(dialect=sqlite.dialect())
+    params = [compiled.params[name] for name in compiled.positiontup]
+    params = [str(value) if isinstance(value, (datetime, date)) else value for value in params]
+    return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {compiled}', params)]
+
+
+def check_plans(conn):
+    """{query name: bad plan steps} for every hot query that is not fully indexed"""
+    failures = {}
+    for name, statement in HOT_QUERIES.items():
+        try:
+            plan = query_plan(conn, statement)
+        except sqlite3.OperationalError as e:
+            # Missing tables or indexes on an out-of-date database
+            plan = [f'ERROR {e}']
+        bad = [step for step in plan if step.startswith(BAD_PLAN_STEPS)]
+        print(f"{'FAIL' if bad else 'ok  '} {name}: {' | '.join(plan)}")
+        if bad:
+            failures[name] = bad
+    return failures
+
+
+def main():
+    """Fail if a hot query would scan a whole table instead of using an index"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--db', default=None, help='existing database to check (default: a fresh one from the models)')
+    args = parser.parse_args()
+
+    if args.db:
+        # Checked as-is: an unmigrated database is expected to fail
+        conn = sqlite3.connect(f'file:{args.db}?mode=ro', uri=True)
+    else:
+        db_path = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+        db.metadata.create_all(create_engine(f'sqlite:///{db_path}'))
+        conn = sqlite3.connect(db_path)
+        migrate(conn)
+
+    try:
+        failures = check_plans(conn)
+    finally:
+        conn.close()
+
+    if failures:
+        print(f"{len(failures)} hot queries are not fully indexed")
+        sys.exit(1)
+    print("All hot queries use indexes")
+
+
+if __name__ == '__main__':
+    main()
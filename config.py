@@ -14,11 +14,82 @@ class Config:
     SCALER_PATH = os.getenv('SCALER_PATH', 'models/scaler.pkl')
     ENCODER_PATH = os.getenv('ENCODER_PATH', 'models/label_encoders.pkl')
     
+    # Neural re-ranking of rule-based recommendations (loads the Keras model)
+    NEURAL_RERANK = os.getenv('NEURAL_RERANK', 'false').lower() == 'true'
+    RERANK_WEIGHT = float(os.getenv('RERANK_WEIGHT', 0.5))
+    EMBEDDINGS_PATH = os.getenv('EMBEDDINGS_PATH', 'models/food_embeddings.npz')
+    SERVING_MODEL_PATH = os.getenv('SERVING_MODEL_PATH', 'models/food_recommender.npz')
+    
+    # Food catalog: 'csv' reads FOOD_DATA_PATH (or its binary snapshot) once per process;
+    # 'db' serves it from the foods table (seeded from FOOD_DATA_PATH when empty) and applies
+    # edits made by any process every CATALOG_SYNC_INTERVAL seconds. See the README before
+    # switching: offline tools then need --catalog-db / --db to read the same catalog
+    CATALOG_SOURCE = os.getenv('CATALOG_SOURCE', 'csv')
+    FOOD_DATA_PATH = os.getenv('FOOD_DATA_PATH', 'deep_learning/data/food_dataset.csv')
+    CATALOG_SYNC_INTERVAL = float(os.getenv('CATALOG_SYNC_INTERVAL', 5))
+    
+    # Reload the recommender in the background when the dataset or model files change.
+    # Every worker process polls and rebuilds on its own. With CATALOG_SOURCE=db only the
+    # model files are watched: merge a new dataset once with
+    # `python -m database.catalog_store load <csv>` and workers pick it up via the catalog sync
+    ARTIFACT_RELOAD = os.getenv('ARTIFACT_RELOAD', 'false').lower() == 'true'
+    ARTIFACT_POLL_INTERVAL = float(os.getenv('ARTIFACT_POLL_INTERVAL', 5))
+    
     # Application settings
     APP_NAME = os.getenv('APP_NAME', 'FoodAI')
     MAX_RECOMMENDATIONS = int(os.getenv('MAX_RECOMMENDATIONS', 20))
     MEAL_PLAN_DAYS = int(os.getenv('MEAL_PLAN_DAYS', 7))
     
+    # 'sample' picks each meal at random from the top 3 (the original plans); 'optimize'
+    # plans meals against calorie and macro targets. A request can still ask for either
+    MEAL_PLAN_STRATEGY = os.getenv('MEAL_PLAN_STRATEGY', 'sample')
+    MEAL_PLAN_TIME_BUDGET_MS = int(os.getenv('MEAL_PLAN_TIME_BUDGET_MS', 200))
+    
+    # SQLite connection tuning (journal_mode is always WAL)
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 20000))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    
+    # Food logging: /log_food_batch size limit and optional write-behind group commit.
+    # With WRITE_BEHIND_WAIT (default) a request returns only after its batch has
+    # committed, so writes are as durable as before. Without it requests get 202
+    # before the commit and up to one interval of queued logs can be lost on a crash.
+    # Logs are only grouped within one process: with sync gunicorn workers (one request
+    # at a time) every batch has size 1, so enable it with threaded workers
+    # (e.g. --worker-class gthread --threads 8). A failed group commit is retried
+    # synchronously by the request that submitted the logs.
+    LOG_BATCH_MAX_ENTRIES = int(os.getenv('LOG_BATCH_MAX_ENTRIES', 100))
+    WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', 'false').lower() == 'true'
+    WRITE_BEHIND_WAIT = os.getenv('WRITE_BEHIND_WAIT', 'true').lower() == 'true'
+    WRITE_BEHIND_INTERVAL_MS = int(os.getenv('WRITE_BEHIND_INTERVAL_MS', 5))
+    WRITE_BEHIND_MAX_BATCH = int(os.getenv('WRITE_BEHIND_MAX_BATCH', 500))
+    WRITE_BEHIND_TIMEOUT = float(os.getenv('WRITE_BEHIND_TIMEOUT', 10))
+    
+    # Catalog typeahead (/search_foods)
+    SEARCH_MIN_CHARS = int(os.getenv('SEARCH_MIN_CHARS', 2))
+    SEARCH_P99_TARGET_MS = float(os.getenv('SEARCH_P99_TARGET_MS', 25))
+    
+    # /nutrition_analysis streams logs in chunks and warns when slower than the target;
+    # days and meal times are taken in APP_TIMEZONE (IANA name, e.g. 'America/New_York')
+    APP_TIMEZONE = os.getenv('APP_TIMEZONE', 'UTC')
+    ANALYSIS_CHUNK_SIZE = int(os.getenv('ANALYSIS_CHUNK_SIZE', 1000))
+    ANALYSIS_LATENCY_TARGET_MS = int(os.getenv('ANALYSIS_LATENCY_TARGET_MS', 100))
+    
+    # Instrumentation: Prometheus metrics on /metrics, per-request Server-Timing
+    # headers, and folded stack dumps of requests slower than PROFILE_SLOW_MS.
+    # Metrics and Server-Timing expose internal span names and timings, so both are
+    # off by default; with METRICS_TOKEN set, scrapers must send "Authorization: Bearer <token>"
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+    SERVER_TIMING_HEADER = os.getenv('SERVER_TIMING_HEADER', 'false').lower() == 'true'
+    PROFILE_SLOW_REQUESTS = os.getenv('PROFILE_SLOW_REQUESTS', 'false').lower() == 'true'
+    PROFILE_SLOW_MS = int(os.getenv('PROFILE_SLOW_MS', 500))
+    PROFILE_INTERVAL_MS = int(os.getenv('PROFILE_INTERVAL_MS', 5))
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'instance/profiles')
+    
+    # Load the food catalog in a background thread at startup instead of on first request
+    WARMUP_ON_START = os.getenv('WARMUP_ON_START', 'false').lower() == 'true'
+    
     # File upload settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = 'static/uploads'
@@ -29,8 +100,9 @@ class Config:
     PERMANENT_SESSION_LIFETIME = 1800  # 30 minutes
     
     # Cache settings
-    CACHE_TYPE = 'simple'
-    CACHE_DEFAULT_TIMEOUT = 300
+    CACHE_TYPE = os.getenv('CACHE_TYPE', 'simple')  # 'simple' (in-process) or 'null' (disabled)
+    CACHE_DEFAULT_TIMEOUT = int(os.getenv('CACHE_DEFAULT_TIMEOUT', 300))
+    RECOMMENDATION_CACHE_SIZE = int(os.getenv('RECOMMENDATION_CACHE_SIZE', 1024))
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -1,4 +1,4 @@
-from app import app, db, User, UserFoodLog, UserPreferences
+from app import app, db, User, UserFoodLog, UserPreferences, rebuild_daily_nutrition
 from deep_learning.food_recommender import FoodRecommender
 import pandas as pd
 import numpy as np
@@ -146,6 +146,7 @@ def seed_user_history():
             db.session.add(log)
             
         db.session.commit()
+        rebuild_daily_nutrition(user.id)
         print(f"Added {len(history_logs)} food logs for history.")
 
 if __name__ == '__main__':
@@ -0,0 +1,225 @@
+import argparse
+import math
+from contextlib import contextmanager
+
+import pandas as pd
+
+from database.connection_pool import ConnectionPool
+
+# The food catalog lives in the foods table, keyed by the dataset's food_id
+# (foods.id = food_id, which is also the FTS5 rowid). Every write bumps one
+# catalog-wide version: upserted rows carry it in foods.version and deleted
+# ids are recorded in foods_deleted with it, so a reader that remembers the
+# last version it applied can fetch only what changed since then.
+
+CATALOG_COLUMNS = ['name', 'category', 'cuisine', 'meal_type', 'calories', 'protein', 'carbs', 'fat',
+                   'fiber', 'sugar', 'prep_time', 'complexity', 'health_score', 'ingredients', 'allergens']
+
+
+def _clean(value):
+    """Plain Python value for SQLite (NaN as NULL, lists as comma separated text)"""
+    if isinstance(value, (list, tuple)):
+        return ', '.join(str(item) for item in value)
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class CatalogStore:
+    """Food catalog in SQLite with versioned, incremental upserts and deletes"""
+
+    def __init__(self, db_path=None, pool_size=4, pool=None):
+        if pool is None and db_path is None:
+            raise ValueError("CatalogStore needs a db_path or a connection pool")
+        self.pool = pool or ConnectionPool(db_path, max_connections=pool_size)
+
+    @staticmethod
+    def _version(conn):
+        return conn.execute(
+            'SELECT MAX(COALESCE((SELECT MAX(version) FROM foods), 0), '
+            'COALESCE((SELECT MAX(version) FROM foods_deleted), 0))'
+        ).fetchone()[0]
+
+    @contextmanager
+    def _write(self):
+        """Write transaction that takes the lock up front; yields (conn, version of this write)"""
+        with self.pool.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn, self._version(conn) + 1
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def version(self):
+        """Current catalog version (0 for an empty, never written catalog)"""
+        with self.pool.connection() as conn:
+            return self._version(conn)
+
+    def upsert_foods(self, records):
+        """Insert or update foods by food_id; returns the new catalog version
+
+        Only the columns present in a record are written, so
+        {'food_id': 3, 'calories': 410} updates one value of food 3. New
+        foods need at least a name.
+        """
+        if not records:
+            return self.version()
+
+        with self._write() as (conn, version):
+            self._upsert(conn, version, records)
+        return version
+
+    def _upsert(self, conn, version, records):
+        """upsert_foods inside an open write transaction"""
+        groups = {}
+        for record in records:
+            columns = tuple(col for col in CATALOG_COLUMNS if col in record)
+            groups.setdefault(columns, []).append(record)
+
+        for columns, group in groups.items():
+            rows = [
+                (*(_clean(record[col]) for col in columns), version, int(record['food_id']))
+                for record in group
+            ]
+            if 'name' not in columns:
+                # NOT NULL is checked before ON CONFLICT, so partial rows are plain updates
+                updated = conn.executemany(
+                    f"""
+                    UPDATE foods SET {''.join(f'{col} = ?, ' for col in columns)}
+                        version = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                    """,
+                    rows
+                ).rowcount
+                if updated != len(rows):
+                    raise ValueError("New foods need a name")
+                continue
+
+            assignments = ''.join(f'{col} = excluded.{col}, ' for col in columns)
+            conn.executemany(
+                f"""
+                INSERT INTO foods ({''.join(f'{col}, ' for col in columns)}version, id, updated_at)
+                VALUES ({'?, ' * len(columns)}?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (id) DO UPDATE SET {assignments}
+                    version = excluded.version, updated_at = excluded.updated_at
+                """,
+                rows
+            )
+            conn.executemany(
+                'DELETE FROM foods_deleted WHERE id = ?',
+                [(int(record['food_id']),) for record in group]
+            )
+
+    def delete_foods(self, food_ids):
+        """Delete foods by food_id; returns the new catalog version"""
+        food_ids = [(int(food_id),) for food_id in food_ids]
+        if not food_ids:
+            return self.version()
+
+        with self._write() as (conn, version):
+            conn.executemany('DELETE FROM foods WHERE id = ?', food_ids)
+            conn.executemany(
+                'INSERT OR REPLACE INTO foods_deleted (id, version) VALUES (?, ?)',
+                [(food_id, version) for (food_id,) in food_ids]
+            )
+        return version
+
+    def changes_since(self, version):
+        """(current version, foods changed after version as a DataFrame, ids deleted after version)
+
+        Both reads run in one transaction, so they see the same snapshot.
+        Columns that are NULL for every returned row are left out.
+        """
+        with self.pool.connection() as conn:
+            conn.execute('BEGIN')
+            current = self._version(conn)
+            foods = pd.read_sql_query(
+                f"SELECT id AS food_id, {', '.join(CATALOG_COLUMNS)} FROM foods WHERE version > ? ORDER BY id",
+                conn, params=(version,)
+            )
+            if len(foods):
+                foods = foods.dropna(axis=1, how='all')
+            deleted = [row[0] for row in conn.execute(
+                'SELECT id FROM foods_deleted WHERE version > ?', (version,)
+            )]
+            conn.rollback()
+        return current, foods, deleted
+
+    def load_catalog(self):
+        """(version, DataFrame of the whole catalog) for building a FoodRecommender"""
+        version, foods, _ = self.changes_since(0)
+        return version, foods
+
+    def load_dataframe(self, df, prune=False):
+        """Upsert the foods of a dataset that differ from the stored ones; returns the new version
+
+        With prune=True, stored foods missing from the dataset are deleted.
+        Unchanged foods are not rewritten, so reloading the same dataset
+        does not bump the version.
+        """
+        columns = [col for col in CATALOG_COLUMNS if col in df.columns]
+        with self.pool.connection() as conn:
+            stored = {
+                row[0]: tuple(row[1:]) for row in conn.execute(
+                    f"SELECT id, {', '.join(columns)} FROM foods"
+                )
+            }
+
+        changed = []
+        for record in df.to_dict('records'):
+            values = tuple(_clean(record[col]) for col in columns)
+            if stored.get(int(record['food_id'])) != values:
+                changed.append(record)
+        version = self.upsert_foods(changed)
+
+        if prune:
+            missing = set(stored) - {int(food_id) for food_id in df['food_id']}
+            version = self.delete_foods(sorted(missing))
+        return version
+
+    def load_csv(self, path, prune=False):
+        """Load a food dataset CSV into the catalog (see load_dataframe)"""
+        return self.load_dataframe(pd.read_csv(path), prune=prune)
+
+    def seed_csv(self, path):
+        """Load a CSV into a catalog that was never written; returns the catalog version
+
+        The emptiness check and the load share one write transaction, so when
+        many processes seed at once exactly one of them loads the foods.
+        """
+        records = pd.read_csv(path).to_dict('records')
+        with self._write() as (conn, version):
+            if version > 1 or not records:
+                return version - 1
+            self._upsert(conn, version, records)
+        return version
+
+
+def main():
+    """Load a food dataset CSV into the foods table, or delete foods from it"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--db', default='instance/food_recommendation.db')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    load = subparsers.add_parser('load', help='upsert the foods of a CSV that changed')
+    load.add_argument('csv_path', nargs='?', default='deep_learning/data/food_dataset.csv')
+    load.add_argument('--prune', action='store_true', help='delete foods missing from the CSV')
+    delete = subparsers.add_parser('delete', help='delete foods by food_id')
+    delete.add_argument('food_ids', nargs='+', type=int)
+    args = parser.parse_args()
+
+    store = CatalogStore(args.db)
+    before = store.version()
+    if args.command == 'load':
+        after = store.load_csv(args.csv_path, prune=args.prune)
+    else:
+        after = store.delete_foods(args.food_ids)
+    store.pool.close_all()
+    print(f"{args.db}: catalog version {before} -> {after}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from database.migrations import apply_pragmas
+
+
+class ConnectionPool:
+    """Thread-safe pool of reusable sqlite3 connections
+
+    Connections are opened lazily up to max_connections and handed back to
+    an idle stack after use, so their page cache and prepared statements
+    (sqlite3's per-connection statement cache, cached_statements entries)
+    stay warm. A thread that asks again while it already holds a connection
+    gets the same one back, so nested calls share one transaction. When
+    every connection is busy, callers wait up to timeout seconds.
+    """
+
+    def __init__(self, db_path, max_connections=8, cached_statements=256, timeout=30.0, pragmas=None):
+        self.db_path = db_path
+        self.max_connections = max_connections
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+        self.pragmas = pragmas
+        self._idle = []
+        self._local = threading.local()
+        self._available = threading.Condition(threading.Lock())
+        self._opened = 0
+        self._in_use = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        conn.row_factory = sqlite3.Row
+        apply_pragmas(conn, self.pragmas)
+        return conn
+
+    def _checkout(self):
+        started = time.perf_counter()
+        waited = False
+        with self._available:
+            while not self._idle and self._opened >= self.max_connections:
+                waited = True
+                remaining = self.timeout - (time.perf_counter() - started)
+                if remaining <= 0 or not self._available.wait(remaining):
+                    raise TimeoutError(f"No database connection free after {self.timeout}s")
+
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._opened += 1
+            self._in_use += 1
+            self.checkouts += 1
+            if waited:
+                elapsed = time.perf_counter() - started
+                self.waits += 1
+                self.wait_seconds += elapsed
+                self.max_wait_seconds = max(self.max_wait_seconds, elapsed)
+
+        if conn is None:
+            try:
+                conn = self._open()
+            except Exception:
+                with self._available:
+                    self._opened -= 1
+                    self._in_use -= 1
+                    self._available.notify()
+                raise
+        return conn
+
+    def _checkin(self, conn, broken=False):
+        with self._available:
+            self._in_use -= 1
+            if broken:
+                self._opened -= 1
+            else:
+                self._idle.append(conn)
+            self._available.notify()
+        if broken:
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; uncommitted work is rolled back when the outermost borrow ends"""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._checkout()
+        self._local.conn, self._local.depth = conn, 1
+        broken = False
+        try:
+            yield conn
+        except sqlite3.DatabaseError:
+            broken = not self._healthy(conn)
+            raise
+        finally:
+            self._local.conn = None
+            if not broken and conn.in_transaction:
+                conn.rollback()
+            self._checkin(conn, broken)
+
+    @staticmethod
+    def _healthy(conn):
+        try:
+            conn.execute('SELECT 1')
+            return True
+        except sqlite3.Error:
+            return False
+
+    def close_all(self):
+        """Close idle connections (busy ones close when they are returned broken or the pool is dropped)"""
+        with self._available:
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        """Connection counts and checkout wait times"""
+        with self._available:
+            return {
+                'max_connections': self.max_connections,
+                'open': self._opened,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'wait_seconds': round(self.wait_seconds, 4),
+                'avg_wait_ms': round(1000 * self.wait_seconds / self.waits, 3) if self.waits else 0.0,
+                'max_wait_ms': round(1000 * self.max_wait_seconds, 3)
+            }
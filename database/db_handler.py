@@ -1,22 +1,40 @@
+import re
 import sqlite3
 import pandas as pd
 import json
 from datetime import datetime
 from contextlib import contextmanager
 
+from database.connection_pool import ConnectionPool
+from instrumentation import span
+
+def fts_match_expression(text, prefix=False):
+    """FTS5 query matching every word of free text (None if there are no words)
+    
+    Words are quoted so user input can never be parsed as FTS5 syntax.
+    """
+    words = re.findall(r'\w+', text.lower())
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    if prefix:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
 class DatabaseHandler:
-    def __init__(self, db_path='food_recommendation.db'):
+    def __init__(self, db_path='food_recommendation.db', pool_size=8, cached_statements=256):
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path, max_connections=pool_size, cached_statements=cached_statements)
     
     @contextmanager
     def get_connection(self):
-        """Context manager for database connections"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        try:
+        """Context manager for database connections (borrowed from the pool)
+        
+        The time the connection is held, including any wait for a free one,
+        is recorded as the db_query span.
+        """
+        with span('db_query'), self.pool.connection() as conn:
             yield conn
-        finally:
-            conn.close()
     
     def execute_query(self, query, params=None, fetch=False):
         """Execute a SQL query"""
@@ -31,6 +49,17 @@ class DatabaseHandler:
                 return cursor.fetchall()
             conn.commit()
     
+    def execute_many(self, query, params_seq):
+        """Execute one SQL statement for every parameter tuple, in a single transaction"""
+        with self.get_connection() as conn:
+            cursor = conn.executemany(query, params_seq)
+            conn.commit()
+            return cursor.rowcount
+    
+    def pool_stats(self):
+        """Connection pool metrics (connections in use, checkout waits)"""
+        return self.pool.stats()
+    
     def get_user_food_logs(self, user_id, days=7):
         """Get user's food logs for specified days"""
         query = """
@@ -42,19 +71,22 @@ class DatabaseHandler:
         return self.execute_query(query, params, fetch=True)
     
     def get_user_stats(self, user_id):
-        """Get user's nutrition statistics"""
+        """Get user's nutrition statistics for today from the daily rollup"""
         query = """
         SELECT 
-            SUM(calories) as total_calories,
-            SUM(protein) as total_protein,
-            SUM(carbs) as total_carbs,
-            SUM(fat) as total_fat,
-            COUNT(*) as meal_count
-        FROM user_food_logs 
-        WHERE user_id = ? AND date(timestamp) = date('now')
+            calories as total_calories,
+            protein as total_protein,
+            carbs as total_carbs,
+            fat as total_fat,
+            meal_count
+        FROM user_daily_nutrition 
+        WHERE user_id = ? AND day = date('now')
         """
         result = self.execute_query(query, (user_id,), fetch=True)
-        return dict(result[0]) if result else {}
+        if result:
+            return dict(result[0])
+        return {'total_calories': None, 'total_protein': None, 'total_carbs': None,
+                'total_fat': None, 'meal_count': 0}
     
     def get_foods_by_category(self, category, limit=50):
         """Get foods by category"""
@@ -66,34 +98,83 @@ class DatabaseHandler:
         """
         return self.execute_query(query, (category, limit), fetch=True)
     
-    def search_foods(self, search_term, limit=20):
-        """Search for foods"""
+    def search_foods(self, search_term, limit=20, prefix=False, health_weight=2.0):
+        """Search foods through the FTS5 index, best matches first
+        
+        Rows are ranked by BM25 (name matches weigh most) plus health_score;
+        with prefix=True the last word matches as a prefix, for typeahead.
+        """
+        match = fts_match_expression(search_term, prefix)
+        if match is None:
+            return []
         query = """
-        SELECT * FROM foods 
-        WHERE name LIKE ? OR ingredients LIKE ?
-        ORDER BY health_score DESC 
+        SELECT foods.* FROM foods_fts
+        JOIN foods ON foods.id = foods_fts.rowid
+        WHERE foods_fts MATCH ?
+        ORDER BY bm25(foods_fts, 10.0, 2.0, 1.0, 1.0) - ? * COALESCE(foods.health_score, 0)
         LIMIT ?
         """
-        search_param = f"%{search_term}%"
-        return self.execute_query(query, (search_param, search_param, limit), fetch=True)
+        return self.execute_query(query, (match, health_weight, limit), fetch=True)
+    
+    def suggest_foods(self, prefix, limit=8):
+        """Typeahead suggestions for partially typed text"""
+        return self.search_foods(prefix, limit=limit, prefix=True)
     
     def add_food_log(self, user_id, food_data):
-        """Add a food log entry"""
-        query = """
+        """Add a food log entry and fold it into today's rollup"""
+        self.add_food_logs(user_id, [food_data])
+    
+    def add_food_logs(self, user_id, food_logs):
+        """Add many food log entries for a user with one executemany and one rollup update"""
+        log_query = """
         INSERT INTO user_food_logs 
         (user_id, food_name, calories, protein, carbs, fat, meal_type)
         VALUES (?, ?, ?, ?, ?, ?, ?)
         """
-        params = (
-            user_id,
-            food_data['food_name'],
-            food_data['calories'],
-            food_data.get('protein', 0),
-            food_data.get('carbs', 0),
-            food_data.get('fat', 0),
-            food_data.get('meal_type', 'other')
-        )
-        self.execute_query(query, params)
+        rollup_query = """
+        INSERT INTO user_daily_nutrition (user_id, day, calories, protein, carbs, fat, meal_count)
+        VALUES (?, date('now'), ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, day) DO UPDATE SET
+            calories = calories + excluded.calories,
+            protein = protein + excluded.protein,
+            carbs = carbs + excluded.carbs,
+            fat = fat + excluded.fat,
+            meal_count = meal_count + excluded.meal_count
+        """
+        rows = [
+            (
+                user_id,
+                food_data['food_name'],
+                food_data['calories'],
+                food_data.get('protein', 0),
+                food_data.get('carbs', 0),
+                food_data.get('fat', 0),
+                food_data.get('meal_type', 'other')
+            )
+            for food_data in food_logs
+        ]
+        if not rows:
+            return
+        totals = [sum(row[i] or 0 for row in rows) for i in range(2, 6)]
+        
+        with self.get_connection() as conn:
+            conn.executemany(log_query, rows)
+            conn.execute(rollup_query, (user_id, *totals, len(rows)))
+            conn.commit()
+    
+    def rebuild_daily_nutrition(self):
+        """Recompute every daily rollup from user_food_logs (backfill)"""
+        with self.get_connection() as conn:
+            conn.execute("DELETE FROM user_daily_nutrition")
+            conn.execute("""
+            INSERT INTO user_daily_nutrition (user_id, day, calories, protein, carbs, fat, meal_count)
+            SELECT user_id, date(timestamp),
+                   COALESCE(SUM(calories), 0), COALESCE(SUM(protein), 0),
+                   COALESCE(SUM(carbs), 0), COALESCE(SUM(fat), 0), COUNT(*)
+            FROM user_food_logs
+            GROUP BY user_id, date(timestamp)
+            """)
+            conn.commit()
     
     def update_user_profile(self, user_id, profile_data):
         """Update user profile"""
@@ -0,0 +1,159 @@
+import argparse
+import re
+import sqlite3
+
+# Connection tuning and schema migrations for the app's SQLite database
+# (instance/food_recommendation.db). The schema version lives in
+# PRAGMA user_version; each migration runs once, in order, in its own
+# explicit transaction (DDL included), and only uses IF NOT EXISTS statements
+# or ADD COLUMNs, which are skipped when the column already exists, so it is
+# safe on databases whose tables were created by db.create_all() and on ones
+# a failed run left half-migrated.
+
+PRAGMAS = {
+    'journal_mode': 'WAL',      # readers no longer block the writer
+    'synchronous': 'NORMAL',    # fsync at checkpoints only; safe with WAL
+    'cache_size': -20000,       # negative = KiB, so ~20 MB of page cache per connection
+    'busy_timeout': 5000,       # wait up to 5 s for a lock instead of failing
+    'temp_store': 'MEMORY'
+}
+
+# External-content FTS5 index over the searchable text of foods; the triggers
+# mirror every insert, delete and update (including upserts) into it.
+FOODS_FTS_SCHEMA = [
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS foods_fts USING fts5(
+        name, ingredients, cuisine, category,
+        content='foods', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )''',
+    '''CREATE TRIGGER IF NOT EXISTS foods_fts_insert AFTER INSERT ON foods BEGIN
+        INSERT INTO foods_fts (rowid, name, ingredients, cuisine, category)
+        VALUES (new.id, new.name, new.ingredients, new.cuisine, new.category);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS foods_fts_delete AFTER DELETE ON foods BEGIN
+        INSERT INTO foods_fts (foods_fts, rowid, name, ingredients, cuisine, category)
+        VALUES ('delete', old.id, old.name, old.ingredients, old.cuisine, old.category);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS foods_fts_update AFTER UPDATE OF name, ingredients, cuisine, category ON foods BEGIN
+        INSERT INTO foods_fts (foods_fts, rowid, name, ingredients, cuisine, category)
+        VALUES ('delete', old.id, old.name, old.ingredients, old.cuisine, old.category);
+        INSERT INTO foods_fts (rowid, name, ingredients, cuisine, category)
+        VALUES (new.id, new.name, new.ingredients, new.cuisine, new.category);
+    END'''
+]
+
+MIGRATIONS = [
+    # 1: indexes for the per-user log listing and case-insensitive logins
+    [
+        'CREATE INDEX IF NOT EXISTS ix_user_food_log_user_id_timestamp ON user_food_log (user_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS ix_user_username_lower ON "user" (lower(username))'
+    ],
+    # 2: food catalog table with an FTS5 index kept in sync by triggers
+    [
+        '''CREATE TABLE IF NOT EXISTS foods (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name VARCHAR(200) NOT NULL,
+            category VARCHAR(50),
+            cuisine VARCHAR(50),
+            calories REAL,
+            protein REAL,
+            carbs REAL,
+            fat REAL,
+            fiber REAL,
+            sugar REAL,
+            prep_time INTEGER,
+            complexity VARCHAR(20),
+            health_score REAL,
+            ingredients TEXT,
+            allergens TEXT,
+            meal_type VARCHAR(20)
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_foods_category ON foods (category)',
+        'CREATE INDEX IF NOT EXISTS idx_foods_meal_type ON foods (meal_type)',
+        *FOODS_FTS_SCHEMA,
+        "INSERT INTO foods_fts (foods_fts) VALUES ('rebuild')"
+    ],
+    # 3: catalog versions for incremental sync (see database.catalog_store)
+    [
+        'ALTER TABLE foods ADD COLUMN version INTEGER NOT NULL DEFAULT 0',
+        'ALTER TABLE foods ADD COLUMN updated_at TIMESTAMP',
+        'CREATE INDEX IF NOT EXISTS idx_foods_version ON foods (version)',
+        '''CREATE TABLE IF NOT EXISTS foods_deleted (
+            id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_foods_deleted_version ON foods_deleted (version)'
+    ]
+]
+
+
+def apply_pragmas(conn, pragmas=None):
+    """Apply connection-level PRAGMAs to a sqlite3 connection"""
+    cursor = conn.cursor()
+    for name, value in (pragmas or PRAGMAS).items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+
+ADD_COLUMN = re.compile(r'ALTER TABLE (\S+) ADD COLUMN (\S+)', re.IGNORECASE)
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def column_exists(conn, table, column):
+    return any(row[1] == column for row in conn.execute(f'PRAGMA table_info({table})'))
+
+
+def migrate(conn):
+    """Apply pending migrations; returns the schema version afterwards
+
+    The sqlite3 module does not open transactions for DDL on its own, so the
+    connection is switched to autocommit and every migration is wrapped in
+    BEGIN ... COMMIT by hand; a failing statement rolls the whole migration
+    back. A transaction the caller left open is committed first.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        version = schema_version(conn)
+        for target, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for statement in statements:
+                    add_column = ADD_COLUMN.match(statement.strip())
+                    if add_column and column_exists(conn, *add_column.groups()):
+                        continue
+                    conn.execute(statement)
+                # PRAGMA cannot take parameters; target is an int we control
+                conn.execute(f'PRAGMA user_version={target}')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        return schema_version(conn)
+    finally:
+        conn.isolation_level = isolation_level
+
+
+def main():
+    """Migrate an existing database to the latest schema version"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('db_path', nargs='?', default='instance/food_recommendation.db')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db_path)
+    try:
+        before = schema_version(conn)
+        after = migrate(conn)
+        apply_pragmas(conn)
+    finally:
+        conn.close()
+    print(f"{args.db_path}: schema version {before} -> {after}")
+
+
+if __name__ == '__main__':
+    main()
@@ -28,6 +28,19 @@ CREATE TABLE IF NOT EXISTS user_food_logs (
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
+-- Per-user daily totals of user_food_logs, updated with every log insert
+CREATE TABLE IF NOT EXISTS user_daily_nutrition (
+    user_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    calories REAL NOT NULL DEFAULT 0,
+    protein REAL NOT NULL DEFAULT 0,
+    carbs REAL NOT NULL DEFAULT 0,
+    fat REAL NOT NULL DEFAULT 0,
+    meal_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
 -- User preferences
 CREATE TABLE IF NOT EXISTS user_preferences (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -56,11 +69,47 @@ CREATE TABLE IF NOT EXISTS foods (
     health_score REAL,
     ingredients TEXT,
     allergens TEXT,
-    meal_type VARCHAR(20)
+    meal_type VARCHAR(20),
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Ids of deleted foods and the catalog version that removed them, so
+-- recommender workers can apply deletions incrementally
+CREATE TABLE IF NOT EXISTS foods_deleted (
+    id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL
 );
 
+-- Full-text index over the searchable food columns, kept in sync by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS foods_fts USING fts5(
+    name, ingredients, cuisine, category,
+    content='foods', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS foods_fts_insert AFTER INSERT ON foods BEGIN
+    INSERT INTO foods_fts (rowid, name, ingredients, cuisine, category)
+    VALUES (new.id, new.name, new.ingredients, new.cuisine, new.category);
+END;
+
+CREATE TRIGGER IF NOT EXISTS foods_fts_delete AFTER DELETE ON foods BEGIN
+    INSERT INTO foods_fts (foods_fts, rowid, name, ingredients, cuisine, category)
+    VALUES ('delete', old.id, old.name, old.ingredients, old.cuisine, old.category);
+END;
+
+CREATE TRIGGER IF NOT EXISTS foods_fts_update AFTER UPDATE OF name, ingredients, cuisine, category ON foods BEGIN
+    INSERT INTO foods_fts (foods_fts, rowid, name, ingredients, cuisine, category)
+    VALUES ('delete', old.id, old.name, old.ingredients, old.cuisine, old.category);
+    INSERT INTO foods_fts (rowid, name, ingredients, cuisine, category)
+    VALUES (new.id, new.name, new.ingredients, new.cuisine, new.category);
+END;
+
 -- Create indexes for performance
-CREATE INDEX idx_user_food_logs_user_id ON user_food_logs(user_id);
+CREATE INDEX idx_user_food_logs_user_timestamp ON user_food_logs(user_id, timestamp);
+CREATE INDEX idx_users_username_lower ON users(lower(username));
 CREATE INDEX idx_user_food_logs_timestamp ON user_food_logs(timestamp);
 CREATE INDEX idx_foods_category ON foods(category);
-CREATE INDEX idx_foods_meal_type ON foods(meal_type);
\ No newline at end of file
+CREATE INDEX idx_foods_meal_type ON foods(meal_type);
+CREATE INDEX idx_foods_version ON foods(version);
+CREATE INDEX idx_foods_deleted_version ON foods_deleted(version);
\ No newline at end of file
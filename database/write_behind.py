@@ -0,0 +1,126 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """Group writes from many requests into one transaction every few milliseconds
+
+    submit() hands an item to a background thread and returns a Future. The
+    thread takes whatever has queued up within flush_interval_ms (at most
+    max_batch items) and passes the list to apply_batch, which must write
+    all of it in a single transaction and commit. On SQLite that turns N
+    commits - N fsyncs and N trips through the write lock - into one.
+
+    Durability: an item is durable only once its Future has completed
+    without an exception. Callers that wait on the Future get the same
+    guarantee as a synchronous commit, for up to flush_interval_ms more
+    latency. Callers that do not wait acknowledge writes that can still be
+    lost if the process dies before the next flush (at most one interval of
+    writes plus whatever is queued); stop() and the atexit hook flush the
+    queue on a clean shutdown only.
+
+    If a batch fails, its items are retried one at a time so a single bad
+    item does not fail the others; only that item's Future gets the error.
+    """
+
+    def __init__(self, apply_batch, flush_interval_ms=5, max_batch=500, name='write-behind'):
+        self.apply_batch = apply_batch
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopping = False
+        self.batches = 0
+        self.items = 0
+        self.failures = 0
+        self.max_batch_seen = 0
+
+    def submit(self, item):
+        """Queue an item for the next batch; the Future resolves once it is committed"""
+        if self._stopping:
+            raise RuntimeError(f"{self.name} queue is shut down")
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _ensure_started(self):
+        # Started on first use so forked web workers each get their own thread
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stop = True
+                    break
+                batch.append(entry)
+            self._flush(batch)
+            if stop:
+                return
+
+    def _flush(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            self.apply_batch(items)
+        except Exception as e:
+            logger.warning(f"{self.name} batch of {len(batch)} failed ({str(e)}); retrying items one by one")
+            for item, future in batch:
+                try:
+                    self.apply_batch([item])
+                    future.set_result(None)
+                except Exception as item_error:
+                    self.failures += 1
+                    future.set_exception(item_error)
+        else:
+            for _, future in batch:
+                future.set_result(None)
+
+        self.batches += 1
+        self.items += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+
+    def stop(self, timeout=5.0):
+        """Flush everything queued so far and stop the background thread"""
+        self._stopping = True
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def stats(self):
+        """Batch counters and current queue depth"""
+        return {
+            'queued': self._queue.qsize(),
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+            'max_batch_size': self.max_batch_seen,
+            'failures': self.failures
+        }
@@ -0,0 +1,130 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(path):
+    """(size, mtime_ns) of a file or directory, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+class ArtifactLoader:
+    """Watches artifact files and reloads them in a background thread
+
+    Every interval seconds the loader stats paths (datasets, models,
+    embeddings). Once a change has been seen on two consecutive polls - so
+    a file that is still being written is not picked up half way - it
+    calls reload() in its own thread. reload builds the new objects and
+    swaps them in atomically (e.g. LazyComponent.swap); requests that
+    already hold the old objects finish on them. Each successful reload
+    bumps the version; a failed one keeps the current version and records
+    the error.
+    """
+
+    def __init__(self, paths, reload, interval=5.0, name='artifact-loader'):
+        self.paths = list(paths)
+        self.reload = reload
+        self.interval = interval
+        self.name = name
+        self.version = 1
+        self.loaded_at = datetime.now(timezone.utc)
+        self.last_error = None
+        self.reloads = 0
+        self.failures = 0
+        self._active = self.snapshot()
+        self._pending = None
+        self._failed = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def snapshot(self):
+        """Current fingerprint of every watched path"""
+        return {path: fingerprint(path) for path in self.paths}
+
+    def ensure_started(self):
+        """Start the watcher thread (per process, so forked web workers each get one)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stop the watcher thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"{self.name} check failed: {str(e)}")
+
+    def check(self):
+        """Poll once; returns True if a new version was loaded"""
+        current = self.snapshot()
+        if current == self._active or current == self._failed:
+            self._pending = None
+            return False
+        if current != self._pending:
+            # Changed since the last poll; wait for it to settle
+            self._pending = current
+            return False
+
+        changed = [path for path in self.paths if current[path] != self._active[path]]
+        logger.info(f"{self.name}: reloading after changes to {', '.join(changed)}")
+        started = time.perf_counter()
+        try:
+            self.reload()
+        except Exception as e:
+            self.failures += 1
+            self.last_error = f"{type(e).__name__}: {str(e)}"
+            logger.error(f"{self.name}: reload failed, keeping version {self.version}: {self.last_error}")
+            # Do not retry until the files change again
+            self._failed = current
+            self._pending = None
+            return False
+
+        self._active = current
+        self._pending = None
+        self._failed = None
+        self.version += 1
+        self.reloads += 1
+        self.loaded_at = datetime.now(timezone.utc)
+        self.last_error = None
+        logger.info(f"{self.name}: version {self.version} active after {time.perf_counter() - started:.2f}s")
+        return True
+
+    def versions(self):
+        """Active version and the fingerprint of each artifact it was loaded from"""
+        return {
+            'version': self.version,
+            'loaded_at': self.loaded_at.isoformat(),
+            'reloads': self.reloads,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'watching': self._thread is not None and self._thread.is_alive(),
+            'interval': self.interval,
+            'artifacts': [
+                {
+                    'path': path,
+                    'exists': stat is not None,
+                    'size': stat[0] if stat else None,
+                    'modified': datetime.fromtimestamp(stat[1] / 1e9, timezone.utc).isoformat() if stat else None
+                }
+                for path, stat in self._active.items()
+            ]
+        }
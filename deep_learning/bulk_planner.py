@@ -0,0 +1,177 @@
+import argparse
+import json
+import logging
+import os
+import random
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from types import SimpleNamespace
+
+from deep_learning.food_recommender import FoodRecommender
+from deep_learning.nutrition_calculator import NutritionCalculator
+
+logger = logging.getLogger(__name__)
+
+# Overnight meal-plan generation for whole cohorts. Users are split into
+# blocks; each worker process loads the catalog once (memory-mapped when a
+# snapshot exists) and plans a block with FoodRecommender.generate_meal_plans,
+# which scores the block's users x foods matrix in one pass.
+
+USER_COLUMNS = ['id', 'age', 'gender', 'weight', 'height', 'activity_level', 'dietary_goal']
+PREFERENCE_FIELDS = ['preferred_cuisines', 'allergies', 'disliked_foods', 'favorite_foods']
+
+_worker = {}
+
+
+def load_cohort(db_path):
+    """User records with their preferences from the app's SQLite database"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        preferences = {
+            row['user_id']: {
+                field: json.loads(row[field]) if row[field] else [] for field in PREFERENCE_FIELDS
+            }
+            for row in conn.execute(f"SELECT user_id, {', '.join(PREFERENCE_FIELDS)} FROM user_preferences")
+        }
+        users = []
+        for row in conn.execute(f"SELECT {', '.join(USER_COLUMNS)} FROM user ORDER BY id"):
+            user = dict(row)
+            user['preferences'] = preferences.get(user['id'], {field: [] for field in PREFERENCE_FIELDS})
+            users.append(user)
+        return users
+    finally:
+        conn.close()
+
+
+def _init_worker(data_path, serving_model_path, time_budget_ms, catalog_db=None):
+    """Build one recommender per worker process"""
+    random.seed()
+    if catalog_db:
+        from database.catalog_store import CatalogStore
+        store = CatalogStore(catalog_db, pool_size=1)
+        version, food_data = store.load_catalog()
+        store.pool.close_all()
+        recommender = FoodRecommender(food_data=food_data, catalog_version=version)
+    else:
+        recommender = FoodRecommender(data_path)
+    recommender.meal_planner.time_budget_ms = time_budget_ms
+    if serving_model_path:
+        from deep_learning.serving import NumpyFoodModel
+        recommender.model = NumpyFoodModel(serving_model_path)
+    _worker['recommender'] = recommender
+    _worker['nutrition'] = NutritionCalculator()
+
+
+def _plan_block(records, days, strategy):
+    """[(user_id, meal_plan)] for one block of user records"""
+    recommender = _worker['recommender']
+    users = [SimpleNamespace(**{key: value for key, value in record.items() if key != 'preferences'})
+             for record in records]
+    targets = [_worker['nutrition'].calculate_daily_nutrition(user) for user in users]
+    plans = recommender.generate_meal_plans(
+        users,
+        days=days,
+        preferences=[record.get('preferences') or {} for record in records],
+        strategy=strategy,
+        targets=targets
+    )
+    return [(user.id, plan) for user, plan in zip(users, plans)]
+
+
+def generate_bulk_meal_plans(users, days=7, strategy='optimize', workers=None, block_size=256,
+                             data_path='deep_learning/data/food_dataset.csv', serving_model_path=None,
+                             time_budget_ms=200, progress=None, catalog_db=None):
+    """Yield (user_id, meal_plan) for every user record, in completion order
+
+    users are dicts with the USER_COLUMNS fields and an optional
+    'preferences' dict. The catalog is read from data_path, or from the
+    foods table of the catalog_db database when given (CATALOG_SOURCE=db).
+    workers=0 plans in this process. progress, if given,
+    is called after every block with a dict of users done, total, elapsed
+    seconds and users per second.
+    """
+    blocks = [users[start:start + block_size] for start in range(0, len(users), block_size)]
+    init_args = (data_path, serving_model_path, time_budget_ms, catalog_db)
+    started = time.perf_counter()
+    done = 0
+
+    def report(count):
+        nonlocal done
+        done += count
+        if progress is not None:
+            elapsed = time.perf_counter() - started
+            progress({
+                'done': done,
+                'total': len(users),
+                'elapsed_seconds': round(elapsed, 3),
+                'users_per_second': round(done / elapsed, 1) if elapsed > 0 else 0.0
+            })
+
+    if workers == 0:
+        _init_worker(*init_args)
+        for block in blocks:
+            results = _plan_block(block, days, strategy)
+            report(len(results))
+            yield from results
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as executor:
+        futures = [executor.submit(_plan_block, block, days, strategy) for block in blocks]
+        for future in as_completed(futures):
+            results = future.result()
+            report(len(results))
+            yield from results
+
+
+def main():
+    """Generate meal plans for every user in the database (or a JSON file of users)"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--db', default='instance/food_recommendation.db')
+    parser.add_argument('--users', default=None, help='JSON list of user records instead of --db')
+    parser.add_argument('--data', default='deep_learning/data/food_dataset.csv')
+    parser.add_argument('--catalog-db', default=None,
+                        help='plan from the foods table of this database (CATALOG_SOURCE=db) instead of --data')
+    parser.add_argument('--serving-model', default=None, help='NumPy serving export for neural re-ranking')
+    parser.add_argument('--out', default='meal_plans.jsonl')
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--strategy', choices=['optimize', 'sample'], default='optimize')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--block-size', type=int, default=256)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    if args.users:
+        with open(args.users) as f:
+            users = json.load(f)
+    else:
+        users = load_cohort(args.db)
+
+    def progress(stats):
+        logger.info(f"{stats['done']}/{stats['total']} users planned "
+                    f"({stats['users_per_second']} users/s, {stats['elapsed_seconds']}s)")
+
+    started = time.perf_counter()
+    with open(args.out, 'w') as f:
+        for user_id, meal_plan in generate_bulk_meal_plans(
+            users,
+            days=args.days,
+            strategy=args.strategy,
+            workers=args.workers,
+            block_size=args.block_size,
+            data_path=args.data,
+            serving_model_path=args.serving_model,
+            progress=progress,
+            catalog_db=args.catalog_db
+        ):
+            f.write(json.dumps({'user_id': user_id, 'meal_plan': meal_plan}) + '\n')
+
+    elapsed = time.perf_counter() - started
+    rate = len(users) / elapsed if elapsed > 0 else 0.0
+    print(f"Planned {len(users)} users x {args.days} days in {elapsed:.2f}s ({rate:.1f} users/s) -> {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+import argparse
+import ast
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from deep_learning.food_catalog import FoodCatalog
+
+# Binary, memory-mappable snapshot of the food CSV. A snapshot directory holds
+# one or more compiled versions and a pointer to the live one:
+#
+#   CURRENT                   name of the live version directory
+#   data-<suffix>/            one compiled version:
+#     manifest.json           row count, column kinds, source CSV stat
+#     <col>.npy               numeric and boolean columns
+#     <col>.codes.npy         text columns, int32 codes into the string table (-1 = missing)
+#     <col>.offsets.npy       list columns (ingredients), row i owns codes[offsets[i]:offsets[i+1]]
+#     strings.bytes.npy       UTF-8 bytes of every distinct string, concatenated
+#     strings.offsets.npy     string i is bytes[offsets[i]:offsets[i+1]]
+#
+# Workers open every .npy with mmap_mode='r', so they share the same page
+# cache pages instead of each parsing the CSV into private memory. A new
+# version is written next to the live one and published by replacing CURRENT,
+# so a reader always resolves to a complete version.
+
+SNAPSHOT_VERSION = 1
+LIST_COLUMNS = ['ingredients']
+POINTER_FILE = 'CURRENT'
+VERSION_PREFIX = 'data-'
+
+
+def snapshot_path(csv_path):
+    """Default snapshot directory for a CSV file"""
+    return f'{csv_path}.snapshot'
+
+
+def parse_ingredients(value):
+    """Turn a stringified list ("['a', 'b']") or comma separated text into a list"""
+    if isinstance(value, list):
+        return value
+    if not isinstance(value, str) or not value.strip():
+        return []
+    if value.lstrip().startswith('['):
+        try:
+            return [str(item) for item in ast.literal_eval(value)]
+        except (ValueError, SyntaxError):
+            pass
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def _source_stat(csv_path):
+    stat = os.stat(csv_path)
+    return {'path': os.path.abspath(csv_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+class _StringTable:
+    """Accumulates distinct strings and hands out their codes"""
+
+    def __init__(self):
+        self.codes = {}
+
+    def encode(self, values):
+        return np.array([
+            -1 if value is None else self.codes.setdefault(value, len(self.codes))
+            for value in values
+        ], dtype=np.int32)
+
+    def save(self, directory):
+        encoded = [value.encode('utf-8') for value in self.codes]
+        lengths = np.fromiter((len(value) for value in encoded), dtype=np.int64, count=len(encoded))
+        np.save(os.path.join(directory, 'strings.offsets.npy'), np.concatenate(([0], np.cumsum(lengths))))
+        np.save(os.path.join(directory, 'strings.bytes.npy'), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+
+
+def _umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def compile_snapshot(csv_path, snapshot_dir=None):
+    """Compile a food CSV into a new version of a snapshot directory and publish it"""
+    snapshot_dir = snapshot_dir or snapshot_path(csv_path)
+    source = _source_stat(csv_path)
+    df = pd.read_csv(csv_path)
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix=VERSION_PREFIX, dir=snapshot_dir)
+    strings = _StringTable()
+    columns = []
+
+    for col in df.columns:
+        series = df[col]
+        if col in LIST_COLUMNS:
+            lists = [parse_ingredients(value) for value in series]
+            lengths = np.fromiter((len(items) for items in lists), dtype=np.int64, count=len(lists))
+            np.save(os.path.join(work_dir, f'{col}.offsets.npy'), np.concatenate(([0], np.cumsum(lengths))))
+            np.save(os.path.join(work_dir, f'{col}.codes.npy'),
+                    strings.encode([item for items in lists for item in items]))
+            columns.append({'name': col, 'kind': 'list'})
+        elif pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+            # Catalog columns are stored as float64 so FoodCatalog can map them without a copy
+            values = series.to_numpy()
+            if col in FoodCatalog.NUMERIC_COLUMNS:
+                values = values.astype(np.float64)
+            np.save(os.path.join(work_dir, f'{col}.npy'), values)
+            columns.append({'name': col, 'kind': 'numeric'})
+        else:
+            values = [None if pd.isna(value) else str(value) for value in series]
+            np.save(os.path.join(work_dir, f'{col}.codes.npy'), strings.encode(values))
+            columns.append({'name': col, 'kind': 'text'})
+
+    strings.save(work_dir)
+    with open(os.path.join(work_dir, 'manifest.json'), 'w') as f:
+        json.dump({'version': SNAPSHOT_VERSION, 'rows': len(df), 'source': source, 'columns': columns}, f, indent=2)
+
+    # Publish: os.replace of the pointer is atomic, so readers resolve either
+    # the previous version or the complete new one
+    previous = _current_version(snapshot_dir)
+    fd, pointer_tmp = tempfile.mkstemp(prefix=f'.{POINTER_FILE}-', dir=snapshot_dir)
+    with os.fdopen(fd, 'w') as f:
+        f.write(os.path.basename(work_dir))
+    # mkdtemp/mkstemp create 0700/0600 entries; web workers may run as another user
+    umask = _umask()
+    os.chmod(work_dir, 0o755 & ~umask)
+    os.chmod(pointer_tmp, 0o644 & ~umask)
+    os.replace(pointer_tmp, os.path.join(snapshot_dir, POINTER_FILE))
+
+    # Keep the previous version for readers that resolved it just before the
+    # switch; older versions and files of the flat pre-pointer layout go
+    keep = {os.path.basename(work_dir), previous}
+    for entry in os.listdir(snapshot_dir):
+        path = os.path.join(snapshot_dir, entry)
+        if entry.startswith(VERSION_PREFIX) and entry not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+        elif (entry == 'manifest.json' or entry.endswith('.npy')) and os.path.isfile(path):
+            os.remove(path)
+
+    return snapshot_dir
+
+
+def _current_version(snapshot_dir):
+    """Name of the version directory CURRENT points to, or None"""
+    try:
+        with open(os.path.join(snapshot_dir, POINTER_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def resolve_snapshot(snapshot_dir):
+    """Directory holding the live version of snapshot_dir
+
+    Snapshots compiled before the CURRENT pointer existed keep their files
+    directly in snapshot_dir, which is returned as is.
+    """
+    version = _current_version(snapshot_dir)
+    return os.path.join(snapshot_dir, version) if version else snapshot_dir
+
+
+def is_fresh(snapshot_dir, csv_path=None):
+    """True if snapshot_dir holds a snapshot compiled from the current csv_path"""
+    manifest_path = os.path.join(resolve_snapshot(snapshot_dir), 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return False
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != SNAPSHOT_VERSION:
+        return False
+    if csv_path is None or not os.path.exists(csv_path):
+        return True
+    current = _source_stat(csv_path)
+    return all(manifest['source'][key] == current[key] for key in ('size', 'mtime_ns'))
+
+
+def load_snapshot(snapshot_dir, mmap=True):
+    """Load a snapshot as {column: array}; numeric columns are memory-mapped, list cells are arrays"""
+    mmap_mode = 'r' if mmap else None
+    snapshot_dir = resolve_snapshot(snapshot_dir)
+    with open(os.path.join(snapshot_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+
+    def load(name):
+        return np.load(os.path.join(snapshot_dir, name), mmap_mode=mmap_mode)
+
+    # Only strings some column refers to are decoded, each once; rows share
+    # the decoded objects
+    blob = load('strings.bytes.npy')
+    offsets = load('strings.offsets.npy')
+
+    def decode(codes):
+        used, inverse = np.unique(codes, return_inverse=True)
+        strings = np.array([
+            None if code < 0 else blob[offsets[code]:offsets[code + 1]].tobytes().decode('utf-8')
+            for code in used
+        ], dtype=object)
+        return strings[inverse.reshape(-1)]
+
+    columns = {}
+    for column in manifest['columns']:
+        name, kind = column['name'], column['kind']
+        if kind == 'numeric':
+            columns[name] = load(f'{name}.npy')
+        elif kind == 'text':
+            columns[name] = decode(load(f'{name}.codes.npy'))
+        else:
+            # One object array per row, as views into the decoded items
+            items = decode(load(f'{name}.codes.npy'))
+            bounds = load(f'{name}.offsets.npy')
+            columns[name] = np.fromiter(np.split(items, bounds[1:-1]), dtype=object, count=manifest['rows'])
+
+    return columns
+
+
+def read_food_table(csv_path, snapshot_dir=None):
+    """Food dataset as a DataFrame, from a fresh snapshot when there is one"""
+    snapshot_dir = snapshot_dir or snapshot_path(csv_path)
+    if is_fresh(snapshot_dir, csv_path):
+        return pd.DataFrame(load_snapshot(snapshot_dir, mmap=False))
+    return pd.read_csv(csv_path)
+
+
+def main():
+    """Compile a food CSV into a binary snapshot"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('csv_path', nargs='?', default='deep_learning/data/food_dataset.csv')
+    parser.add_argument('--out', default=None, help='snapshot directory (default: <csv>.snapshot)')
+    args = parser.parse_args()
+
+    snapshot_dir = compile_snapshot(args.csv_path, args.out)
+    print(f"Compiled {args.csv_path} into {snapshot_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+import argparse
+
+import numpy as np
+
+
+class EmbeddingIndex:
+    """Maximum inner product search over the food-tower embeddings
+
+    Small catalogs are searched exactly with one matrix-vector product. Larger
+    ones use an inverted-file (IVF) index: embeddings are clustered with a few
+    rounds of k-means and a query only scans the n_probe lists whose centroids
+    score highest against it.
+    """
+
+    EXACT_SEARCH_LIMIT = 4096
+
+    def __init__(self, embeddings, food_ids, n_lists=None, n_probe=32, seed=42):
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.food_ids = np.asarray(food_ids)
+        self.n_probe = n_probe
+
+        size = len(self.embeddings)
+        if n_lists is None:
+            n_lists = int(np.sqrt(size)) if size > self.EXACT_SEARCH_LIMIT else 0
+        self.centroids, self.list_offsets, self.list_rows = self.build_lists(n_lists, seed)
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    def build_lists(self, n_lists, seed, iterations=10, sample_size=65536):
+        """Cluster the embeddings and group rows by nearest centroid (CSR layout)"""
+        if n_lists <= 0:
+            return None, None, None
+
+        rng = np.random.default_rng(seed)
+        size = len(self.embeddings)
+        sample = self.embeddings[rng.choice(size, min(size, sample_size), replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignment = self.nearest_centroid(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=n_lists)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+        assignment = self.nearest_centroid(self.embeddings, centroids)
+        order = np.argsort(assignment, kind='stable')
+        offsets = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+        return centroids, offsets, order
+
+    @staticmethod
+    def nearest_centroid(vectors, centroids, block_size=8192):
+        """Index of the closest centroid (L2) for every vector, in blocks"""
+        norms = (centroids ** 2).sum(axis=1)
+        return np.concatenate([
+            (norms[None, :] - 2 * vectors[start:start + block_size] @ centroids.T).argmin(axis=1)
+            for start in range(0, len(vectors), block_size)
+        ] or [np.empty(0, dtype=np.intp)])
+
+    def search(self, query, k, allowed=None, n_probe=None):
+        """Rows of the k embeddings with the highest dot product against query
+
+        allowed is an optional boolean mask over rows; rows outside it are never
+        returned. With an IVF index more lists are probed until k allowed rows
+        are found or every list has been scanned. Results are best first.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        if k <= 0 or len(self.embeddings) == 0:
+            return np.empty(0, dtype=np.intp)
+
+        if self.centroids is None:
+            candidates = np.arange(len(self.embeddings))
+        else:
+            probe_order = np.argsort(-(self.centroids @ query))
+            n_probe = n_probe or self.n_probe
+            while True:
+                lists = probe_order[:n_probe]
+                candidates = np.concatenate([
+                    self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in lists
+                ])
+                found = len(candidates) if allowed is None else int(allowed[candidates].sum())
+                if found >= k or n_probe >= len(probe_order):
+                    break
+                n_probe *= 2
+
+        if allowed is not None:
+            candidates = candidates[allowed[candidates]]
+
+        scores = self.embeddings[candidates] @ query
+        if len(candidates) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[best], scores[best]
+        return candidates[np.argsort(-scores, kind='stable')]
+
+    def aligned_to(self, food_ids):
+        """This index with its rows in the order of food_ids, or None if a food is missing
+
+        Rows of foods not in food_ids (e.g. deleted from the catalog) are
+        dropped from the embeddings and the IVF lists; returns self when the
+        order already matches.
+        """
+        food_ids = np.asarray(food_ids)
+        if np.array_equal(self.food_ids, food_ids):
+            return self
+
+        order = np.argsort(self.food_ids, kind='stable')
+        positions = np.searchsorted(self.food_ids[order], food_ids)
+        found = positions < len(order)
+        found[found] = self.food_ids[order[positions[found]]] == food_ids[found]
+        if not found.all():
+            return None
+
+        # Row i of the aligned index is row rows[i] of this one
+        rows = order[positions]
+        index = EmbeddingIndex.__new__(EmbeddingIndex)
+        index.embeddings = np.ascontiguousarray(self.embeddings[rows])
+        index.food_ids = self.food_ids[rows]
+        index.n_probe = self.n_probe
+        index.centroids = index.list_offsets = index.list_rows = None
+        if self.centroids is not None:
+            new_row = np.full(len(self.embeddings), -1, dtype=np.intp)
+            new_row[rows] = np.arange(len(rows))
+            lists = np.repeat(np.arange(len(self.centroids)), np.diff(self.list_offsets))
+            list_rows = new_row[self.list_rows]
+            kept = list_rows >= 0
+            counts = np.bincount(lists[kept], minlength=len(self.centroids))
+            index.centroids = self.centroids
+            index.list_offsets = np.concatenate(([0], np.cumsum(counts)))
+            index.list_rows = list_rows[kept]
+        return index
+
+    def save(self, path):
+        """Persist embeddings and the IVF lists to an .npz file"""
+        arrays = {'embeddings': self.embeddings, 'food_ids': self.food_ids}
+        if self.centroids is not None:
+            arrays.update(centroids=self.centroids, list_offsets=self.list_offsets, list_rows=self.list_rows)
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path, n_probe=32):
+        """Load an index written by save()"""
+        data = np.load(path)
+        index = cls.__new__(cls)
+        index.embeddings = np.ascontiguousarray(data['embeddings'], dtype=np.float32)
+        index.food_ids = data['food_ids']
+        index.n_probe = n_probe
+        if 'centroids' in data:
+            index.centroids = data['centroids']
+            index.list_offsets = data['list_offsets']
+            index.list_rows = data['list_rows']
+        else:
+            index.centroids = index.list_offsets = index.list_rows = None
+        return index
+
+
+def main():
+    """Export food-tower embeddings for a catalog and build the search index"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--model', default='models/food_recommender.h5')
+    parser.add_argument('--data', default='deep_learning/data/food_dataset.csv')
+    parser.add_argument('--db', default=None,
+                        help='export the foods table of this database (CATALOG_SOURCE=db) instead of --data')
+    parser.add_argument('--out', default='models/food_embeddings.npz')
+    parser.add_argument('--lists', type=int, default=None, help='IVF lists (default: sqrt(n), 0 = exact)')
+    args = parser.parse_args()
+
+    import pandas as pd
+    from deep_learning.model import FoodRecommendationModel
+
+    model = FoodRecommendationModel()
+    model.load_model(args.model)
+    if args.db:
+        from database.catalog_store import CatalogStore
+        store = CatalogStore(args.db)
+        _, food_data = store.load_catalog()
+        store.pool.close_all()
+    else:
+        food_data = pd.read_csv(args.data)
+
+    index = EmbeddingIndex(model.food_embeddings(food_data), food_data['food_id'].to_numpy(), n_lists=args.lists)
+    index.save(args.out)
+    print(f"Exported {len(index)} food embeddings to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Shared encodings for the recommendation model's inputs. This module only
+# depends on NumPy so the features can be built without TensorFlow.
+ACTIVITY_MAPPING = {'sedentary': 0, 'light': 0.25, 'moderate': 0.5, 'active': 0.75, 'very_active': 1}
+GOAL_MAPPING = {
+    'weight_loss': 0, 'weight_gain': 1, 'maintenance': 0.5,
+    'muscle_gain': 0.75, 'health_maintenance': 0.5
+}
+COMPLEXITY_MAPPING = {'easy': 0.0, 'medium': 0.5, 'hard': 1.0}
+
+USER_FIELDS = ['age', 'gender', 'weight', 'height', 'activity_level', 'dietary_goal']
+
+# Widths of the user and food towers' inputs, i.e. of the matrices below
+USER_FEATURE_COUNT = 5
+FOOD_FEATURE_COUNT = 10
+
+
+def as_user_record(user_data):
+    """Plain dict of the user fields the model needs (accepts dicts or ORM users)"""
+    if isinstance(user_data, dict):
+        return user_data
+    record = {field: getattr(user_data, field, None) for field in USER_FIELDS}
+    record['gender'] = (record['gender'] or 'other').lower()
+    return record
+
+
+def encode_labels(classes, values, unknown=None):
+    """Vectorized LabelEncoder.transform given the encoder's classes_
+
+    Labels missing from classes raise ValueError, like LabelEncoder, unless
+    an unknown code is given for them.
+    """
+    classes = np.asarray(classes)
+    values = np.asarray(values)
+    if classes.dtype.kind in 'OUS':
+        classes = classes.astype(object)
+        values = values.astype(object)
+    positions = np.searchsorted(classes, values)
+    clipped = np.minimum(positions, len(classes) - 1)
+    unseen = (positions >= len(classes)) | (classes[clipped] != values)
+    if unseen.any():
+        labels = np.unique(values[unseen]).tolist()
+        if unknown is None:
+            raise ValueError(f"y contains previously unseen labels: {labels}")
+        logger.warning(f"Encoding labels the model was not trained on as {unknown}: {labels}")
+        positions = np.where(unseen, unknown, positions)
+    return positions
+
+
+def check_input_widths(user_width, food_width, source):
+    """Raise ValueError unless a model's inputs match the matrices built here"""
+    if (user_width, food_width) != (USER_FEATURE_COUNT, FOOD_FEATURE_COUNT):
+        raise ValueError(
+            f"{source} takes {user_width} user and {food_width} food features; serving builds "
+            f"{USER_FEATURE_COUNT} and {FOOD_FEATURE_COUNT}"
+        )
+
+
+def user_feature_matrix(users, gender_classes):
+    """Unscaled feature matrix with one row per user record"""
+    age = np.array([user['age'] for user in users], dtype=float)
+    weight = np.array([user['weight'] for user in users], dtype=float)
+    height = np.array([user['height'] for user in users], dtype=float)
+    gender = encode_labels(gender_classes, [user['gender'] for user in users])
+
+    return np.column_stack([
+        age / 100,
+        gender / 2,
+        weight / ((height / 100) ** 2) / 50,
+        [ACTIVITY_MAPPING.get(user['activity_level'], 0.5) for user in users],
+        [GOAL_MAPPING.get(user['dietary_goal'], 0.5) for user in users]
+    ]).astype(np.float32)
+
+
+def food_feature_matrix(foods, category_classes):
+    """Feature matrix with one row per food
+
+    foods is a DataFrame or a mapping of column name to array (such as
+    FoodCatalog.columns); optional columns fall back to the same defaults
+    as FoodRecommendationModel._extract_food_features.
+    """
+    def column(name, default):
+        if name in foods:
+            return np.asarray(foods[name], dtype=float)
+        return np.full(size, default, dtype=float)
+
+    size = len(foods['calories'])
+    fiber = np.asarray(foods['fiber'], dtype=float) / 50 if 'fiber' in foods else np.full(size, 0.1)
+    sugar = np.asarray(foods['sugar'], dtype=float) / 100 if 'sugar' in foods else np.full(size, 0.05)
+    complexity = np.full(size, 0.5)
+    if 'complexity' in foods:
+        complexity = np.array([
+            COMPLEXITY_MAPPING.get(value, 0.5) if isinstance(value, str) else float(value)
+            for value in foods['complexity']
+        ], dtype=float)
+
+    return np.column_stack([
+        column('calories', 0) / 1000,
+        column('protein', 0) / 100,
+        column('carbs', 0) / 200,
+        column('fat', 0) / 100,
+        fiber,
+        sugar,
+        # Categories added to the catalog after training share one extra code
+        encode_labels(category_classes, foods['category'], unknown=len(category_classes)) / 20,
+        column('health_score', 0.5),
+        np.minimum(column('prep_time', 30) / 120, 1),
+        complexity
+    ]).astype(np.float32)
@@ -0,0 +1,240 @@
+import numpy as np
+import pandas as pd
+
+
+class SubstringIndex:
+    """Trigram inverted index answering case-insensitive substring queries
+
+    Every lowercased string is split into overlapping byte trigrams; a query
+    intersects the posting lists of its own trigrams and only verifies the
+    few surviving rows, instead of scanning the whole column.
+    """
+
+    N = 3
+
+    def __init__(self, values_lower):
+        self.values = values_lower
+        self.size = len(values_lower)
+        self.codes, self.offsets, self.postings = self.build(values_lower)
+
+    @classmethod
+    def build(cls, values_lower):
+        """Build (trigram codes, posting offsets, posting rows) in CSR layout"""
+        encoded = [value.encode('utf-8') for value in values_lower]
+        lengths = np.fromiter((len(value) for value in encoded), dtype=np.int64, count=len(encoded))
+        buffer = np.frombuffer(b'\x00'.join(encoded) + b'\x00' * cls.N, dtype=np.uint8).astype(np.int32)
+        row_of_byte = np.repeat(np.arange(len(encoded), dtype=np.int64), lengths + 1)
+
+        # A trigram starting at byte i is valid if it does not cross a separator
+        starts = np.arange(len(row_of_byte))
+        valid = np.ones(len(starts), dtype=bool)
+        for k in range(cls.N):
+            valid &= buffer[starts + k] != 0
+        starts = starts[valid]
+
+        codes = (buffer[starts] << 16) | (buffer[starts + 1] << 8) | buffer[starts + 2]
+        pairs = np.sort(codes.astype(np.int64) << 32 | row_of_byte[starts])
+        pairs = pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))[:len(pairs)]]
+        codes = (pairs >> 32).astype(np.int32)
+        rows = (pairs & 0xFFFFFFFF).astype(np.intp)
+
+        first = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1]))[:len(codes)])
+        return codes[first], np.append(first, len(rows)), rows
+
+    def posting(self, code):
+        """Sorted rows containing the trigram code"""
+        i = np.searchsorted(self.codes, code)
+        if i == len(self.codes) or self.codes[i] != code:
+            return self.postings[:0]
+        return self.postings[self.offsets[i]:self.offsets[i + 1]]
+
+    def lookup(self, term):
+        """Sorted rows whose value contains term (term must be lowercase)"""
+        encoded = term.encode('utf-8')
+        if len(encoded) < self.N:
+            # Too short for a trigram: plain scan
+            return np.flatnonzero(np.fromiter(
+                (term in value for value in self.values), dtype=bool, count=self.size
+            ))
+
+        grams = {
+            (encoded[i] << 16) | (encoded[i + 1] << 8) | encoded[i + 2]
+            for i in range(len(encoded) - self.N + 1)
+        }
+        lists = sorted((self.posting(code) for code in grams), key=len)
+        candidates = lists[0]
+        for rows in lists[1:]:
+            if len(candidates) == 0:
+                break
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+
+        # Trigrams can all be present without being contiguous, so verify
+        return candidates[np.fromiter(
+            (term in self.values[row] for row in candidates), dtype=bool, count=len(candidates)
+        )]
+
+
+class FoodCatalog:
+    """Columnar, read-only copy of the food dataset with precomputed row indexes"""
+
+    NUMERIC_COLUMNS = ['food_id', 'calories', 'protein', 'carbs', 'fat', 'fiber', 'sugar',
+                       'health_score', 'prep_time']
+    TEXT_COLUMNS = ['name', 'category', 'cuisine', 'meal_type', 'allergens', 'complexity']
+    INDEXED_COLUMNS = ['meal_type', 'category', 'cuisine', 'allergens']
+
+    def __init__(self, food_data):
+        # food_data is a DataFrame or a {column: array} mapping (e.g. a loaded snapshot)
+        self.size = len(food_data['name'])
+        self.columns = self.column_arrays(food_data)
+        self.columns['name_lower'] = np.array([name.lower() for name in self.columns['name']], dtype=object)
+
+        # value -> sorted row positions, for every indexed column
+        self.indexes = {col: self.build_index(self.columns[col]) for col in self.INDEXED_COLUMNS}
+
+        # Name substring index and one packed bitset per allergen
+        self.name_index = SubstringIndex(self.columns['name_lower'])
+        self.allergen_bitsets = self.build_allergen_bitsets(self.indexes['allergens'], self.size)
+
+    def __len__(self):
+        return self.size
+
+    @classmethod
+    def column_arrays(cls, food_data):
+        """Numeric and text columns of food_data as the arrays the catalog stores"""
+        size = len(food_data['name'])
+        columns = {}
+
+        # Numeric columns as contiguous float arrays (memory-mapped float64 columns are not copied)
+        for col in cls.NUMERIC_COLUMNS:
+            if col in food_data:
+                columns[col] = np.ascontiguousarray(np.asarray(food_data[col], dtype=float))
+
+        # Text columns as object arrays, missing values as empty strings
+        for col in cls.TEXT_COLUMNS:
+            if col in food_data:
+                columns[col] = pd.Series(food_data[col]).fillna('').astype(str).to_numpy(dtype=object)
+            else:
+                columns[col] = np.full(size, '', dtype=object)
+        return columns
+
+    def apply_changes(self, upserts=None, deleted_ids=()):
+        """New catalog with upserted foods (matched on food_id) and deletions applied
+
+        Updated foods keep their row, new foods are appended and deleted rows
+        are dropped; only the changed rows are written into copies of the
+        column arrays, then the row indexes are rebuilt. The catalog itself
+        is never modified, so readers holding it are unaffected.
+        """
+        columns = {col: values for col, values in self.columns.items() if col != 'name_lower'}
+        food_ids = columns['food_id']
+
+        if upserts is not None and len(upserts.get('food_id', ())):
+            incoming = self.column_arrays(upserts)
+            order = np.argsort(food_ids, kind='stable')
+            positions = np.searchsorted(food_ids[order], incoming['food_id'])
+            found = positions < len(order)
+            found[found] = food_ids[order[positions[found]]] == incoming['food_id'][found]
+            rows = order[positions[found]]
+
+            merged = {}
+            for col in set(columns) | set(incoming):
+                numeric = col in self.NUMERIC_COLUMNS
+                filler = np.nan if numeric else ''
+                current = columns.get(col)
+                if current is None:
+                    current = np.full(self.size, filler, dtype=float if numeric else object)
+                new_values = incoming.get(col)
+                if new_values is None:
+                    new_values = np.full(len(found), filler, dtype=float if numeric else object)
+
+                values = current.copy()
+                values[rows] = new_values[found]
+                merged[col] = np.concatenate((values, new_values[~found]))
+            columns = merged
+
+        if len(deleted_ids):
+            keep = ~np.isin(columns['food_id'], np.asarray(deleted_ids, dtype=float))
+            columns = {col: values[keep] for col, values in columns.items()}
+
+        return FoodCatalog(columns)
+
+    @staticmethod
+    def build_index(values):
+        """Map each distinct value to the sorted array of rows holding it"""
+        if len(values) == 0:
+            return {}
+        codes, uniques = pd.factorize(values)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        return {
+            value: order[bounds[i]:bounds[i + 1]]
+            for i, value in enumerate(uniques)
+        }
+
+    @staticmethod
+    def build_allergen_bitsets(allergen_index, size):
+        """Packed bitset of rows per individual allergen (comma separated values)"""
+        bitmaps = {}
+        for value, rows in allergen_index.items():
+            for allergen in value.lower().split(','):
+                allergen = allergen.strip()
+                if not allergen:
+                    continue
+                bitmap = bitmaps.setdefault(allergen, np.zeros(size, dtype=bool))
+                bitmap[rows] = True
+        return {allergen: np.packbits(bitmap) for allergen, bitmap in bitmaps.items()}
+
+    def rows(self, column, value):
+        """Rows whose column equals value"""
+        return self.indexes[column].get(value, np.empty(0, dtype=np.intp))
+
+    def mask(self, column, values):
+        """Bitmap of rows whose column equals any of values"""
+        bitmap = np.zeros(self.size, dtype=bool)
+        for value in values:
+            bitmap[self.rows(column, value)] = True
+        return bitmap
+
+    def allergen_mask(self, allergies):
+        """Bitmap of rows whose allergens mention any of the given allergies
+
+        Allergies are split on commas like the allergens are, so an entry
+        such as "dairy, nuts" excludes every food the whole-string match
+        would have excluded (and foods with only one of the two).
+        """
+        terms = [term.strip() for allergy in allergies if allergy for term in allergy.lower().split(',')]
+        terms = [term for term in terms if term]
+        packed = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        for allergen, bitset in self.allergen_bitsets.items():
+            if any(term in allergen for term in terms):
+                packed |= bitset
+        return np.unpackbits(packed, count=self.size).astype(bool)
+
+    def name_mask(self, terms, rows):
+        """Bitmap over rows whose name contains any of the given terms"""
+        bitmap = np.zeros(self.size, dtype=bool)
+        for term in terms:
+            if term:
+                bitmap[self.name_index.lookup(term.lower())] = True
+        return bitmap[rows]
+
+    def select(self, meal_type='all', allergies=None, disliked_foods=None):
+        """Rows matching meal_type with allergens and disliked foods excluded"""
+        if meal_type != 'all':
+            rows = self.rows('meal_type', meal_type)
+        else:
+            rows = np.arange(self.size)
+
+        if allergies:
+            rows = rows[~self.allergen_mask(allergies)[rows]]
+
+        if disliked_foods:
+            rows = rows[~self.name_mask(disliked_foods, rows)]
+
+        return rows
+
+    def take(self, rows):
+        """Column arrays restricted to rows, plus the catalog row of each entry"""
+        foods = {col: values[rows] for col, values in self.columns.items()}
+        foods['row'] = rows
+        return foods
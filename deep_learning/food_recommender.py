@@ -1,18 +1,63 @@
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+import copy
 import json
+import logging
 from datetime import datetime, timedelta
 import random
+from types import SimpleNamespace
+
+from deep_learning.food_catalog import FoodCatalog
+from deep_learning.catalog_snapshot import snapshot_path, is_fresh, load_snapshot
+from deep_learning.features import as_user_record
+from deep_learning.meal_planner import MealPlanner
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
 
 class FoodRecommender:
-    def __init__(self, data_path='deep_learning/data/food_dataset.csv'):
-        self.food_data = self.load_food_data(data_path)
+    MEAL_TYPES = ['breakfast', 'lunch', 'dinner', 'snack']
+    
+    def __init__(self, data_path='deep_learning/data/food_dataset.csv', model=None,
+                 rerank_weight=0.5, rerank_pool_factor=5, retrieval_factor=20, meal_planner=None,
+                 food_data=None, catalog_version=0):
+        # food_data (DataFrame or {column: array}) replaces the dataset at data_path, e.g. a
+        # catalog loaded from database.catalog_store at catalog_version
+        self._food_source = food_data if food_data is not None else self.load_food_data(data_path)
+        self._food_data = self._food_source if isinstance(self._food_source, pd.DataFrame) else None
+        self.catalog = FoodCatalog(self._food_source)
+        self.catalog_version = catalog_version
         self.user_preferences = {}
-        self.model = None
         
+        # Optional neural re-ranking stage; any object with predict_batch works
+        self.model = model
+        self.rerank_weight = rerank_weight
+        self.rerank_pool_factor = rerank_pool_factor
+        
+        # Optional embedding index for candidate retrieval ahead of scoring
+        self.embedding_index = None
+        self.retrieval_factor = retrieval_factor
+        
+        # Planner used by the 'optimize' meal-plan strategy
+        self.meal_planner = meal_planner or MealPlanner()
+        
+    @property
+    def food_data(self):
+        """Food dataset as a DataFrame (built on first access when loaded from a snapshot)"""
+        if self._food_data is None:
+            self._food_data = pd.DataFrame(dict(self._food_source))
+        return self._food_data
+    
     def load_food_data(self, path):
-        """Load and prepare food dataset"""
+        """Load and prepare food dataset
+        
+        A fresh binary snapshot (see deep_learning.catalog_snapshot) is memory-mapped
+        and returned as {column: array}; otherwise the CSV is parsed into a DataFrame.
+        """
+        snapshot_dir = snapshot_path(path)
+        if is_fresh(snapshot_dir, path):
+            return load_snapshot(snapshot_dir)
+        
         try:
             df = pd.read_csv(path)
         except FileNotFoundError:
@@ -23,13 +68,14 @@ class FoodRecommender:
         
         return df
 
-    def create_sample_dataset(self):
+    @staticmethod
+    def create_sample_dataset(n_samples=1000):
         """Create a sample food dataset"""
         categories = ['Breakfast', 'Lunch', 'Dinner', 'Snack', 'Dessert', 'Salad', 'Soup', 'Main Course']
         cuisines = ['Italian', 'Indian', 'Chinese', 'Mexican', 'Mediterranean', 'American', 'Japanese']
         
         data = []
-        for i in range(1000):
+        for i in range(n_samples):
             food = {
                 'food_id': i,
                 'name': f'Food Item {i}',
@@ -55,165 +101,381 @@ class FoodRecommender:
     def get_recommendations(self, user_id, user_data, meal_type='all', preferences=None, top_n=10):
         """Get personalized food recommendations"""
         
-        # Filter by meal type if specified
-        if meal_type != 'all':
-            filtered_foods = self.food_data[self.food_data['meal_type'] == meal_type]
-        else:
-            filtered_foods = self.food_data
-        
-        # Apply dietary restrictions
-        if preferences and 'allergies' in preferences:
-            filtered_foods = self.filter_allergies(filtered_foods, preferences['allergies'])
-        
-        # Apply disliked foods filter
-        if preferences and 'disliked_foods' in preferences:
-            filtered_foods = self.filter_disliked_foods(filtered_foods, preferences['disliked_foods'])
-        
-        # Calculate scores for each food
-        recommendations = []
-        for _, food in filtered_foods.iterrows():
-            score = self.calculate_food_score(food, user_data, preferences)
-            
-            if score > 0:  # Only include foods with positive score
-                recommendations.append({
-                    'food_id': int(food['food_id']),
-                    'name': food['name'],
-                    'category': food['category'],
-                    'calories': float(food['calories']),
-                    'protein': float(food['protein']),
-                    'carbs': float(food['carbs']),
-                    'fat': float(food['fat']),
-                    'health_score': float(food['health_score']),
-                    'prep_time': int(food['prep_time']),
-                    'score': float(score),
-                    'meal_suitability': food['meal_type']
-                })
-        
-        # Sort by score and return top N
-        recommendations.sort(key=lambda x: x['score'], reverse=True)
-        return recommendations[:top_n]
+        preferences = preferences or {}
+        
+        # Filter by meal type and dietary restrictions using the catalog indexes
+        with span('catalog_filter'):
+            rows = self.catalog.select(
+                meal_type,
+                allergies=preferences.get('allergies'),
+                disliked_foods=preferences.get('disliked_foods')
+            )
+        
+        # Narrow large catalogs down to the nearest embeddings first
+        if self.embedding_index is not None and self.model is not None:
+            rows = self.retrieve_candidates(rows, user_data, top_n)
+        
+        # Score every candidate at once and keep the best N
+        with span('scoring'):
+            foods = self.catalog.take(rows)
+            scores = self.score_foods(foods, user_data, preferences)
+        if self.model is not None:
+            scores = self.rerank(rows, scores, user_data, top_n)
+        with span('sorting'):
+            top_rows = self.select_top_n(scores, top_n)
+        
+        return [self.build_recommendation(foods, row, scores[row]) for row in top_rows]
     
-    def calculate_food_score(self, food, user_data, preferences=None):
-        """Calculate personalized score for a food item"""
-        score = 0
-        
+    def score_foods(self, foods, user_data, preferences=None):
+        """Personalized score for every row of the column arrays in foods"""
         # 1. Nutritional scoring based on user goals
-        score += self.nutritional_score(food, user_data)
+        score = self.nutritional_scores(foods, user_data)
         
         # 2. Preference scoring
         if preferences:
-            score += self.preference_score(food, preferences)
+            score += self.preference_scores(foods, preferences)
         
         # 3. Health score
-        score += food['health_score'] * 0.3
+        score += foods['health_score'] * 0.3
         
         # 4. Meal type suitability
-        if user_data.activity_level == 'very_active' and food['calories'] > 400:
-            score += 0.2
-        elif user_data.activity_level == 'sedentary' and food['calories'] < 300:
-            score += 0.2
+        score += self.activity_scores(foods, user_data)
         
-        return max(0, score)
+        return np.maximum(score, 0)
     
-    def nutritional_score(self, food, user_data):
-        """Calculate nutritional score based on user profile"""
-        score = 0
-        
-        # Calculate BMI
-        bmi = user_data.weight / ((user_data.height / 100) ** 2)
+    def activity_scores(self, foods, user_data):
+        """Meal-size bonus for very active and sedentary users, one value per row"""
+        calories = foods['calories']
+        if user_data.activity_level == 'very_active':
+            return np.where(calories > 400, 0.2, 0.0)
+        elif user_data.activity_level == 'sedentary':
+            return np.where(calories < 300, 0.2, 0.0)
+        return np.zeros(len(calories))
+    
+    def nutritional_scores(self, foods, user_data):
+        """Dietary goal and activity level score, one value per row of foods"""
+        calories = foods['calories']
+        protein = foods['protein']
+        carbs = foods['carbs']
+        fat = foods['fat']
+        score = np.zeros(len(calories))
         
-        # Adjust scores based on dietary goals
         if user_data.dietary_goal == 'weight_loss':
-            # Lower calories, higher protein
-            if food['calories'] < 400:
-                score += 0.3
-            if food['protein'] > 20:
-                score += 0.2
-            if food['fat'] < 15:
-                score += 0.1
+            score += np.where(calories < 400, 0.3, 0.0)
+            score += np.where(protein > 20, 0.2, 0.0)
+            score += np.where(fat < 15, 0.1, 0.0)
         
         elif user_data.dietary_goal == 'weight_gain':
-            # Higher calories, balanced macros
-            if food['calories'] > 500:
-                score += 0.2
-            if food['protein'] > 25:
-                score += 0.2
-            if 20 < food['carbs'] < 80:
-                score += 0.1
+            score += np.where(calories > 500, 0.2, 0.0)
+            score += np.where(protein > 25, 0.2, 0.0)
+            score += np.where((carbs > 20) & (carbs < 80), 0.1, 0.0)
         
         elif user_data.dietary_goal == 'muscle_gain':
-            # Very high protein
-            if food['protein'] > 30:
-                score += 0.4
-            if food['calories'] > 400:
-                score += 0.2
+            score += np.where(protein > 30, 0.4, 0.0)
+            score += np.where(calories > 400, 0.2, 0.0)
         
         # Activity level adjustment
         if user_data.activity_level in ['active', 'very_active']:
-            if food['carbs'] > 40:
-                score += 0.1
+            score += np.where(carbs > 40, 0.1, 0.0)
         
         return score
     
-    def preference_score(self, food, preferences):
-        """Score based on user preferences"""
-        score = 0
+    def preference_scores(self, foods, preferences):
+        """Preferred cuisine and favorite food score, one value per row of foods"""
+        score = np.zeros(len(foods['row']))
         
         # Preferred cuisines
-        if 'preferred_cuisines' in preferences and food['cuisine'] in preferences['preferred_cuisines']:
-            score += 0.3
+        if 'preferred_cuisines' in preferences:
+            preferred = np.isin(foods['cuisine'], list(preferences['preferred_cuisines']))
+            score += np.where(preferred, 0.3, 0.0)
         
-        # Favorite foods (partial matching)
-        if 'favorite_foods' in preferences:
-            for fav in preferences['favorite_foods']:
-                if fav.lower() in food['name'].lower():
-                    score += 0.4
-                    break
+        # Favorite foods (partial matching, counted once per food)
+        if 'favorite_foods' in preferences and preferences['favorite_foods']:
+            matched = self.catalog.name_mask(preferences['favorite_foods'], foods['row'])
+            score += np.where(matched, 0.4, 0.0)
         
         return score
     
-    def filter_allergies(self, foods, allergies):
-        """Filter out foods containing allergens"""
-        if not allergies:
-            return foods
-        
-        filtered = foods.copy()
-        for allergy in allergies:
-            filtered = filtered[~filtered['allergens'].str.contains(allergy, case=False, na=False)]
+    def with_catalog_changes(self, upserts=None, deleted_ids=(), version=None):
+        """Copy of this recommender with catalog changes applied
+        
+        The copy shares the model, planner and preferences but gets a new
+        catalog (see FoodCatalog.apply_changes), so requests still holding
+        this recommender finish on the old catalog. The embedding index is
+        realigned to the new catalog, or dropped if it lacks a new food.
+        """
+        updated = copy.copy(self)
+        updated.catalog = self.catalog.apply_changes(upserts, deleted_ids)
+        updated._food_source = {
+            col: values for col, values in updated.catalog.columns.items() if col != 'name_lower'
+        }
+        updated._food_data = None
+        if version is not None:
+            updated.catalog_version = version
         
-        return filtered
+        updated.embedding_index = None
+        updated.set_embedding_index(self.embedding_index)
+        return updated
+    
+    def sync_catalog(self, store):
+        """Recommender with every change made in store since catalog_version applied
+        
+        Returns self when nothing changed.
+        """
+        version, upserts, deleted_ids = store.changes_since(self.catalog_version)
+        if version == self.catalog_version:
+            return self
+        return self.with_catalog_changes(upserts, deleted_ids, version)
+    
+    def set_embedding_index(self, index):
+        """Attach an EmbeddingIndex, reordered to the catalog's rows
+        
+        An index without embeddings for some of the catalog's foods is not
+        attached (a warning is logged) and candidates come from the full
+        rule-based ranking instead.
+        """
+        if index is not None:
+            aligned = index.aligned_to(self.catalog.columns['food_id'])
+            if aligned is None:
+                logger.warning(f"Embedding index ({len(index)} foods) lacks foods of the catalog "
+                               f"({len(self.catalog)} foods); export it again to use it")
+            index = aligned
+        self.embedding_index = index
+    
+    def retrieve_candidates(self, rows, user_data, top_n):
+        """Rows among rows whose embeddings best match the user's query vector"""
+        allowed = np.zeros(len(self.catalog), dtype=bool)
+        allowed[rows] = True
+        
+        with span('model_inference'):
+            query = self.model.user_query_vectors([as_user_record(user_data)])[0]
+        with span('embedding_search'):
+            found = self.embedding_index.search(query, top_n * self.retrieval_factor, allowed=allowed)
+        return np.sort(found)
     
-    def filter_disliked_foods(self, foods, disliked_foods):
-        """Filter out disliked foods"""
-        if not disliked_foods:
-            return foods
+    def rerank(self, rows, scores, user_data, top_n):
+        """Blend the model's predicted preference into the best rule-based candidates
+        
+        Only the top top_n * rerank_pool_factor candidates are sent to the model,
+        in one batch; everything outside that pool drops out of the ranking.
+        """
+        pool = self.select_top_n(scores, top_n * self.rerank_pool_factor)
+        if len(pool) == 0:
+            return scores
+        
+        with span('model_inference'):
+            predictions = self.model.predict_batch(
+                as_user_record(user_data),
+                self.catalog.columns,
+                food_rows=rows[pool],
+                cache_key=self.catalog
+            )
+        
+        reranked = np.zeros_like(scores)
+        reranked[pool] = scores[pool] + self.rerank_weight * predictions
+        return reranked
+    
+    def select_top_n(self, scores, top_n):
+        """Positions of the top_n positive scores, best first
+        
+        Uses argpartition instead of a full sort; ties keep catalog order,
+        exactly like a stable descending sort would.
+        """
+        candidates = np.flatnonzero(scores > 0)
+        if top_n <= 0:
+            return candidates[:0]
+        
+        if len(candidates) > top_n:
+            candidate_scores = scores[candidates]
+            cutoff = candidate_scores[np.argpartition(candidate_scores, -top_n)[-top_n:]].min()
+            above = candidate_scores > cutoff
+            at_cutoff = np.flatnonzero(candidate_scores == cutoff)[:top_n - int(above.sum())]
+            above[at_cutoff] = True
+            candidates = candidates[above]
+        
+        order = np.argsort(-scores[candidates], kind='stable')
+        return candidates[order]
+    
+    def build_recommendation(self, foods, row, score):
+        """Build the response dict for one row of the column arrays in foods"""
+        food = {col: values[row] for col, values in foods.items()}
+        return {
+            'food_id': int(food['food_id']),
+            'name': food['name'],
+            'category': food['category'],
+            'calories': float(food['calories']),
+            'protein': float(food['protein']),
+            'carbs': float(food['carbs']),
+            'fat': float(food['fat']),
+            'health_score': float(food['health_score']),
+            'prep_time': int(food['prep_time']),
+            'score': float(score),
+            'meal_suitability': food['meal_type']
+        }
+    
+    def rank_meal_pools(self, user_data, meal_types, preferences=None, top_n=5):
+        """Top-N recommendations for several meal types from one scoring pass
+        
+        Equivalent to calling get_recommendations once per meal type, but the
+        catalog is filtered and scored only once.
+        """
+        preferences = preferences or {}
+        with span('catalog_filter'):
+            rows = self.catalog.select(
+                'all',
+                allergies=preferences.get('allergies'),
+                disliked_foods=preferences.get('disliked_foods')
+            )
+        with span('scoring'):
+            foods = self.catalog.take(rows)
+            scores = self.score_foods(foods, user_data, preferences)
+        
+        pools = {}
+        for meal_type in meal_types:
+            positions = np.flatnonzero(foods['meal_type'] == meal_type)
+            type_scores = scores[positions]
+            if self.model is not None:
+                type_scores = self.rerank(rows[positions], type_scores, user_data, top_n)
+            with span('sorting'):
+                top = self.select_top_n(type_scores, top_n)
+            pools[meal_type] = [
+                self.build_recommendation(foods, positions[i], type_scores[i]) for i in top
+            ]
+        
+        return pools
+    
+    def rank_meal_pools_many(self, users, meal_types, preferences=None, top_n=5, block_cells=1 << 22):
+        """rank_meal_pools for many users, scoring a users x foods matrix in blocks
+        
+        preferences is a list parallel to users (or None). The goal and activity
+        terms only depend on (dietary_goal, activity_level), so they are computed
+        once per distinct pair and gathered into each block of at most
+        block_cells scores. Returns one pools dict per user, identical to what
+        rank_meal_pools returns for that user.
+        """
+        preferences = preferences or [{}] * len(users)
+        n_foods = len(self.catalog)
+        foods = self.catalog.take(np.arange(n_foods))
+        positions = {meal_type: np.flatnonzero(foods['meal_type'] == meal_type) for meal_type in meal_types}
+        
+        groups = {}
+        group_of = np.array([
+            groups.setdefault((user.dietary_goal, user.activity_level), len(groups)) for user in users
+        ], dtype=np.intp)
+        profiles = [SimpleNamespace(dietary_goal=goal, activity_level=level) for goal, level in groups]
+        nutrition = np.array([self.nutritional_scores(foods, profile) for profile in profiles]).reshape(-1, n_foods)
+        activity = np.array([self.activity_scores(foods, profile) for profile in profiles]).reshape(-1, n_foods)
+        health = foods['health_score'] * 0.3
+        
+        all_pools = []
+        block = max(1, block_cells // max(n_foods, 1))
+        for start in range(0, len(users), block):
+            block_users = users[start:start + block]
+            block_preferences = preferences[start:start + block]
+            block_groups = group_of[start:start + block]
+            
+            # Same additions in the same order as score_foods, so scores match exactly
+            with span('scoring'):
+                scores = nutrition[block_groups]
+                for i, user_preferences in enumerate(block_preferences):
+                    if user_preferences:
+                        scores[i] += self.preference_scores(foods, user_preferences)
+                scores += health
+                scores += activity[block_groups]
+                np.maximum(scores, 0, out=scores)
+            
+            # Filtered foods score 0, which select_top_n never returns
+            with span('catalog_filter'):
+                for i, user_preferences in enumerate(block_preferences):
+                    user_preferences = user_preferences or {}
+                    if user_preferences.get('allergies') or user_preferences.get('disliked_foods'):
+                        allowed = np.zeros(n_foods, dtype=bool)
+                        allowed[self.catalog.select(
+                            'all',
+                            allergies=user_preferences.get('allergies'),
+                            disliked_foods=user_preferences.get('disliked_foods')
+                        )] = True
+                        scores[i, ~allowed] = 0
+            
+            predictions = {}
+            if self.model is not None:
+                records = [as_user_record(user) for user in block_users]
+                with span('model_inference'):
+                    for meal_type, type_positions in positions.items():
+                        predictions[meal_type] = self.model.predict_many(
+                            records, self.catalog.columns, food_rows=type_positions, cache_key=self.catalog
+                        )
+            
+            with span('sorting'):
+                for i in range(len(block_users)):
+                    pools = {}
+                    for meal_type, type_positions in positions.items():
+                        type_scores = scores[i, type_positions]
+                        if self.model is not None:
+                            pool = self.select_top_n(type_scores, top_n * self.rerank_pool_factor)
+                            reranked = np.zeros_like(type_scores)
+                            reranked[pool] = type_scores[pool] + self.rerank_weight * predictions[meal_type][i, pool]
+                            type_scores = reranked
+                        top = self.select_top_n(type_scores, top_n)
+                        pools[meal_type] = [
+                            self.build_recommendation(foods, type_positions[j], type_scores[j]) for j in top
+                        ]
+                    all_pools.append(pools)
+        
+        return all_pools
+    
+    def generate_weekly_meal_plan(self, user_id, user_data, days=7, preferences=None,
+                                  strategy='sample', targets=None):
+        """Generate a weekly meal plan
+        
+        strategy 'sample' picks each meal at random from the top 3 and scales
+        portions to the calorie target; 'optimize' lets the MealPlanner choose
+        meals that also fit the macro targets (see build_meal_plan).
+        """
+        pools = self.rank_meal_pools(user_data, self.MEAL_TYPES, preferences, top_n=self.pool_size(strategy))
+        with span('meal_planning'):
+            return self.build_meal_plan(pools, user_data, days, strategy, targets)
+    
+    def generate_meal_plans(self, users, days=7, preferences=None, strategy='sample', targets=None):
+        """generate_weekly_meal_plan for many users, with their pools ranked in one batch
+        
+        preferences and targets are lists parallel to users (or None).
+        """
+        targets = targets or [None] * len(users)
+        all_pools = self.rank_meal_pools_many(users, self.MEAL_TYPES, preferences, top_n=self.pool_size(strategy))
+        return [
+            self.build_meal_plan(pools, user_data, days, strategy, user_targets)
+            for pools, user_data, user_targets in zip(all_pools, users, targets)
+        ]
+    
+    def pool_size(self, strategy):
+        """Candidates per meal type a meal-plan strategy picks from"""
+        return self.meal_planner.candidates_per_meal if strategy == 'optimize' else 5
+    
+    def build_meal_plan(self, pools, user_data, days=7, strategy='sample', targets=None):
+        """Turn ranked meal pools into a {'Day N': {meal_type: meal}} plan
         
-        filtered = foods.copy()
-        for disliked in disliked_foods:
-            filtered = filtered[~filtered['name'].str.contains(disliked, case=False, na=False)]
+        targets is a dict like NutritionCalculator.calculate_daily_nutrition()
+        returns; without one only the Harris-Benedict calorie target is used.
+        """
+        if strategy == 'optimize':
+            if targets is None:
+                targets = {'daily_calories': self.calculate_daily_calories(user_data)}
+            return self.optimized_meal_plan(pools, targets, days)
         
-        return filtered
-    
-    def generate_weekly_meal_plan(self, user_id, user_data, days=7):
-        """Generate a weekly meal plan"""
         meal_plan = {}
-        
-        meal_types = ['breakfast', 'lunch', 'dinner', 'snack']
         total_calories_needed = self.calculate_daily_calories(user_data)
         
         for day in range(days):
             day_plan = {}
             day_calories = 0
             
-            for meal_type in meal_types:
-                # Get recommendations for this meal type
-                recommendations = self.get_recommendations(
-                    user_id, user_data, meal_type, top_n=5
-                )
+            for meal_type in self.MEAL_TYPES:
+                recommendations = pools[meal_type]
                 
                 if recommendations:
                     # Select a recommendation (could be random or based on score)
-                    selected = random.choice(recommendations[:3])
+                    selected = dict(random.choice(recommendations[:3]))
                     day_plan[meal_type] = selected
                     day_calories += selected['calories']
             
@@ -224,6 +486,21 @@ class FoodRecommender:
         
         return meal_plan
     
+    def optimized_meal_plan(self, pools, targets, days=7):
+        """Meal plan whose days the MealPlanner chose to hit calorie and macro targets"""
+        meal_plan = {}
+        for day, choice in enumerate(self.meal_planner.plan(pools, targets, days)):
+            day_plan = {}
+            portion = choice['portion']
+            for meal_type, index in choice['meals'].items():
+                meal = dict(pools[meal_type][index])
+                meal['adjusted_calories'] = meal['calories'] * portion
+                meal['portion_size'] = f"{portion:.1f}x"
+                day_plan[meal_type] = meal
+            meal_plan[f'Day {day + 1}'] = day_plan
+        
+        return meal_plan
+    
     def calculate_daily_calories(self, user_data):
         """Calculate daily calorie needs using Harris-Benedict formula"""
         if user_data.gender.lower() == 'male':
@@ -0,0 +1,128 @@
+import time
+from collections import Counter
+
+import numpy as np
+
+
+class MealPlanner:
+    """Beam-search meal planner that aims at daily calorie and macro targets
+
+    Each day is built meal type by meal type. Partial days are scored by
+    adding the average nutrition of the meal types still to come, and only
+    the beam_width cheapest partial days survive each step. The cost of a
+    day is the weighted squared relative error of its calories and macros
+    after a single portion factor (clamped to portion_range) is applied to
+    match calories, minus the foods' recommendation scores, plus penalties
+    for repeating a category within the day or a food within the plan.
+    Foods eaten in the last no_repeat_days days are excluded outright.
+
+    Planning stops widening the beam once time_budget_ms is used up, so the
+    remaining days fall back to greedy choices instead of running long.
+    """
+
+    MACROS = ['calories', 'protein', 'carbs', 'fat']
+    TARGET_KEYS = ['daily_calories', 'daily_protein', 'daily_carbs', 'daily_fat']
+    MACRO_WEIGHTS = np.array([1.0, 1.0, 0.5, 0.5])
+
+    def __init__(self, beam_width=32, candidates_per_meal=20, no_repeat_days=2,
+                 portion_range=(0.5, 2.0), preference_weight=0.1, variety_weight=0.05,
+                 repeat_weight=0.02, time_budget_ms=200):
+        self.beam_width = beam_width
+        self.candidates_per_meal = candidates_per_meal
+        self.no_repeat_days = no_repeat_days
+        self.portion_range = portion_range
+        self.preference_weight = preference_weight
+        self.variety_weight = variety_weight
+        self.repeat_weight = repeat_weight
+        self.time_budget_ms = time_budget_ms
+
+    def portions(self, totals, targets):
+        """Portion factor that brings each day's calories to target, clamped"""
+        calories = totals[..., 0]
+        factor = np.divide(targets[0], calories, out=np.ones_like(calories), where=calories > 0)
+        return np.clip(factor, *self.portion_range)
+
+    def nutrition_error(self, totals, targets):
+        """Weighted squared relative error of scaled totals against targets"""
+        scaled = totals * self.portions(totals, targets)[..., None]
+        present = targets > 0
+        relative = (scaled[..., present] - targets[present]) / targets[present]
+        return (self.MACRO_WEIGHTS[present] * relative ** 2).sum(axis=-1)
+
+    def plan(self, pools, targets, days):
+        """Pick one pool entry per meal type for each day
+
+        pools maps meal type to a ranked list of recommendation dicts (as from
+        FoodRecommender.rank_meal_pools); targets is a dict with daily_calories
+        and optionally daily_protein, daily_carbs and daily_fat. Returns one
+        {'meals': {meal_type: pool index}, 'portion': factor} per day.
+        """
+        meal_types = [meal_type for meal_type, pool in pools.items() if pool]
+        if not meal_types:
+            return [{'meals': {}, 'portion': 1.0} for _ in range(days)]
+
+        targets = np.array([float(targets.get(key) or 0) for key in self.TARGET_KEYS])
+        nutrition = {mt: np.array([[float(meal[m]) for m in self.MACROS] for meal in pools[mt]]) for mt in meal_types}
+        scores = {mt: np.array([float(meal['score']) for meal in pools[mt]]) for mt in meal_types}
+        food_ids = {mt: np.array([meal['food_id'] for meal in pools[mt]]) for mt in meal_types}
+
+        category_codes = {}
+        categories = {mt: np.array([
+            category_codes.setdefault(meal.get('category'), len(category_codes)) for meal in pools[mt]
+        ]) for mt in meal_types}
+
+        # Average nutrition still to come after each meal type, for scoring partial days
+        means = [nutrition[mt].mean(axis=0) for mt in meal_types]
+        remaining = [np.sum(means[j + 1:], axis=0) if j + 1 < len(means) else np.zeros(4) for j in range(len(means))]
+
+        deadline = time.perf_counter() + self.time_budget_ms / 1000
+        history = []
+        use_counts = Counter()
+        plan = []
+
+        for _ in range(days):
+            beam_width = self.beam_width if time.perf_counter() < deadline else 1
+            blocked = set().union(*history[-self.no_repeat_days:]) if self.no_repeat_days else set()
+
+            choices = np.zeros((1, 0), dtype=np.intp)
+            chosen_categories = np.zeros((1, 0), dtype=np.intp)
+            totals = np.zeros((1, 4))
+            preference = np.zeros(1)
+            penalty = np.zeros(1)
+
+            for j, mt in enumerate(meal_types):
+                allowed = np.flatnonzero([food_id not in blocked for food_id in food_ids[mt]])
+                if len(allowed) == 0:
+                    allowed = np.arange(len(pools[mt]))
+
+                new_totals = totals[:, None, :] + nutrition[mt][None, allowed, :]
+                new_preference = preference[:, None] + scores[mt][None, allowed]
+                duplicates = (chosen_categories[:, :, None] == categories[mt][None, None, allowed]).sum(axis=1)
+                repeats = np.array([use_counts[food_id] for food_id in food_ids[mt][allowed]])
+                new_penalty = (penalty[:, None] + self.variety_weight * duplicates
+                               + self.repeat_weight * repeats[None, :])
+
+                cost = (self.nutrition_error(new_totals + remaining[j], targets)
+                        - self.preference_weight * new_preference / len(meal_types)
+                        + new_penalty)
+
+                flat = cost.ravel()
+                keep = min(beam_width, len(flat))
+                best = np.argpartition(flat, keep - 1)[:keep]
+                best = best[np.argsort(flat[best], kind='stable')]
+                states, picks = np.unravel_index(best, cost.shape)
+
+                choices = np.column_stack([choices[states], allowed[picks]])
+                chosen_categories = np.column_stack([chosen_categories[states], categories[mt][allowed[picks]]])
+                totals = new_totals[states, picks]
+                preference = new_preference[states, picks]
+                penalty = new_penalty[states, picks]
+
+            # The beam is sorted by cost, so the first state is the best full day
+            day_choice = {mt: int(choices[0, j]) for j, mt in enumerate(meal_types)}
+            day_foods = {food_ids[mt][index] for mt, index in day_choice.items()}
+            history.append(day_foods)
+            use_counts.update(day_foods)
+            plan.append({'meals': day_choice, 'portion': float(self.portions(totals[0], targets))})
+
+        return plan
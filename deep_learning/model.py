@@ -6,12 +6,16 @@ import pandas as pd
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 import joblib
 
+from deep_learning.features import user_feature_matrix, food_feature_matrix, check_input_widths
+
 class FoodRecommendationModel:
     def __init__(self):
         self.model = None
         self.scaler = StandardScaler()
         self.label_encoders = {}
         self.feature_columns = []
+        # (catalog key, food feature matrix), replaced as one tuple so concurrent readers never mix them
+        self._food_features = (None, None)
         
     def build_model(self, input_shape, num_foods=100):
         """Build a hybrid recommendation model using neural networks"""
@@ -25,18 +29,18 @@ class FoodRecommendationModel:
         # User embedding
         user_dense = layers.Dense(64, activation='relu')(user_input)
         user_dense = layers.Dropout(0.2)(user_dense)
-        user_dense = layers.Dense(32, activation='relu')(user_dense)
+        user_dense = layers.Dense(32, activation='relu', name='user_tower')(user_dense)
         
         # Food embedding
         food_dense = layers.Dense(32, activation='relu')(food_input)
         food_dense = layers.Dropout(0.2)(food_dense)
-        food_dense = layers.Dense(16, activation='relu')(food_dense)
+        food_dense = layers.Dense(16, activation='relu', name='food_tower')(food_dense)
         
         # Concatenate user and food embeddings
-        merged = layers.Concatenate()([user_dense, food_dense])
+        merged = layers.Concatenate(name='tower_concat')([user_dense, food_dense])
         
         # Deep layers for interaction
-        merged = layers.Dense(64, activation='relu')(merged)
+        merged = layers.Dense(64, activation='relu', name='interaction')(merged)
         merged = layers.Dropout(0.3)(merged)
         merged = layers.Dense(32, activation='relu')(merged)
         merged = layers.Dropout(0.2)(merged)
@@ -144,14 +148,158 @@ class FoodRecommendationModel:
         prediction = self.model.predict([user_features, food_features])
         return prediction[0][0]
     
-    def save_model(self, path='models/food_recommender.h5'):
+    def user_feature_matrix(self, users):
+        """Scaled feature matrix for many user records at once"""
+        if 'gender' not in self.label_encoders:
+            self.label_encoders['gender'] = LabelEncoder()
+            self.label_encoders['gender'].fit(['male', 'female', 'other'])
+        
+        features = user_feature_matrix(users, self.label_encoders['gender'].classes_)
+        
+        # Scale features if scaler is fitted
+        if hasattr(self.scaler, 'mean_'):
+            features = self.scaler.transform(features).astype(np.float32)
+        
+        return features
+    
+    def food_feature_matrix(self, food_data, cache_key=None):
+        """Feature matrix for many foods, reused while cache_key stays the same object"""
+        cached_key, cached_features = self._food_features
+        if cache_key is not None and cache_key is cached_key:
+            return cached_features
+        
+        features = food_feature_matrix(food_data, self.label_encoders['category'].classes_)
+        
+        if cache_key is not None:
+            self._food_features = (cache_key, features)
+        
+        return features
+    
+    def predict_batch(self, user_data, food_data, food_rows=None, cache_key=None, batch_size=8192):
+        """Predict one user's preference for many foods in a single forward pass"""
+        return self.predict_many([user_data], food_data, food_rows, cache_key, batch_size)[0]
+    
+    def predict_many(self, users, food_data, food_rows=None, cache_key=None, batch_size=8192):
+        """Predict preferences for every (user, food) pair, shape (len(users), foods)
+        
+        food_rows optionally restricts the (cached) food feature matrix to a
+        subset of rows. Pairs are fed to the network batch_size at a time with
+        predict_on_batch, so small requests cost exactly one forward pass.
+        """
+        if self.model is None:
+            raise ValueError("Model not trained or loaded")
+        
+        food_features = self.food_feature_matrix(food_data, cache_key)
+        if food_rows is not None:
+            food_features = food_features[food_rows]
+        user_features = self.user_feature_matrix(users)
+        
+        n_users, n_foods = len(user_features), len(food_features)
+        scores = np.empty(n_users * n_foods, dtype=np.float32)
+        for start in range(0, len(scores), batch_size):
+            pairs = np.arange(start, min(start + batch_size, len(scores)))
+            prediction = self.model.predict_on_batch([
+                user_features[pairs // n_foods],
+                food_features[pairs % n_foods]
+            ])
+            scores[start:start + len(pairs)] = np.asarray(prediction).reshape(-1)
+        
+        return scores.reshape(n_users, n_foods)
+    
+    def _tower_layers(self):
+        """(user tower output, food tower output, Dense layers after the towers)
+        
+        Models saved before the towers were named are resolved through the
+        Concatenate layer that joins them.
+        """
+        concat = next(layer for layer in self.model.layers if isinstance(layer, layers.Concatenate))
+        user_output, food_output = concat.input
+        head = [
+            layer for layer in self.model.layers[self.model.layers.index(concat) + 1:]
+            if isinstance(layer, layers.Dense)
+        ]
+        return user_output, food_output, head
+    
+    def food_embeddings(self, food_data, batch_size=8192):
+        """Food-tower outputs (n_foods x 16) for a whole catalog"""
+        if self.model is None:
+            raise ValueError("Model not trained or loaded")
+        
+        _, food_output, _ = self._tower_layers()
+        food_tower = keras.Model(self.model.get_layer('food_features').output, food_output)
+        features = self.food_feature_matrix(food_data)
+        return food_tower.predict(features, batch_size=batch_size, verbose=0).astype(np.float32)
+    
+    def user_query_vectors(self, users):
+        """Query vectors in food-embedding space, one per user record
+        
+        The first interaction layer computes h = u @ W_u + f @ W_f + b for user
+        and food tower outputs u and f. Scoring foods by how well their
+        contribution f @ W_f aligns with the user's (u @ W_u + b) is a dot
+        product f . q with q = W_f @ (u @ W_u + b), which is what an
+        EmbeddingIndex can search; the full model then re-ranks the hits.
+        """
+        if self.model is None:
+            raise ValueError("Model not trained or loaded")
+        
+        user_output, _, head = self._tower_layers()
+        user_tower = keras.Model(self.model.get_layer('user_features').output, user_output)
+        user_embeddings = user_tower.predict(self.user_feature_matrix(users), verbose=0)
+        
+        kernel, bias = head[0].get_weights()
+        user_dim = user_output.shape[-1]
+        hidden = user_embeddings @ kernel[:user_dim] + bias
+        return (hidden @ kernel[user_dim:].T).astype(np.float32)
+    
+    def export_serving(self, path='models/food_recommender.npz'):
+        """Export dense weights, scaler and encoders for deep_learning.serving.NumpyFoodModel"""
+        if self.model is None:
+            raise ValueError("Model not trained or loaded")
+        
+        user_output, food_output, head = self._tower_layers()
+        branches = {
+            'user': keras.Model(self.model.get_layer('user_features').output, user_output).layers,
+            'food': keras.Model(self.model.get_layer('food_features').output, food_output).layers,
+            'head': head
+        }
+        
+        arrays = {}
+        for branch, branch_layers in branches.items():
+            dense_layers = [layer for layer in branch_layers if isinstance(layer, layers.Dense)]
+            for i, layer in enumerate(dense_layers):
+                kernel, bias = layer.get_weights()
+                arrays[f'{branch}_{i}_kernel'] = kernel
+                arrays[f'{branch}_{i}_bias'] = bias
+            arrays[f'{branch}_activations'] = np.array([layer.activation.__name__ for layer in dense_layers])
+        
+        if 'gender' not in self.label_encoders:
+            self.label_encoders['gender'] = LabelEncoder()
+            self.label_encoders['gender'].fit(['male', 'female', 'other'])
+        arrays['gender_classes'] = np.asarray(self.label_encoders['gender'].classes_, dtype=str)
+        arrays['category_classes'] = np.asarray(self.label_encoders['category'].classes_, dtype=str)
+        
+        if hasattr(self.scaler, 'mean_'):
+            arrays['scaler_mean'] = self.scaler.mean_.astype(np.float32)
+            arrays['scaler_scale'] = self.scaler.scale_.astype(np.float32)
+        
+        np.savez(path, **arrays)
+    
+    def save_model(self, path='models/food_recommender.h5', scaler_path='models/scaler.pkl',
+                   encoder_path='models/label_encoders.pkl'):
         """Save the trained model"""
         self.model.save(path)
-        joblib.dump(self.scaler, 'models/scaler.pkl')
-        joblib.dump(self.label_encoders, 'models/label_encoders.pkl')
+        joblib.dump(self.scaler, scaler_path)
+        joblib.dump(self.label_encoders, encoder_path)
     
-    def load_model(self, path='models/food_recommender.h5'):
-        """Load a trained model"""
-        self.model = keras.models.load_model(path)
-        self.scaler = joblib.load('models/scaler.pkl')
-        self.label_encoders = joblib.load('models/label_encoders.pkl')
\ No newline at end of file
+    def load_model(self, path='models/food_recommender.h5', scaler_path='models/scaler.pkl',
+                   encoder_path='models/label_encoders.pkl'):
+        """Load a trained model; raises ValueError if its inputs do not match the serving features"""
+        model = keras.models.load_model(path)
+        check_input_widths(
+            model.get_layer('user_features').output.shape[-1],
+            model.get_layer('food_features').output.shape[-1],
+            path
+        )
+        self.model = model
+        self.scaler = joblib.load(scaler_path)
+        self.label_encoders = joblib.load(encoder_path)
\ No newline at end of file
@@ -0,0 +1,158 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+# Local hours ([start, end)) in which a logged meal counts as on time; snacks fit anywhere
+MEAL_HOURS = {'breakfast': (5, 11), 'lunch': (11, 16), 'dinner': (17, 22)}
+MACROS = ['calories', 'protein', 'carbs', 'fat']
+
+
+class NutritionAnalyzer:
+    """Streaming aggregation of one user's food logs over the last window_days
+
+    Log rows are fed in chunks with add_logs(); only fixed-size per-day
+    totals, an hour histogram and the distinct foods of the shortest window
+    are kept, so memory does not grow with the length of a user's history.
+    Log timestamps are naive UTC; with tz (an IANA zone name) they are
+    converted to that zone's local time before they are bucketed into days
+    and meal hours.
+    """
+
+    WINDOWS = (7, 30)
+
+    def __init__(self, today=None, window_days=30, tz=None):
+        self.tz = tz if tz and tz != 'UTC' else None
+        if today is None:
+            today = datetime.now(ZoneInfo(self.tz)).date() if self.tz else datetime.utcnow().date()
+        self.today = np.datetime64(today, 'D')
+        self.window_days = window_days
+        self.daily = np.zeros((window_days, len(MACROS)))  # row i is today - i days
+        self.meals = np.zeros(window_days, dtype=np.int64)
+        self.on_time = 0
+        self.timed_meals = 0
+        self.late_meals = 0
+        self.recent_foods = set()
+        self.recent_logs = 0
+
+    def add_logs(self, rows):
+        """Fold a chunk of (timestamp, food_name, calories, protein, carbs, fat, meal_type) rows in"""
+        if not rows:
+            return
+        timestamps, food_names, calories, protein, carbs, fat, meal_types = zip(*rows)
+
+        stamps = np.array(timestamps, dtype='datetime64[s]')
+        if self.tz:
+            stamps = pd.DatetimeIndex(stamps).tz_localize('UTC').tz_convert(self.tz).tz_localize(None)\
+                .to_numpy().astype('datetime64[s]')
+        days = stamps.astype('datetime64[D]')
+        age = (self.today - days).astype(np.int64)
+        inside = (age >= 0) & (age < self.window_days)
+        if not inside.any():
+            return
+
+        macros = np.array([calories, protein, carbs, fat], dtype=float).T
+        np.add.at(self.daily, age[inside], np.nan_to_num(macros[inside]))
+        np.add.at(self.meals, age[inside], 1)
+
+        hours = ((stamps - days).astype('timedelta64[h]').astype(np.int64))[inside]
+        meal_types = np.array(meal_types, dtype=object)[inside]
+        for meal_type, (start, end) in MEAL_HOURS.items():
+            is_type = meal_types == meal_type
+            self.timed_meals += int(is_type.sum())
+            self.on_time += int((is_type & (hours >= start) & (hours < end)).sum())
+        self.late_meals += int(((hours >= 22) | (hours < 5)).sum())
+
+        recent = inside & (age < self.WINDOWS[0])
+        self.recent_logs += int(recent.sum())
+        self.recent_foods.update(np.array(food_names, dtype=object)[recent])
+
+    def window(self, days):
+        """Average daily intake over the logged days among the last days"""
+        logged = self.meals[:days] > 0
+        n_logged = int(logged.sum())
+        averages = self.daily[:days][logged].mean(axis=0) if n_logged else np.zeros(len(MACROS))
+        return {
+            'days_logged': n_logged,
+            'meals_logged': int(self.meals[:days].sum()),
+            **{f'avg_{macro}': round(float(value), 1) for macro, value in zip(MACROS, averages)}
+        }
+
+    def calorie_adherence(self, days, target):
+        """Mean closeness (0-100) of each logged day's calories to target"""
+        logged = self.meals[:days] > 0
+        if not logged.any() or target <= 0:
+            return None
+        error = np.abs(self.daily[:days, 0][logged] - target) / target
+        return round(float(np.clip(1 - error, 0, 1).mean() * 100))
+
+    def analyze(self, targets):
+        """Scores (0-100) and advice from the aggregated logs against daily targets"""
+        short, long = self.WINDOWS
+        windows = {f'{days}d': self.window(days) for days in self.WINDOWS}
+        recent = windows[f'{short}d']
+
+        if recent['days_logged'] == 0:
+            return {
+                'nutrition_score': None,
+                'windows': windows,
+                'recommendations': ['Log your meals for a few days to get a personalised analysis'],
+                'improvement_areas': []
+            }
+
+        # Energy split between protein, carbs and fat, actual vs target
+        energy = np.array([4.0, 4.0, 9.0])
+        target_grams = np.array([targets['daily_protein'], targets['daily_carbs'], targets['daily_fat']])
+        actual_grams = np.array([recent['avg_protein'], recent['avg_carbs'], recent['avg_fat']])
+        target_split = target_grams * energy / max((target_grams * energy).sum(), 1e-9)
+        actual_energy = actual_grams * energy
+        actual_split = actual_energy / actual_energy.sum() if actual_energy.sum() > 0 else np.zeros(3)
+
+        scores = {
+            'balance_score': 100 * (1 - 0.5 * np.abs(actual_split - target_split).sum()),
+            'protein_sufficiency': min(100.0, 100 * recent['avg_protein'] / max(targets['daily_protein'], 1e-9)),
+            'fat_balance': 100 * (1 - abs(actual_split[2] - target_split[2]) / max(target_split[2], 1e-9)),
+            'calorie_adherence': self.calorie_adherence(short, targets['daily_calories']),
+            'meal_timing': 100 * self.on_time / self.timed_meals if self.timed_meals else None,
+            'food_variety': 100 * len(self.recent_foods) / self.recent_logs,
+            'logging_consistency': 100 * recent['days_logged'] / short
+        }
+        scores = {name: None if value is None else int(round(float(np.clip(value, 0, 100))))
+                  for name, value in scores.items()}
+        present = [value for value in scores.values() if value is not None]
+
+        analysis = {
+            'nutrition_score': int(round(np.mean(present))),
+            **scores,
+            'windows': windows,
+            'calorie_trend': round(recent['avg_calories'] - windows[f'{long}d']['avg_calories'], 1)
+        }
+        analysis['recommendations'], analysis['improvement_areas'] = self.advice(analysis, actual_split, target_split)
+        return analysis
+
+    def advice(self, analysis, actual_split, target_split):
+        """Recommendations and improvement areas for the weakest scores"""
+        recommendations = []
+        areas = []
+
+        if analysis['protein_sufficiency'] < 80:
+            areas.append(f"Protein intake is {analysis['protein_sufficiency']}% of your daily target")
+            recommendations.append('Try to include protein in every meal')
+        if analysis['calorie_adherence'] is not None and analysis['calorie_adherence'] < 75:
+            recommendations.append('Plan meals ahead to keep daily calories closer to your target')
+        if analysis['balance_score'] < 75:
+            names = ['protein', 'carbs', 'fat']
+            worst = int(np.argmax(np.abs(actual_split - target_split)))
+            direction = 'above' if actual_split[worst] > target_split[worst] else 'below'
+            areas.append(f"Energy from {names[worst]} is {direction} your target share")
+        if analysis['meal_timing'] is not None and analysis['meal_timing'] < 70:
+            recommendations.append('Keep breakfast, lunch and dinner at regular times')
+        if self.late_meals:
+            areas.append(f"{self.late_meals} meals were logged late at night in the last {self.window_days} days")
+        if analysis['food_variety'] < 50:
+            recommendations.append('Add more variety to your meals this week')
+        if analysis['logging_consistency'] < 60:
+            recommendations.append('Log your meals every day for a more accurate analysis')
+
+        return recommendations, areas
@@ -1,8 +1,8 @@
-import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
+
+from deep_learning.nutrition_analysis import NutritionAnalyzer
+from instrumentation import span
 
 class NutritionCalculator:
     def __init__(self):
@@ -25,6 +25,10 @@ class NutritionCalculator:
     
     def calculate_daily_nutrition(self, user):
         """Calculate user's daily nutrition needs"""
+        with span('nutrition_targets'):
+            return self._daily_nutrition(user)
+    
+    def _daily_nutrition(self, user):
         # Default values to prevent crashes if user data is missing
         weight = user.weight if user.weight is not None else 70.0
         height = user.height if user.height is not None else 170.0
@@ -83,64 +87,58 @@ class NutritionCalculator:
             'tdee': round(tdee)
         }
     
-    def analyze_user_nutrition(self, user_id):
-        """Analyze user's nutrition intake patterns"""
-        # This would typically query the database for user's food logs
-        # For now, return sample analysis
+    def analyze_user_nutrition(self, user, log_chunks=None, today=None, tz=None):
+        """Analyze user's nutrition intake patterns
         
-        return {
-            'nutrition_score': 78,
-            'balance_score': 82,
-            'protein_sufficiency': 95,
-            'carb_quality': 65,
-            'fat_balance': 88,
-            'micronutrient_diversity': 72,
-            'meal_timing': 85,
-            'hydration': 90,
-            'recommendations': [
-                'Increase fiber intake by adding more vegetables',
-                'Consider reducing added sugars in snacks',
-                'Try to include protein in every meal',
-                'Drink water before each meal'
-            ],
-            'improvement_areas': [
-                'Vitamin D intake is below recommended levels',
-                'Omega-3 fatty acids could be increased'
-            ]
-        }
+        log_chunks is an iterable of row chunks as NutritionAnalyzer.add_logs
+        expects, normally the user's last 30 days of food logs streamed from
+        the database; the scores compare them with the user's daily targets.
+        Days and meal times are taken in timezone tz (default UTC).
+        """
+        analyzer = NutritionAnalyzer(today, window_days=max(NutritionAnalyzer.WINDOWS), tz=tz)
+        # Chunks are usually fetched lazily, so this span includes reading them
+        with span('log_aggregation'):
+            for chunk in log_chunks or []:
+                analyzer.add_logs(chunk)
+        
+        targets = self.calculate_daily_nutrition(user)
+        with span('nutrition_analysis'):
+            return analyzer.analyze(targets)
     
-    def calculate_nutrient_deficiencies(self, food_logs):
-        """Calculate nutrient deficiencies from food logs"""
-        nutrients = {
-            'protein': 0,
-            'carbs': 0,
-            'fat': 0,
-            'fiber': 0,
-            'calcium': 0,
-            'iron': 0,
-            'vitamin_c': 0,
-            'vitamin_d': 0
-        }
+    def calculate_nutrient_deficiencies(self, food_logs, gender='male'):
+        """Calculate nutrient deficiencies from food logs
         
-        # Sum nutrients from food logs
-        for log in food_logs:
-            nutrients['protein'] += log.protein or 0
-            nutrients['carbs'] += log.carbs or 0
-            nutrients['fat'] += log.fat or 0
+        food_logs is an iterable of log objects or a mapping of nutrient name
+        to an array of logged values. Genders other than male and female
+        ('other', unset) are compared with the average of the two.
+        """
+        nutrients = ['protein', 'carbs', 'fat', 'fiber', 'calcium', 'iron', 'vitamin_c', 'vitamin_d']
         
-        # Calculate deficiencies (simplified)
-        deficiencies = {}
-        requirements = self.nutrient_requirements
+        # Sum nutrients from food logs (logs only carry macros; the rest stay at 0)
+        if isinstance(food_logs, dict):
+            intake = np.array([np.nansum(np.asarray(food_logs.get(n, []), dtype=float)) for n in nutrients])
+        else:
+            logged = np.array([
+                (log.protein or 0, log.carbs or 0, log.fat or 0) for log in food_logs
+            ], dtype=float).reshape(-1, 3)
+            intake = np.concatenate([logged.sum(axis=0), np.zeros(len(nutrients) - 3)])
         
-        for nutrient, value in nutrients.items():
-            if nutrient in requirements:
-                required = requirements[nutrient]['male']  # Simplified
-                percentage = (value / required) * 100 if required > 0 else 100
-                deficiencies[nutrient] = {
-                    'intake': value,
-                    'required': required,
-                    'percentage': round(percentage, 1),
-                    'status': 'adequate' if percentage >= 90 else 'deficient' if percentage < 70 else 'moderate'
-                }
+        # Calculate deficiencies (simplified)
+        gender = (gender or '').lower()
+        requirements = {
+            n: values[gender] if gender in values else sum(values.values()) / len(values)
+            for n, values in self.nutrient_requirements.items()
+        }
+        required = np.array([requirements[n] for n in nutrients], dtype=float)
+        percentage = np.divide(intake * 100, required, out=np.full(len(nutrients), 100.0), where=required > 0)
+        status = np.select([percentage >= 90, percentage < 70], ['adequate', 'deficient'], 'moderate')
         
-        return deficiencies
\ No newline at end of file
+        return {
+            nutrient: {
+                'intake': float(intake[i]),
+                'required': requirements[nutrient],
+                'percentage': round(float(percentage[i]), 1),
+                'status': str(status[i])
+            }
+            for i, nutrient in enumerate(nutrients)
+        }
@@ -1,23 +1,46 @@
+import argparse
+import os
+import tempfile
+
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.model_selection import train_test_split
 import joblib
 
+from deep_learning.catalog_snapshot import read_food_table
+from deep_learning.features import food_feature_matrix, FOOD_FEATURE_COUNT
+
+NUMERIC_COLUMNS = ['calories', 'protein', 'carbs', 'fat', 'fiber', 'sugar']
+FEATURE_COLUMNS = ['calories', 'protein', 'carbs', 'fat', 'calorie_density', 'protein_ratio', 'health_score']
+CATEGORICAL_COLUMNS = ['category', 'cuisine', 'meal_type']
+
 class FoodDataPreprocessor:
     def __init__(self):
         self.scaler = StandardScaler()
         self.encoders = {}
+        self.medians = {}
+        # True once fitted for serving_food_features rather than encode_features
+        self.serving_features = False
         
     def load_and_clean_data(self, filepath):
         """Load and clean the food dataset"""
-        df = pd.read_csv(filepath)
+        df = read_food_table(filepath)
+        return self.clean_data(df)
+    
+    def clean_data(self, df, medians=None):
+        """Fill missing nutrients and add the derived features (modifies df)
         
+        Missing values are filled with medians (default: the medians of df,
+        which are kept in self.medians).
+        """
         # Handle missing values
-        numeric_cols = ['calories', 'protein', 'carbs', 'fat', 'fiber', 'sugar']
+        numeric_cols = [col for col in NUMERIC_COLUMNS if col in df.columns]
+        if medians is None:
+            medians = {col: df[col].median() for col in numeric_cols}
+            self.medians = medians
         for col in numeric_cols:
-            if col in df.columns:
-                df[col] = df[col].fillna(df[col].median())
+            df[col] = df[col].fillna(medians[col])
         
         # Create derived features
         df['calorie_density'] = df['calories'] / 100  # per 100g
@@ -27,57 +50,72 @@ class FoodDataPreprocessor:
         return df
     
     def calculate_health_score(self, df):
-        """Calculate health score for foods"""
-        scores = []
+        """Calculate health score for foods, one value per row
         
-        for _, row in df.iterrows():
-            score = 0
-            
-            # Higher protein is good
-            if row['protein'] > 20:
-                score += 0.3
-            elif row['protein'] > 10:
-                score += 0.15
-            
-            # Lower sugar is good
-            if 'sugar' in row:
-                if row['sugar'] < 10:
-                    score += 0.3
-                elif row['sugar'] < 20:
-                    score += 0.15
-            
-            # Fiber is good
-            if 'fiber' in row and row['fiber'] > 5:
-                score += 0.2
-            
-            # Balanced calories
-            if 200 < row['calories'] < 500:
-                score += 0.2
-            
-            scores.append(min(score, 1.0))  # Cap at 1.0
+        The terms are added in a fixed order so the result is bit-for-bit the
+        same as scoring each row on its own; missing values earn no points.
+        """
+        # Higher protein is good
+        protein = df['protein']
+        score = np.select([(protein > 20).to_numpy(), (protein > 10).to_numpy()], [0.3, 0.15], 0.0)
+        
+        # Lower sugar is good
+        if 'sugar' in df.columns:
+            sugar = df['sugar']
+            score += np.select([(sugar < 10).to_numpy(), (sugar < 20).to_numpy()], [0.3, 0.15], 0.0)
         
-        return scores
+        # Fiber is good
+        if 'fiber' in df.columns:
+            score += np.where((df['fiber'] > 5).to_numpy(), 0.2, 0.0)
+        
+        # Balanced calories
+        score += np.where(((df['calories'] > 200) & (df['calories'] < 500)).to_numpy(), 0.2, 0.0)
+        
+        return np.minimum(score, 1.0)  # Cap at 1.0
+    
+    def encode_features(self, df):
+        """Unscaled feature matrix of a cleaned DataFrame, with categoricals label-encoded
+        
+        Uses the encoders in self.encoders, so all chunks of a dataset get the
+        same codes.
+        """
+        feature_cols = list(FEATURE_COLUMNS)
+        for col in CATEGORICAL_COLUMNS:
+            if col in self.encoders and col in df.columns:
+                df[f'{col}_encoded'] = self.encoders[col].transform(df[col])
+                feature_cols.append(f'{col}_encoded')
+        
+        return df[feature_cols].values
+    
+    def fit_food_encoding(self, df):
+        """Fit the nutrient medians and category encoders serving_food_features uses"""
+        self.medians = {col: df[col].median() for col in NUMERIC_COLUMNS if col in df.columns}
+        self.serving_features = True
+        for col in CATEGORICAL_COLUMNS:
+            if col in df.columns:
+                self.encoders[col] = LabelEncoder().fit(df[col])
+    
+    def serving_food_features(self, df):
+        """Food rows as the model sees them at serving time (deep_learning.features.food_feature_matrix)
+        
+        Missing nutrients are filled with self.medians and anything still
+        missing becomes 0; the dataset's own health_score is kept. Not scaled,
+        like at serving time.
+        """
+        foods = {col: df[col].fillna(self.medians[col]) if col in self.medians else df[col] for col in df.columns}
+        features = food_feature_matrix(foods, self.encoders['category'].classes_)
+        return np.nan_to_num(features, nan=0.0)
     
     def prepare_training_data(self, df, user_interactions=None):
         """Prepare data for model training"""
-        # Prepare features
-        feature_cols = [
-            'calories', 'protein', 'carbs', 'fat',
-            'calorie_density', 'protein_ratio', 'health_score'
-        ]
-        
         # Add categorical features
-        categorical_cols = ['category', 'cuisine', 'meal_type']
-        for col in categorical_cols:
+        self.serving_features = False
+        for col in CATEGORICAL_COLUMNS:
             if col in df.columns:
-                self.encoders[col] = LabelEncoder()
-                df[f'{col}_encoded'] = self.encoders[col].fit_transform(df[col])
-                feature_cols.append(f'{col}_encoded')
-        
-        # Select features
-        X = df[feature_cols].values
+                self.encoders[col] = LabelEncoder().fit(df[col])
         
-        # Scale features
+        # Select and scale features
+        X = self.encode_features(df)
         X_scaled = self.scaler.fit_transform(X)
         
         # Create labels (simulated for training)
@@ -91,6 +129,127 @@ class FoodDataPreprocessor:
         
         return X_scaled, y
     
+    def build_feature_file(self, csv_path, features_path, labels_path=None, label_column=None,
+                           chunksize=100000, dtype=np.float64, medians=None, serving=False):
+        """prepare_training_data for a CSV larger than memory, into memory-mapped .npy files
+        
+        The CSV is read in chunks of chunksize rows, twice:
+        1. count the rows, collect every category and spill the nutrient
+           columns to temporary files for exact medians (one column at a time
+           is loaded to take its median; pass medians to skip this)
+        2. clean and encode each chunk, write it to features_path and update
+           the scaler statistics
+        The feature matrix is then standardized in place, block by block.
+        Labels come from label_column, or are simulated exactly like
+        prepare_training_data does, and go to labels_path. The results match
+        prepare_training_data on the whole file to floating-point rounding.
+        With serving=True the rows are serving_food_features instead (what
+        ModelTrainer.train_streaming reads) and are not standardized.
+        Returns (features, labels) opened read-only with mmap_mode='r'.
+        """
+        n_rows, n_features = self._fit_chunked(csv_path, chunksize, medians, serving)
+        self._write_chunked(csv_path, [(0, n_rows, features_path, labels_path)], n_features,
+                            chunksize, dtype, label_column, serving)
+        return (np.load(features_path, mmap_mode='r'),
+                np.load(labels_path, mmap_mode='r') if labels_path is not None else None)
+    
+    def build_feature_shards(self, csv_path, output_dir, shard_rows=1000000, label_column=None,
+                             chunksize=100000, dtype=np.float64, medians=None, serving=False):
+        """build_feature_file split into shards of at most shard_rows rows
+        
+        Writes features-00000.npy, labels-00000.npy, ... to output_dir, in
+        CSV row order (the streaming trainer reads these); returns the list
+        of (features_path, labels_path).
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        n_rows, n_features = self._fit_chunked(csv_path, chunksize, medians, serving)
+        shards = [
+            (start, min(start + shard_rows, n_rows),
+             os.path.join(output_dir, f'features-{i:05d}.npy'),
+             os.path.join(output_dir, f'labels-{i:05d}.npy'))
+            for i, start in enumerate(range(0, n_rows, shard_rows))
+        ]
+        self._write_chunked(csv_path, shards, n_features, chunksize, dtype, label_column, serving)
+        return [(features_path, labels_path) for _, _, features_path, labels_path in shards]
+    
+    def _fit_chunked(self, csv_path, chunksize, medians=None, serving=False):
+        """First pass of build_feature_file: fit medians and encoders; returns (rows, features)"""
+        header = pd.read_csv(csv_path, nrows=0).columns
+        numeric_cols = [col for col in NUMERIC_COLUMNS if col in header]
+        categorical_cols = [col for col in CATEGORICAL_COLUMNS if col in header]
+        
+        n_rows = 0
+        categories = {col: np.array([], dtype=object) for col in categorical_cols}
+        with tempfile.TemporaryDirectory() as spill_dir:
+            spill_paths = {col: os.path.join(spill_dir, f'{col}.f8') for col in numeric_cols}
+            spill_files = {col: open(path, 'wb') for col, path in spill_paths.items()} if medians is None else {}
+            try:
+                for chunk in pd.read_csv(csv_path, usecols=numeric_cols + categorical_cols, chunksize=chunksize):
+                    n_rows += len(chunk)
+                    for col in categorical_cols:
+                        categories[col] = pd.unique(np.concatenate([categories[col], chunk[col].to_numpy(dtype=object)]))
+                    for col, f in spill_files.items():
+                        chunk[col].to_numpy(dtype=np.float64).tofile(f)
+            finally:
+                for f in spill_files.values():
+                    f.close()
+            
+            if medians is None:
+                medians = {
+                    col: float(np.nanmedian(np.fromfile(path, dtype=np.float64))) if n_rows else np.nan
+                    for col, path in spill_paths.items()
+                }
+        self.medians = medians
+        self.encoders = {col: LabelEncoder().fit(values) for col, values in categories.items()}
+        self.scaler = StandardScaler()
+        self.serving_features = serving
+        if serving:
+            return n_rows, FOOD_FEATURE_COUNT
+        return n_rows, len(FEATURE_COLUMNS) + len(categorical_cols)
+    
+    def _write_chunked(self, csv_path, shards, n_features, chunksize, dtype, label_column=None, serving=False):
+        """Second pass of build_feature_file into shards of (start, end, features_path, labels_path)"""
+        outputs = []
+        for start, end, features_path, labels_path in shards:
+            features = np.lib.format.open_memmap(features_path, mode='w+', dtype=dtype, shape=(end - start, n_features))
+            labels = None
+            if labels_path is not None:
+                labels = np.lib.format.open_memmap(labels_path, mode='w+', dtype=np.int64, shape=(end - start,))
+            outputs.append((start, end, features, labels))
+        rng = np.random.RandomState(42)
+        
+        start = 0
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+            if serving:
+                X = self.serving_food_features(chunk)
+            else:
+                X = self.encode_features(self.clean_data(chunk, self.medians)).astype(np.float64)
+                self.scaler.partial_fit(X)
+            end = start + len(chunk)
+            y = None
+            if label_column:
+                y = chunk[label_column].to_numpy()
+            elif any(labels is not None for _, _, _, labels in outputs):
+                y = rng.randint(0, 2, size=len(chunk))
+            
+            # A chunk can straddle shard boundaries
+            for shard_start, shard_end, features, labels in outputs:
+                lo, hi = max(start, shard_start), min(end, shard_end)
+                if lo < hi:
+                    features[lo - shard_start:hi - shard_start] = X[lo - start:hi - start]
+                    if labels is not None:
+                        labels[lo - shard_start:hi - shard_start] = y[lo - start:hi - start]
+            start = end
+        
+        # Standardize in place with the statistics of the whole file (serving features are not scaled)
+        for _, _, features, labels in outputs:
+            if not serving:
+                for block in range(0, len(features), chunksize):
+                    features[block:block + chunksize] = self.scaler.transform(features[block:block + chunksize])
+            features.flush()
+            if labels is not None:
+                labels.flush()
+    
     def split_data(self, X, y, test_size=0.2, val_size=0.1):
         """Split data into train, validation, and test sets"""
         # First split: train+val vs test
@@ -110,11 +269,51 @@ class FoodDataPreprocessor:
         """Save the preprocessor for later use"""
         joblib.dump({
             'scaler': self.scaler,
-            'encoders': self.encoders
+            'encoders': self.encoders,
+            'medians': self.medians,
+            'serving_features': self.serving_features
         }, path)
     
     def load_preprocessor(self, path='models/preprocessor.pkl'):
         """Load a saved preprocessor"""
         data = joblib.load(path)
         self.scaler = data['scaler']
-        self.encoders = data['encoders']
\ No newline at end of file
+        self.encoders = data['encoders']
+        self.medians = data.get('medians', {})
+        self.serving_features = data.get('serving_features', False)
+
+def main():
+    """Preprocess a food CSV into memory-mapped feature and label .npy files"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('csv_path', nargs='?', default='deep_learning/data/food_dataset.csv')
+    parser.add_argument('--features', default='models/features.npy')
+    parser.add_argument('--labels', default='models/labels.npy')
+    parser.add_argument('--label-column', default=None, help='CSV column with the labels (default: simulated)')
+    parser.add_argument('--chunksize', type=int, default=100000)
+    parser.add_argument('--float32', action='store_true', help='store features as float32 (half the disk)')
+    parser.add_argument('--preprocessor', default='models/preprocessor.pkl')
+    parser.add_argument('--shards-dir', default=None,
+                        help='write features-NNNNN.npy/labels-NNNNN.npy shards here instead')
+    parser.add_argument('--shard-rows', type=int, default=1000000)
+    parser.add_argument('--serving-features', action='store_true',
+                        help='write the food features serving uses (required by train_model --shards-dir)')
+    args = parser.parse_args()
+    
+    preprocessor = FoodDataPreprocessor()
+    dtype = np.float32 if args.float32 else np.float64
+    if args.shards_dir:
+        shards = preprocessor.build_feature_shards(
+            args.csv_path, args.shards_dir, shard_rows=args.shard_rows, label_column=args.label_column,
+            chunksize=args.chunksize, dtype=dtype, serving=args.serving_features
+        )
+        print(f"Wrote {len(shards)} feature shards to {args.shards_dir}")
+    else:
+        features, _ = preprocessor.build_feature_file(
+            args.csv_path, args.features, args.labels, label_column=args.label_column,
+            chunksize=args.chunksize, dtype=dtype, serving=args.serving_features
+        )
+        print(f"Wrote {features.shape[0]} x {features.shape[1]} features to {args.features}")
+    preprocessor.save_preprocessor(args.preprocessor)
+
+if __name__ == '__main__':
+    main()
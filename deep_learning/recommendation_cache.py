@@ -0,0 +1,113 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class RecommendationCache:
+    """Thread-safe LRU cache of ranked recommendations with a TTL
+
+    Keys combine the user id, meal type, a per-user version counter, the
+    version of the data the ranking was computed from (catalog and model
+    artifacts) and a fingerprint of the profile and preferences used for
+    ranking, so a stale profile or catalog can never be served even if an
+    invalidation was missed (e.g. a write handled by another worker process,
+    or a ranking computed on the old recommender and stored after a swap).
+    """
+
+    PROFILE_FIELDS = ['age', 'gender', 'weight', 'height', 'activity_level', 'dietary_goal']
+
+    def __init__(self, max_size=1024, ttl=300, enabled=True):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.enabled = enabled and max_size > 0
+        self._entries = OrderedDict()
+        self._user_keys = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def make_key(self, user_id, meal_type, user_data, preferences=None, top_n=10, data_version=None):
+        """Build the cache key for one ranking request (data_version: any hashable)"""
+        profile = tuple(getattr(user_data, field, None) for field in self.PROFILE_FIELDS)
+        prefs = json.dumps(preferences or {}, sort_keys=True)
+        with self._lock:
+            version = self._versions.get(user_id, 0)
+        return (user_id, meal_type, top_n, version, data_version, hash((profile, prefs)))
+
+    def get(self, key):
+        """Return the cached ranking for key, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return [dict(rec) for rec in value]
+
+    def set(self, key, value):
+        """Store a ranking, evicting the least recently used entries if full"""
+        if not self.enabled:
+            return
+
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key not in self._entries:
+                self._user_keys.setdefault(key[0], set()).add(key)
+            self._entries[key] = (expires_at, [dict(rec) for rec in value])
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, user_id):
+        """Drop every cached ranking for a user after a profile or preference write"""
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            for key in list(self._user_keys.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        """Drop all cached rankings"""
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _remove(self, key):
+        """Remove one entry; caller must hold the lock"""
+        self._entries.pop(key, None)
+        user_keys = self._user_keys.get(key[0])
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self._user_keys[key[0]]
@@ -0,0 +1,137 @@
+import argparse
+
+import numpy as np
+
+from deep_learning.features import user_feature_matrix, food_feature_matrix, check_input_widths
+
+# Pure-NumPy serving runtime for FoodRecommendationModel. Weights are exported
+# with FoodRecommendationModel.export_serving(); this module must not import
+# TensorFlow, sklearn or joblib so web workers stay small and boot fast.
+
+ACTIVATIONS = {
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+    'linear': lambda x: x
+}
+
+
+class NumpyFoodModel:
+    """Inference-only twin of FoodRecommendationModel backed by exported weights"""
+
+    BRANCHES = ['user', 'food', 'head']
+
+    def __init__(self, path='models/food_recommender.npz'):
+        data = np.load(path)
+        self.path = path
+        self.layers = {branch: self._load_branch(data, branch) for branch in self.BRANCHES}
+        check_input_widths(self.layers['user'][0][0].shape[0], self.layers['food'][0][0].shape[0], path)
+        self.gender_classes = data['gender_classes']
+        self.category_classes = data['category_classes']
+        self.scaler_mean = data['scaler_mean'] if 'scaler_mean' in data else None
+        self.scaler_scale = data['scaler_scale'] if 'scaler_scale' in data else None
+
+        # The first head layer sees [user_embedding, food_embedding]
+        self.user_dim = self.layers['user'][-1][0].shape[1]
+        # (catalog key, food terms), replaced as one tuple so concurrent readers never mix them
+        self._food_cache = (None, None)
+
+    @staticmethod
+    def _load_branch(data, branch):
+        """[(kernel, bias, activation)] for one branch of the network"""
+        activations = [str(name) for name in data[f'{branch}_activations']]
+        return [
+            (data[f'{branch}_{i}_kernel'], data[f'{branch}_{i}_bias'], ACTIVATIONS[activation])
+            for i, activation in enumerate(activations)
+        ]
+
+    @staticmethod
+    def _forward(dense_layers, x):
+        """Run x through a stack of dense layers"""
+        for kernel, bias, activation in dense_layers:
+            x = activation(x @ kernel + bias)
+        return x
+
+    def user_feature_matrix(self, users):
+        """Scaled feature matrix for many user records at once"""
+        features = user_feature_matrix(users, self.gender_classes)
+        if self.scaler_mean is not None:
+            features = ((features - self.scaler_mean) / self.scaler_scale).astype(np.float32)
+        return features
+
+    def food_feature_matrix(self, food_data):
+        """Feature matrix for many foods"""
+        return food_feature_matrix(food_data, self.category_classes)
+
+    def food_embeddings(self, food_data):
+        """Food-tower outputs for a whole catalog"""
+        return self._forward(self.layers['food'], self.food_feature_matrix(food_data)).astype(np.float32)
+
+    def _food_terms(self, food_data, cache_key):
+        """Food embeddings and their first-head-layer contribution, cached per catalog"""
+        cached_key, cached_terms = self._food_cache
+        if cache_key is not None and cache_key is cached_key:
+            return cached_terms
+
+        embeddings = self.food_embeddings(food_data)
+        kernel = self.layers['head'][0][0]
+        terms = (embeddings, embeddings @ kernel[self.user_dim:])
+
+        if cache_key is not None:
+            self._food_cache = (cache_key, terms)
+        return terms
+
+    def user_query_vectors(self, users):
+        """Query vectors in food-embedding space (see FoodRecommendationModel.user_query_vectors)"""
+        kernel, bias, _ = self.layers['head'][0]
+        user_embeddings = self._forward(self.layers['user'], self.user_feature_matrix(users))
+        hidden = user_embeddings @ kernel[:self.user_dim] + bias
+        return (hidden @ kernel[self.user_dim:].T).astype(np.float32)
+
+    def predict_batch(self, user_data, food_data, food_rows=None, cache_key=None, batch_size=8192):
+        """Predict one user's preference for many foods"""
+        return self.predict_many([user_data], food_data, food_rows, cache_key, batch_size)[0]
+
+    def predict_many(self, users, food_data, food_rows=None, cache_key=None, batch_size=8192):
+        """Predict preferences for every (user, food) pair, shape (len(users), foods)
+
+        The towers run once per user and once per food; only the head layers
+        run per pair, batch_size pairs at a time.
+        """
+        _, food_contribution = self._food_terms(food_data, cache_key)
+        if food_rows is not None:
+            food_contribution = food_contribution[food_rows]
+
+        first_kernel, first_bias, first_activation = self.layers['head'][0]
+        user_embeddings = self._forward(self.layers['user'], self.user_feature_matrix(users))
+        user_contribution = user_embeddings @ first_kernel[:self.user_dim] + first_bias
+
+        n_foods = len(food_contribution)
+        block = max(1, batch_size // max(n_foods, 1))
+        scores = np.empty((len(users), n_foods), dtype=np.float32)
+        for start in range(0, len(users), block):
+            hidden = first_activation(
+                user_contribution[start:start + block, None, :] + food_contribution[None, :, :]
+            )
+            output = self._forward(self.layers['head'][1:], hidden)
+            scores[start:start + block] = output[..., 0]
+
+        return scores
+
+
+def main():
+    """Export a trained Keras model to the NumPy serving format"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--model', default='models/food_recommender.h5')
+    parser.add_argument('--out', default='models/food_recommender.npz')
+    args = parser.parse_args()
+
+    from deep_learning.model import FoodRecommendationModel
+
+    model = FoodRecommendationModel()
+    model.load_model(args.model)
+    model.export_serving(args.out)
+    print(f"Exported serving weights to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,24 +5,111 @@ import pandas as pd
 import matplotlib.pyplot as plt
 from sklearn.metrics import classification_report, confusion_matrix
 import seaborn as sns
+import argparse
+import glob
 import os
+import time
 
+from config import Config
+from deep_learning.catalog_snapshot import read_food_table
+from deep_learning.features import ACTIVITY_MAPPING, GOAL_MAPPING, USER_FEATURE_COUNT, FOOD_FEATURE_COUNT
 from deep_learning.model import FoodRecommendationModel
-from deep_learning.data.preprocess import FoodDataPreprocessor
+from deep_learning.preprocess import FoodDataPreprocessor
+
+class ThroughputCallback(keras.callbacks.Callback):
+    """Training throughput of each epoch in examples per second"""
+    
+    def __init__(self, examples_per_epoch):
+        super().__init__()
+        self.examples_per_epoch = examples_per_epoch
+        self.rates = []
+        self._started = None
+    
+    def on_epoch_begin(self, epoch, logs=None):
+        self._started = time.perf_counter()
+    
+    def on_epoch_end(self, epoch, logs=None):
+        rate = self.examples_per_epoch / (time.perf_counter() - self._started)
+        self.rates.append(rate)
+        print(f"Epoch {epoch + 1}: {rate:,.0f} examples/sec")
+
+def npy_data_offset(path):
+    """(byte offset of the data, shape, dtype) of a C-ordered .npy file"""
+    with open(path, 'rb') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        if fortran_order:
+            raise ValueError(f"{path} is Fortran ordered; feature shards must be C ordered")
+        return f.tell(), shape, dtype
+
+def simulated_users(n_users, seed=42):
+    """User records with random profiles, for pairing with foods in training"""
+    rng = np.random.RandomState(seed)
+    ages = rng.randint(18, 80, size=n_users)
+    genders = rng.choice(['male', 'female', 'other'], size=n_users, p=[0.48, 0.48, 0.04])
+    heights = rng.uniform(150, 200, size=n_users)
+    bmis = rng.uniform(18, 35, size=n_users)
+    activities = rng.choice(list(ACTIVITY_MAPPING), size=n_users)
+    goals = rng.choice(list(GOAL_MAPPING), size=n_users)
+    return [
+        {'age': int(age), 'gender': str(gender), 'weight': float(bmi * (height / 100) ** 2),
+         'height': float(height), 'activity_level': str(activity), 'dietary_goal': str(goal)}
+        for age, gender, height, bmi, activity, goal in zip(ages, genders, heights, bmis, activities, goals)
+    ]
 
 class ModelTrainer:
-    def __init__(self, data_path='deep_learning/data/food_dataset.csv'):
+    """Trains FoodRecommendationModel on the same features serving builds
+    
+    The dataset has foods but no users, so every example pairs a food
+    (FoodDataPreprocessor.serving_food_features) with one of n_users
+    simulated users (FoodRecommendationModel.user_feature_matrix, scaled by
+    the model's scaler); labels are simulated like
+    FoodDataPreprocessor.prepare_training_data does. The model, scaler and
+    encoders go to the configured serving paths and the NumPy serving model
+    is exported, so the app can re-rank with the result.
+    """
+    
+    def __init__(self, data_path='deep_learning/data/food_dataset.csv', model_path=Config.MODEL_PATH,
+                 scaler_path=Config.SCALER_PATH, encoder_path=Config.ENCODER_PATH,
+                 serving_path=Config.SERVING_MODEL_PATH, n_users=1000, pairs_per_food=10):
         self.data_path = data_path
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.encoder_path = encoder_path
+        self.serving_path = serving_path
+        self.n_users = n_users
+        self.pairs_per_food = pairs_per_food
         self.preprocessor = FoodDataPreprocessor()
         self.model = FoodRecommendationModel()
+        self.user_features = None
+        self.food_features = None
+        self.throughput = []
+    
+    def fit_users(self):
+        """Scaled features of the simulated users; fits the model's user scaler"""
+        features = self.model.user_feature_matrix(simulated_users(self.n_users))
+        self.model.scaler.fit(features)
+        self.user_features = self.model.scaler.transform(features).astype(np.float32)
         
     def prepare_data(self):
-        """Prepare data for training"""
-        # Load and clean data
-        df = self.preprocessor.load_and_clean_data(self.data_path)
+        """Prepare data for training; X holds (user index, food index) pairs"""
+        # Load the foods and encode them like serving does
+        df = read_food_table(self.data_path)
+        self.preprocessor.fit_food_encoding(df)
+        self.model.label_encoders['category'] = self.preprocessor.encoders['category']
+        self.food_features = self.preprocessor.serving_food_features(df).astype(np.float32)
+        self.fit_users()
+        
+        # Pair every food with pairs_per_food random users
+        rng = np.random.RandomState(42)
+        foods = np.repeat(np.arange(len(df)), self.pairs_per_food)
+        X = np.column_stack([rng.randint(0, self.n_users, size=len(foods)), foods])
         
-        # Prepare training data
-        X, y = self.preprocessor.prepare_training_data(df)
+        # Simulate user preferences; in a real scenario these would come from user interactions
+        y = rng.randint(0, 2, size=len(X))
         
         # Split data
         X_train, X_val, X_test, y_train, y_val, y_test = \
@@ -30,58 +117,218 @@ class ModelTrainer:
         
         return X_train, X_val, X_test, y_train, y_val, y_test, df
     
-    def train_model(self, epochs=50, batch_size=32):
-        """Train the recommendation model"""
-        # Prepare data
-        X_train, X_val, X_test, y_train, y_val, y_test, df = self.prepare_data()
-        
-        # Build model
-        input_shape = X_train.shape[1]
-        self.model.build_model(input_shape)
-        
-        # Setup callbacks
-        callbacks = [
+    def model_inputs(self, pairs):
+        """Model inputs for rows of (user index, food index) pairs"""
+        return {'user_features': self.user_features[pairs[:, 0]], 'food_features': self.food_features[pairs[:, 1]]}
+    
+    def save_serving_artifacts(self):
+        """Write the model, scaler and encoders to the configured paths and export the NumPy model"""
+        self.model.save_model(self.model_path, self.scaler_path, self.encoder_path)
+        self.model.export_serving(self.serving_path)
+    
+    def training_callbacks(self, validation=True):
+        """Early stopping, LR schedule and checkpointing, on validation metrics when there are any"""
+        prefix = 'val_' if validation else ''
+        return [
             keras.callbacks.EarlyStopping(
-                monitor='val_loss',
+                monitor=f'{prefix}loss',
                 patience=10,
                 restore_best_weights=True
             ),
             keras.callbacks.ReduceLROnPlateau(
-                monitor='val_loss',
+                monitor=f'{prefix}loss',
                 factor=0.5,
                 patience=5,
                 min_lr=1e-6
             ),
             keras.callbacks.ModelCheckpoint(
                 filepath='models/best_model.h5',
-                monitor='val_accuracy',
+                monitor=f'{prefix}accuracy',
                 save_best_only=True
             )
         ]
+    
+    def train_model(self, epochs=50, batch_size=32):
+        """Train the recommendation model"""
+        # Prepare data
+        X_train, X_val, X_test, y_train, y_val, y_test, df = self.prepare_data()
+        
+        # Build model
+        self.model.build_model(USER_FEATURE_COUNT)
+        
+        # Setup callbacks
+        throughput = ThroughputCallback(len(X_train))
+        callbacks = self.training_callbacks() + [throughput]
         
         # Train model
         print("Training model...")
         history = self.model.model.fit(
-            X_train, y_train,
-            validation_data=(X_val, y_val),
+            self.model_inputs(X_train), y_train,
+            validation_data=(self.model_inputs(X_val), y_val),
             epochs=epochs,
             batch_size=batch_size,
             callbacks=callbacks,
             verbose=1
         )
+        self.throughput = throughput.rates
         
         # Save model
-        self.model.save_model('models/food_recommender.h5')
+        self.save_serving_artifacts()
         self.preprocessor.save_preprocessor('models/preprocessor.pkl')
         
         return history, X_test, y_test
     
+    @staticmethod
+    def find_shards(shards_dir):
+        """(features_path, labels_path) pairs written by FoodDataPreprocessor.build_feature_shards"""
+        shards = []
+        for features_path in sorted(glob.glob(os.path.join(shards_dir, 'features-*.npy'))):
+            labels_path = os.path.join(shards_dir, os.path.basename(features_path).replace('features-', 'labels-'))
+            if not os.path.exists(labels_path):
+                raise FileNotFoundError(f"No labels for feature shard {features_path}")
+            shards.append((features_path, labels_path))
+        if not shards:
+            raise FileNotFoundError(f"No feature shards in {shards_dir}")
+        return shards
+    
+    def make_dataset(self, shards, batch_size=256, shuffle_buffer=10000, shuffle=True,
+                     cycle_length=4, num_parallel_calls=tf.data.AUTOTUNE, seed=42):
+        """tf.data pipeline streaming (inputs, labels) batches from .npy shards
+        
+        The shards hold serving food features (python -m deep_learning.preprocess
+        --serving-features); each row is paired with a random simulated user
+        (fit_users must have run). Rows are read straight from the files as
+        fixed-length records, so
+        only the shuffle buffer and a few batches are in memory. With shuffle,
+        the shard order is reshuffled every epoch, cycle_length shards are
+        read in parallel and interleaved, and rows are mixed in a buffer of
+        shuffle_buffer rows. Records are decoded a whole batch at a time in
+        parallel map calls, and batches are prefetched while the model trains.
+        Returns (dataset, number of rows).
+        """
+        feature_offsets, label_offsets = [], []
+        n_rows, n_features, dtype = 0, None, None
+        for features_path, labels_path in shards:
+            offset, shape, shard_dtype = npy_data_offset(features_path)
+            label_offset, label_shape, label_dtype = npy_data_offset(labels_path)
+            if (n_features, dtype) not in ((None, None), (shape[1], shard_dtype)):
+                raise ValueError(f"{features_path} does not match the other shards")
+            if label_shape != shape[:1] or label_dtype != np.int64:
+                raise ValueError(f"{labels_path} does not match {features_path}")
+            n_features, dtype = shape[1], shard_dtype
+            n_rows += shape[0]
+            feature_offsets.append(offset)
+            label_offsets.append(label_offset)
+        if n_features != FOOD_FEATURE_COUNT:
+            raise ValueError(
+                f"Feature shards have {n_features} columns; the food tower takes the {FOOD_FEATURE_COUNT} "
+                f"serving food features (build them with python -m deep_learning.preprocess --serving-features)"
+            )
+        
+        record_bytes = n_features * dtype.itemsize
+        tf_dtype = tf.as_dtype(dtype)
+        user_pool = tf.constant(self.user_features)
+        
+        def read_shard(features_path, feature_offset, labels_path, label_offset):
+            return tf.data.Dataset.zip((
+                tf.data.FixedLengthRecordDataset(features_path, record_bytes, header_bytes=feature_offset),
+                tf.data.FixedLengthRecordDataset(labels_path, 8, header_bytes=label_offset)
+            ))
+        
+        def decode(features, labels):
+            features = tf.cast(tf.io.decode_raw(features, tf_dtype), tf.float32)
+            labels = tf.cast(tf.reshape(tf.io.decode_raw(labels, tf.int64), [-1]), tf.float32)
+            users = tf.random.uniform(tf.shape(labels), maxval=len(self.user_features), dtype=tf.int32)
+            return {'user_features': tf.gather(user_pool, users), 'food_features': features}, labels
+        
+        files = tf.data.Dataset.from_tensor_slices((
+            [features_path for features_path, _ in shards],
+            tf.constant(feature_offsets, dtype=tf.int64),
+            [labels_path for _, labels_path in shards],
+            tf.constant(label_offsets, dtype=tf.int64)
+        ))
+        if shuffle:
+            files = files.shuffle(len(shards), seed=seed, reshuffle_each_iteration=True)
+        dataset = files.interleave(
+            read_shard,
+            cycle_length=min(cycle_length, len(shards)),
+            num_parallel_calls=num_parallel_calls,
+            deterministic=not shuffle
+        )
+        if shuffle:
+            dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+        dataset = dataset.batch(batch_size)
+        dataset = dataset.map(decode, num_parallel_calls=num_parallel_calls)
+        # Interleaving hides the length; Keras uses it for progress and epoch ends
+        dataset = dataset.apply(tf.data.experimental.assert_cardinality(-(-n_rows // batch_size)))
+        return dataset.prefetch(tf.data.AUTOTUNE), n_rows
+    
+    def train_streaming(self, shards_dir, epochs=50, batch_size=256, shuffle_buffer=10000,
+                        validation_shards=1, num_parallel_calls=tf.data.AUTOTUNE,
+                        preprocessor_path='models/preprocessor.pkl'):
+        """Train from feature shards on disk instead of in-memory arrays
+        
+        The category encoder comes from the preprocessor saved with the
+        shards. The last validation_shards shards are held out for validation
+        (none when there is only one shard). Per-epoch throughput is kept in
+        self.throughput, comparable with train_model's.
+        """
+        self.preprocessor.load_preprocessor(preprocessor_path)
+        if not self.preprocessor.serving_features:
+            raise ValueError(
+                f"{preprocessor_path} was not fitted for serving features; build the shards with "
+                f"python -m deep_learning.preprocess --serving-features"
+            )
+        self.model.label_encoders['category'] = self.preprocessor.encoders['category']
+        self.fit_users()
+        shards = self.find_shards(shards_dir)
+        validation_shards = min(validation_shards, len(shards) - 1)
+        train_shards = shards[:len(shards) - validation_shards]
+        val_shards = shards[len(train_shards):]
+        
+        train_data, n_train = self.make_dataset(
+            train_shards, batch_size, shuffle_buffer, num_parallel_calls=num_parallel_calls
+        )
+        val_data = None
+        if val_shards:
+            val_data, _ = self.make_dataset(
+                val_shards, batch_size, shuffle=False, num_parallel_calls=num_parallel_calls
+            )
+        
+        self.model.build_model(USER_FEATURE_COUNT)
+        throughput = ThroughputCallback(n_train)
+        callbacks = self.training_callbacks(validation=val_data is not None) + [throughput]
+        
+        print(f"Streaming {n_train} training rows from {len(train_shards)} shards...")
+        history = self.model.model.fit(
+            train_data,
+            validation_data=val_data,
+            epochs=epochs,
+            callbacks=callbacks,
+            verbose=1
+        )
+        self.throughput = throughput.rates
+        
+        self.save_serving_artifacts()
+        return history
+    
+    @staticmethod
+    def measure_input_throughput(dataset, max_batches=None):
+        """Examples per second of iterating a dataset once, without training"""
+        examples = 0
+        started = time.perf_counter()
+        for batch_number, (_, labels) in enumerate(dataset):
+            examples += int(labels.shape[0])
+            if max_batches is not None and batch_number + 1 >= max_batches:
+                break
+        return examples / (time.perf_counter() - started)
+    
     def evaluate_model(self, X_test, y_test):
         """Evaluate model performance"""
         print("\nEvaluating model...")
         
         # Make predictions
-        y_pred = self.model.model.predict(X_test)
+        y_pred = self.model.model.predict(self.model_inputs(X_test))
         y_pred_binary = (y_pred > 0.5).astype(int)
         
         # Calculate metrics
@@ -148,25 +395,49 @@ class ModelTrainer:
 
 def main():
     """Main training function"""
+    parser = argparse.ArgumentParser(description='Train the food recommendation model')
+    parser.add_argument('--epochs', type=int, default=30)
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='default: 32 in memory, 256 when streaming')
+    parser.add_argument('--shards-dir', default=None,
+                        help='stream features from these shards (python -m deep_learning.preprocess --serving-features --shards-dir)')
+    parser.add_argument('--shuffle-buffer', type=int, default=10000)
+    parser.add_argument('--validation-shards', type=int, default=1)
+    parser.add_argument('--users', type=int, default=1000, help='simulated users paired with the foods')
+    args = parser.parse_args()
+    
     print("Starting model training...")
     
     # Create models directory if it doesn't exist
     os.makedirs('models', exist_ok=True)
     
     # Initialize trainer
-    trainer = ModelTrainer()
-    
-    # Train model
-    history, X_test, y_test = trainer.train_model(epochs=30)
+    trainer = ModelTrainer(n_users=args.users)
     
-    # Evaluate model
-    metrics = trainer.evaluate_model(X_test, y_test)
+    if args.shards_dir:
+        history = trainer.train_streaming(
+            args.shards_dir,
+            epochs=args.epochs,
+            batch_size=args.batch_size or 256,
+            shuffle_buffer=args.shuffle_buffer,
+            validation_shards=args.validation_shards
+        )
+        metrics = None
+    else:
+        # Train model
+        history, X_test, y_test = trainer.train_model(epochs=args.epochs, batch_size=args.batch_size or 32)
+        
+        # Evaluate model
+        metrics = trainer.evaluate_model(X_test, y_test)
     
     # Plot training history
-    trainer.plot_training_history(history)
+    if 'val_accuracy' in history.history:
+        trainer.plot_training_history(history)
     
     print("\nTraining completed successfully!")
-    print(f"Model saved to: models/food_recommender.h5")
+    print(f"Model saved to: {trainer.model_path} (serving export: {trainer.serving_path})")
+    if trainer.throughput:
+        print(f"Throughput: {np.median(trainer.throughput):,.0f} examples/sec (median of {len(trainer.throughput)} epochs)")
     
     return metrics
 
@@ -0,0 +1,316 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as Tally
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Hot-path timing spans, Prometheus-format metrics and a sampling profiler for
+# slow requests. Everything here is per process: with several gunicorn workers
+# each one keeps (and serves on /metrics) its own counters.
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames, values):
+    if not labelnames:
+        return ''
+    pairs = []
+    for name, value in zip(labelnames, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return str(int(value))
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def lines(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f'{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(value)}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed values (seconds), optionally split by labels"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [count per bucket..., count in +Inf, sum]
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def lines(self):
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        labelnames = self.labelnames + ('le',)
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                yield f'{self.name}_bucket{_format_labels(labelnames, key + (_format_value(bound),))} {cumulative}'
+            labels = _format_labels(self.labelnames, key)
+            yield f'{self.name}_sum{labels} {_format_value(values[-1])}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class MetricsRegistry:
+    """Metrics of one process, rendered in the Prometheus text exposition format
+
+    Besides the counters and histograms created here, collectors are called
+    at scrape time and return (name, type, documentation, [(labels, value)])
+    families, which is how stats other components already keep (caches,
+    connection pools, queues) are exported without double bookkeeping.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+        return collector
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.lines())
+
+        for collector in self.collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                logger.error(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {str(e)}")
+                continue
+            for name, metric_type, documentation, samples in families:
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    labels = labels or {}
+                    lines.append(f'{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+SPAN_SECONDS = registry.histogram(
+    'foodai_span_duration_seconds', 'Time spent in instrumented hot-path sections', ['span']
+)
+
+_local = threading.local()
+
+
+def record_span(name, seconds):
+    """Record a finished span in the histogram and the current request's breakdown"""
+    SPAN_SECONDS.observe(seconds, span=name)
+    spans = getattr(_local, 'spans', None)
+    if spans is not None:
+        spans[name] = spans.get(name, 0.0) + seconds
+
+
+@contextmanager
+def span(name):
+    """Time a block (catalog filtering, scoring, a model call, ...) under name"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - started)
+
+
+def start_request():
+    """Begin collecting the spans of the request handled by this thread"""
+    _local.spans = {}
+
+
+def request_spans():
+    """{span name: seconds} recorded so far for the current request"""
+    return dict(getattr(_local, 'spans', None) or {})
+
+
+def finish_request():
+    """Stop collecting and return {span name: seconds} for the finished request"""
+    spans = getattr(_local, 'spans', None)
+    _local.spans = None
+    return spans or {}
+
+
+def server_timing(spans, total=None):
+    """Server-Timing header value for a request's span breakdown"""
+    entries = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in spans.items()]
+    if total is not None:
+        entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__') or os.path.basename(code.co_filename)
+    return f'{code.co_name} ({module}:{code.co_firstlineno})'
+
+
+def collapse_stack(frame):
+    """Stack of frame as one root-first, ';' separated line (the folded flamegraph format)"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class SlowRequestProfiler:
+    """Samples the stacks of in-flight requests and dumps the slow ones
+
+    While enabled, a daemon thread wakes every interval_ms and records the
+    current stack of every thread that is handling a request. When a request
+    finishes in more than threshold_ms its samples are written to output_dir
+    as collapsed stacks ("root;caller;callee count" per line), which
+    flamegraph.pl, speedscope and inferno read directly. Samples of fast
+    requests are discarded.
+    """
+
+    def __init__(self, output_dir, threshold_ms=500, interval_ms=5, enabled=False, max_dumps=100):
+        self.output_dir = output_dir
+        self.threshold_ms = threshold_ms
+        self.interval_ms = interval_ms
+        self.max_dumps = max_dumps
+        self.enabled = enabled
+        self.dumps = 0
+        self.samples_taken = 0
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        self._stop.set()
+
+    def ensure_started(self):
+        """Start the sampler thread (per process, so forked web workers each get one)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+                self._thread.start()
+
+    def begin(self):
+        """Start sampling the calling thread's request"""
+        if not self.enabled:
+            return
+        self.ensure_started()
+        with self._lock:
+            self._active[threading.get_ident()] = Tally()
+
+    def end(self, name, elapsed_seconds):
+        """Stop sampling the calling thread; returns the dump path if the request was slow"""
+        with self._lock:
+            stacks = self._active.pop(threading.get_ident(), None)
+        if not stacks or elapsed_seconds * 1000 < self.threshold_ms or self.dumps >= self.max_dumps:
+            return None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        safe_name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in name)
+        path = os.path.join(self.output_dir, f'{stamp}-{safe_name}-{elapsed_seconds * 1000:.0f}ms.folded')
+        with open(path, 'w') as f:
+            for stack, count in stacks.most_common():
+                f.write(f'{stack} {count}\n')
+        self.dumps += 1
+        logger.warning(f"Slow request {name} took {elapsed_seconds * 1000:.0f}ms; "
+                       f"{sum(stacks.values())} stack samples written to {path}")
+        return path
+
+    def sample(self):
+        """Record one stack sample of every thread that is handling a request"""
+        with self._lock:
+            if not self._active:
+                return
+            frames = sys._current_frames()
+            for ident, stacks in self._active.items():
+                frame = frames.get(ident)
+                if frame is not None:
+                    stacks[collapse_stack(frame)] += 1
+                    self.samples_taken += 1
+
+    def _run(self):
+        while self.enabled and not self._stop.wait(self.interval_ms / 1000):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"Profiler sample failed: {str(e)}")
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'threshold_ms': self.threshold_ms,
+            'interval_ms': self.interval_ms,
+            'in_flight': len(self._active),
+            'samples': self.samples_taken,
+            'dumps': self.dumps
+        }
@@ -64,8 +64,14 @@ echo "✓ Sample dataset created"
 echo "Initializing database..."
 python -c "
 from app import app, db
+from database.migrations import migrate
 with app.app_context():
     db.create_all()
+    connection = db.engine.raw_connection()
+    migrate(connection.driver_connection)
+    connection.close()
+    from database.catalog_store import CatalogStore
+    CatalogStore(db.engine.url.database).load_csv('deep_learning/data/food_dataset.csv')
     print('Database initialized')
 "
 
@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    """Wall-clock timings of the phases a worker goes through while starting up"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block (an import, a data load, ...) under name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.phases.append({
+                    'phase': name,
+                    'seconds': round(elapsed, 4),
+                    'thread': threading.current_thread().name
+                })
+            logger.info(f"Startup phase '{name}' took {elapsed:.3f}s")
+
+    def mark(self, name):
+        """Record the time elapsed since the report was created"""
+        with self._lock:
+            self.phases.append({
+                'phase': name,
+                'seconds': round(time.perf_counter() - self.started_at, 4),
+                'thread': threading.current_thread().name
+            })
+
+    def as_dict(self):
+        """Phases sorted slowest first"""
+        with self._lock:
+            phases = sorted(self.phases, key=lambda phase: phase['seconds'], reverse=True)
+        return {
+            'uptime_seconds': round(time.perf_counter() - self.started_at, 3),
+            'phases': phases
+        }
+
+
+class LazyComponent:
+    """Builds an expensive object on first use, exactly once, across threads
+
+    The factory runs the first time get() is called, or earlier in a
+    background thread if warm_up() is used; concurrent callers wait for the
+    same build instead of starting their own.
+    """
+
+    def __init__(self, name, factory, report=None):
+        self.name = name
+        self.factory = factory
+        self.report = report
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def get(self):
+        """Return the component, building it if needed"""
+        if self._loaded:
+            return self._value
+
+        with self._lock:
+            if not self._loaded:
+                if self.report is not None:
+                    with self.report.phase(f'build {self.name}'):
+                        self._value = self.factory()
+                else:
+                    self._value = self.factory()
+                self._loaded = True
+        return self._value
+
+    def swap(self, value):
+        """Replace the built component; callers already holding the old one keep it"""
+        with self._lock:
+            previous, self._value = self._value, value
+            self._loaded = True
+        return previous
+
+    def warm_up(self):
+        """Build the component in a daemon thread so the first request does not pay for it"""
+        def build():
+            try:
+                self.get()
+            except Exception as e:
+                logger.error(f"Warm-up of {self.name} failed: {str(e)}")
+
+        thread = threading.Thread(target=build, name=f'warmup-{self.name}', daemon=True)
+        thread.start()
+        return thread
@@ -27,6 +27,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
 function initializeRecommendationsPage() {
     setupRecommendationButtons();
+    setupFoodSearch();
     
     // Main "Find Food" button
     const findBtn = document.getElementById('getRecommendationsBtn');
@@ -65,6 +66,55 @@ function initializeRecommendationsPage() {
     loadRecentlyViewed();
 }
 
+function setupFoodSearch() {
+    const input = document.getElementById('foodSearchInput');
+    const resultsList = document.getElementById('foodSearchResults');
+    if (!input || !resultsList) return;
+
+    let debounceTimer = null;
+    let latestQuery = '';
+
+    input.addEventListener('input', () => {
+        clearTimeout(debounceTimer);
+        debounceTimer = setTimeout(() => searchFoods(input.value.trim()), 150);
+    });
+
+    async function searchFoods(query) {
+        latestQuery = query;
+        if (query.length < 2) {
+            resultsList.innerHTML = '';
+            return;
+        }
+
+        try {
+            const response = await fetch(`/search_foods?q=${encodeURIComponent(query)}&limit=8`);
+            const data = await response.json();
+            // Drop responses that arrive after the user has kept typing
+            if (query !== latestQuery) return;
+
+            resultsList.innerHTML = '';
+            if (!data.results || data.results.length === 0) {
+                resultsList.innerHTML = '<div class="list-group-item text-muted small">No foods found</div>';
+                return;
+            }
+
+            data.results.forEach(food => {
+                const item = document.createElement('button');
+                item.type = 'button';
+                item.className = 'list-group-item list-group-item-action d-flex justify-content-between align-items-center';
+                item.innerHTML = `
+                    <span><strong>${food.name}</strong> <small class="text-muted">${food.cuisine || ''} · ${food.category || ''}</small></span>
+                    <span class="badge bg-light text-dark">${Math.round(food.calories)} kcal</span>
+                `;
+                item.addEventListener('click', () => showFoodInfoModal(food));
+                resultsList.appendChild(item);
+            });
+        } catch (error) {
+            console.error('Error searching foods:', error);
+        }
+    }
+}
+
 async function loadFavorites() {
     try {
         const response = await fetch('/get_favorites');
@@ -298,12 +348,12 @@ async function loadUserStats() {
             bmi: 24.5
         };
 
-        // Simulate daily intake progress (since we don't have real intake data yet)
-        const intakeData = {
-            today_intake: 1850,
-            protein_intake: 75,
-            carbs_intake: 220,
-            fat_intake: 45
+        // Today's logged intake from the daily rollup (zeros before the first log)
+        const intakeData = window.userDailyIntake || {
+            today_intake: 0,
+            protein_intake: 0,
+            carbs_intake: 0,
+            fat_intake: 0
         };
 
         updateDashboardStats({ ...statsData, ...intakeData });
@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+from database.connection_pool import ConnectionPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), max_connections=1, timeout=0.2)
+    with pool.connection() as conn:
+        conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY)')
+        conn.commit()
+    yield pool
+    pool.close_all()
+
+
+def count(pool):
+    with pool.connection() as conn:
+        return conn.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+
+def test_nested_borrow_reuses_the_thread_connection(pool):
+    # With one connection a second checkout would time out instead
+    with pool.connection() as outer:
+        with pool.connection() as inner:
+            assert inner is outer
+            assert pool.stats()['in_use'] == 1
+        assert pool.stats()['in_use'] == 1
+    stats = pool.stats()
+    assert (stats['open'], stats['in_use'], stats['idle']) == (1, 0, 1)
+
+
+def test_nested_calls_share_one_transaction(pool):
+    with pool.connection() as outer:
+        outer.execute('INSERT INTO items DEFAULT VALUES')
+        with pool.connection() as inner:
+            inner.execute('INSERT INTO items DEFAULT VALUES')
+        # Leaving the inner borrow neither commits nor rolls back
+        assert outer.in_transaction
+        outer.commit()
+    assert count(pool) == 2
+
+
+def test_uncommitted_work_is_rolled_back_when_the_outermost_borrow_ends(pool):
+    with pool.connection() as outer:
+        with pool.connection() as inner:
+            inner.execute('INSERT INTO items DEFAULT VALUES')
+    assert count(pool) == 0
+
+
+def test_other_threads_wait_for_a_free_connection(pool):
+    errors = []
+
+    def borrow():
+        try:
+            with pool.connection():
+                pass
+        except TimeoutError as e:
+            errors.append(e)
+
+    with pool.connection():
+        thread = threading.Thread(target=borrow)
+        thread.start()
+        thread.join()
+
+    assert len(errors) == 1
+
+    thread = threading.Thread(target=borrow)
+    thread.start()
+    thread.join()
+    assert len(errors) == 1
@@ -0,0 +1,95 @@
+import os
+from datetime import date
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def app_module(tmp_path_factory):
+    """The app module on a fresh, migrated SQLite database"""
+    db_path = tmp_path_factory.mktemp('rollup') / 'app.db'
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    import app as app_module
+    from database.migrations import migrate
+
+    with app_module.app.app_context():
+        app_module.db.create_all()
+        connection = app_module.db.engine.raw_connection()
+        migrate(connection.driver_connection)
+        connection.close()
+    return app_module
+
+
+@pytest.fixture
+def user_id(app_module):
+    """A new user inside an app context"""
+    with app_module.app.app_context():
+        count = app_module.User.query.count()
+        user = app_module.User(username=f'user{count}', email=f'user{count}@example.com')
+        app_module.db.session.add(user)
+        app_module.db.session.commit()
+        yield user.id
+
+
+def rollup(app_module, user_id, day):
+    row = app_module.UserDailyNutrition.query.filter_by(user_id=user_id, day=day).one()
+    return row.calories, row.protein, row.meal_count
+
+
+def test_logs_add_up_in_one_row(app_module, user_id):
+    day = date(2024, 5, 1)
+    app_module.record_daily_intake(user_id, calories=300, protein=10, day=day)
+    app_module.record_daily_intake(user_id, calories=200, protein=5, meal_count=2, day=day)
+    app_module.db.session.commit()
+
+    assert rollup(app_module, user_id, day) == (500, 15, 3)
+
+
+def test_row_inserted_by_a_concurrent_request_is_incremented(app_module, user_id, monkeypatch):
+    day = date(2024, 5, 2)
+    session = app_module.db.session
+    begin_nested = session.begin_nested
+    raced = []
+
+    def insert_first():
+        # Another request creates the day's row between our UPDATE and INSERT
+        if not raced:
+            raced.append(True)
+            session.execute(app_module.db.text(
+                'INSERT INTO user_daily_nutrition (user_id, day, calories, protein, carbs, fat, meal_count) '
+                'VALUES (:user_id, :day, 400, 20, 0, 0, 1)'
+            ), {'user_id': user_id, 'day': day})
+        return begin_nested()
+
+    monkeypatch.setattr(session, 'begin_nested', insert_first)
+    app_module.record_daily_intake(user_id, calories=100, protein=5, day=day)
+    session.commit()
+
+    assert raced
+    assert rollup(app_module, user_id, day) == (500, 25, 2)
+
+
+def test_raises_when_the_row_cannot_be_recorded(app_module, user_id, monkeypatch):
+    day = date(2024, 5, 3)
+    query = app_module.UserDailyNutrition.query
+
+    class Vanishing:
+        """Every UPDATE misses and every INSERT conflicts"""
+
+        def filter_by(self, **kwargs):
+            return self
+
+        def update(self, *args, **kwargs):
+            return 0
+
+    def conflicting_insert():
+        raise app_module.IntegrityError('INSERT', {}, Exception('UNIQUE constraint failed'))
+
+    monkeypatch.setattr(app_module.UserDailyNutrition, 'query', Vanishing())
+    monkeypatch.setattr(app_module.db.session, 'begin_nested', conflicting_insert)
+
+    with pytest.raises(RuntimeError):
+        app_module.record_daily_intake(user_id, calories=100, day=day)
+    monkeypatch.undo()
+    app_module.db.session.rollback()
+    assert query.filter_by(user_id=user_id, day=day).count() == 0
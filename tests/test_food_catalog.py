@@ -0,0 +1,123 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from deep_learning.food_catalog import FoodCatalog, SubstringIndex
+
+ALPHABET = 'abcé ch-'
+ALLERGENS = ['', 'dairy', 'nuts', 'gluten', 'dairy, nuts', 'Gluten,Soy', 'tree nuts', 'soy, dairy,  ']
+
+
+def random_foods(rng, food_ids):
+    """DataFrame of foods with random names, allergens and nutrients"""
+    return pd.DataFrame({
+        'food_id': food_ids,
+        'name': [''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 12))) for _ in food_ids],
+        'category': [rng.choice(['Lunch', 'Dinner', 'Snack']) for _ in food_ids],
+        'cuisine': [rng.choice(['Asian', 'Italian', None]) for _ in food_ids],
+        'meal_type': [rng.choice(['breakfast', 'lunch', 'dinner']) for _ in food_ids],
+        'allergens': [rng.choice(ALLERGENS) for _ in food_ids],
+        'calories': [rng.uniform(50, 900) for _ in food_ids],
+        'protein': [rng.uniform(0, 60) for _ in food_ids],
+        'health_score': [rng.random() for _ in food_ids]
+    })
+
+
+def substrings(values, max_length=5):
+    """Every substring of values up to max_length characters, plus a few absent terms"""
+    terms = {value[i:j] for value in values for i in range(len(value))
+             for j in range(i + 1, min(len(value), i + max_length) + 1)}
+    return sorted(terms | {'zzz', 'ab c', 'éé'})
+
+
+def test_trigram_lookup_matches_substring_scan():
+    rng = random.Random(7)
+    values = np.array(
+        [''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 15))) for _ in range(300)],
+        dtype=object
+    )
+    index = SubstringIndex(values)
+
+    for term in substrings(values[:40]):
+        expected = [row for row, value in enumerate(values) if term in value]
+        assert index.lookup(term).tolist() == expected, term
+
+
+def test_trigram_lookup_does_not_match_across_rows():
+    index = SubstringIndex(np.array(['xab', 'cyz', 'abc'], dtype=object))
+
+    assert index.lookup('abc').tolist() == [2]
+    assert index.lookup('bcy').tolist() == []
+
+
+def test_allergen_mask_matches_comma_split_scan():
+    foods = random_foods(random.Random(3), list(range(1, 201)))
+    catalog = FoodCatalog(foods)
+    queries = [['nuts'], ['dairy, nuts'], ['SOY'], ['tree nuts', 'gluten'], ['dairy,'], [''], ['milk']]
+
+    for allergies in queries:
+        terms = [term.strip() for allergy in allergies for term in allergy.lower().split(',') if term.strip()]
+        expected = [
+            any(term in allergen.strip() for allergen in value.lower().split(',') if allergen.strip()
+                for term in terms)
+            for value in foods['allergens']
+        ]
+        assert catalog.allergen_mask(allergies).tolist() == expected, allergies
+
+
+def test_select_excludes_allergens_and_disliked_names():
+    foods = random_foods(random.Random(5), list(range(1, 101)))
+    catalog = FoodCatalog(foods)
+
+    rows = catalog.select('lunch', allergies=['dairy'], disliked_foods=['ch'])
+
+    expected = foods.index[
+        (foods['meal_type'] == 'lunch')
+        & ~foods['allergens'].str.lower().str.contains('dairy')
+        & ~foods['name'].str.lower().str.contains('ch')
+    ]
+    assert rows.tolist() == expected.tolist()
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_apply_changes_matches_dataframe_merge(seed):
+    rng = random.Random(seed)
+    base = random_foods(rng, rng.sample(range(1, 500), 120))
+    updated_ids = rng.sample(base['food_id'].tolist(), 30)
+    new_ids = rng.sample(sorted(set(range(500, 600))), 20)
+    upserts = random_foods(rng, updated_ids + new_ids)
+    deleted_ids = rng.sample(sorted(set(base['food_id']) - set(updated_ids)), 15) + new_ids[:3]
+
+    merged = FoodCatalog(base).apply_changes(upserts.to_dict('list'), deleted_ids)
+
+    # Updated foods keep their row, new foods are appended, deleted foods are dropped
+    incoming = upserts.set_index('food_id')
+    expected = base.set_index('food_id')
+    expected.loc[updated_ids] = incoming.loc[updated_ids]
+    expected = pd.concat([expected, incoming.loc[new_ids]])
+    expected = expected.drop(index=deleted_ids).reset_index()
+    expected['cuisine'] = expected['cuisine'].fillna('')
+
+    assert merged.columns['food_id'].tolist() == expected['food_id'].tolist()
+    for col in ['name', 'cuisine', 'meal_type', 'allergens']:
+        assert merged.columns[col].tolist() == expected[col].tolist(), col
+    for col in ['calories', 'protein', 'health_score']:
+        np.testing.assert_allclose(merged.columns[col], expected[col].to_numpy(dtype=float))
+
+    # Row indexes are rebuilt for the merged rows
+    rebuilt = FoodCatalog(expected)
+    assert merged.select('dinner', allergies=['nuts'], disliked_foods=['a']).tolist() == \
+        rebuilt.select('dinner', allergies=['nuts'], disliked_foods=['a']).tolist()
+
+
+def test_apply_changes_leaves_the_original_catalog_unchanged():
+    foods = random_foods(random.Random(9), [1, 2, 3])
+    catalog = FoodCatalog(foods)
+    names = catalog.columns['name'].tolist()
+
+    catalog.apply_changes({'food_id': [2, 4], 'name': ['new', 'added'], 'meal_type': ['lunch', 'lunch']}, [1])
+
+    assert catalog.columns['name'].tolist() == names
+    assert catalog.columns['food_id'].tolist() == [1, 2, 3]
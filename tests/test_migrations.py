@@ -0,0 +1,68 @@
+import sqlite3
+
+import pytest
+
+from database import migrations
+from database.migrations import MIGRATIONS, column_exists, migrate, schema_version
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """Database with the tables db.create_all() makes before any migration"""
+    conn = sqlite3.connect(tmp_path / 'app.db')
+    conn.execute('CREATE TABLE "user" (id INTEGER PRIMARY KEY, username VARCHAR(80))')
+    conn.execute('CREATE TABLE user_food_log (id INTEGER PRIMARY KEY, user_id INTEGER, timestamp DATETIME)')
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def schema(conn):
+    return sorted(conn.execute('SELECT type, name, sql FROM sqlite_master').fetchall(), key=str)
+
+
+def test_migrate_twice_is_a_no_op(conn):
+    assert migrate(conn) == len(MIGRATIONS)
+    migrated = schema(conn)
+
+    assert migrate(conn) == len(MIGRATIONS)
+    assert schema(conn) == migrated
+
+
+def test_migrate_finishes_a_half_migrated_database(conn):
+    migrate(conn)
+    # As left by a run that added the version columns but not the rest of migration 3
+    conn.execute('DROP TABLE foods_deleted')
+    conn.execute('DROP INDEX idx_foods_version')
+    conn.execute('PRAGMA user_version=2')
+    conn.commit()
+
+    assert migrate(conn) == len(MIGRATIONS)
+    assert column_exists(conn, 'foods', 'version')
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'foods_deleted'").fetchone()
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'idx_foods_version'").fetchone()
+
+
+def test_failing_migration_is_rolled_back(conn, monkeypatch):
+    migrate(conn)
+    monkeypatch.setattr(migrations, 'MIGRATIONS', MIGRATIONS + [[
+        'CREATE TABLE half_done (id INTEGER PRIMARY KEY)',
+        'ALTER TABLE missing_table ADD COLUMN x INTEGER'
+    ]])
+
+    with pytest.raises(sqlite3.OperationalError):
+        migrate(conn)
+
+    assert schema_version(conn) == len(MIGRATIONS)
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'half_done'").fetchone() is None
+
+
+def test_open_caller_transaction_is_committed_first(conn):
+    conn.execute("INSERT INTO \"user\" (username) VALUES ('ann')")
+    assert conn.in_transaction
+
+    migrate(conn)
+    conn.rollback()
+
+    assert conn.execute('SELECT username FROM "user"').fetchall() == [('ann',)]
+    assert conn.isolation_level == ''
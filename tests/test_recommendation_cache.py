@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+
+from deep_learning import recommendation_cache
+from deep_learning.recommendation_cache import RecommendationCache
+
+RANKING = [{'food_id': 1, 'name': 'Oatmeal', 'score': 0.9}]
+
+
+def profile(**overrides):
+    fields = dict(age=30, gender='female', weight=60, height=165, activity_level='active', dietary_goal='maintenance')
+    fields.update(overrides)
+    return SimpleNamespace(**fields)
+
+
+def test_hit_returns_a_copy():
+    cache = RecommendationCache()
+    key = cache.make_key(1, 'lunch', profile())
+    cache.set(key, RANKING)
+
+    cached = cache.get(key)
+    cached[0]['is_favorite'] = True
+
+    assert cache.get(key) == RANKING
+    assert cache.stats()['hits'] == 2
+
+
+def test_invalidate_drops_the_users_rankings_only():
+    cache = RecommendationCache()
+    mine = cache.make_key(1, 'lunch', profile())
+    theirs = cache.make_key(2, 'lunch', profile())
+    cache.set(mine, RANKING)
+    cache.set(theirs, RANKING)
+
+    cache.invalidate(1)
+
+    assert cache.get(mine) is None
+    assert cache.get(theirs) == RANKING
+    assert cache.get(cache.make_key(1, 'lunch', profile())) is None
+
+
+def test_ranking_stored_after_an_invalidation_is_not_served():
+    # A request computed its key before a preference write and stores after it
+    cache = RecommendationCache()
+    stale_key = cache.make_key(1, 'all', profile())
+    cache.invalidate(1)
+    cache.set(stale_key, RANKING)
+
+    assert cache.get(cache.make_key(1, 'all', profile())) is None
+
+
+def test_key_changes_with_profile_preferences_and_data_version():
+    cache = RecommendationCache()
+    key = cache.make_key(1, 'all', profile(), {'allergies': ['nuts']}, data_version=(3, 1))
+    cache.set(key, RANKING)
+
+    assert cache.get(cache.make_key(1, 'all', profile(), {'allergies': ['nuts']}, data_version=(3, 1))) == RANKING
+    assert cache.get(cache.make_key(1, 'all', profile(weight=58), {'allergies': ['nuts']}, data_version=(3, 1))) is None
+    assert cache.get(cache.make_key(1, 'all', profile(), {'allergies': ['dairy']}, data_version=(3, 1))) is None
+    assert cache.get(cache.make_key(1, 'all', profile(), {'allergies': ['nuts']}, data_version=(4, 1))) is None
+
+
+def test_clear_and_lru_eviction():
+    cache = RecommendationCache(max_size=2)
+    keys = [cache.make_key(user_id, 'all', profile()) for user_id in (1, 2, 3)]
+    cache.set(keys[0], RANKING)
+    cache.set(keys[1], RANKING)
+    cache.get(keys[0])
+    cache.set(keys[2], RANKING)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == RANKING
+    assert cache.stats()['evictions'] == 1
+
+    cache.clear()
+    assert cache.get(keys[0]) is None
+    assert cache.stats()['size'] == 0
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(recommendation_cache.time, 'monotonic', lambda: now[0])
+    cache = RecommendationCache(ttl=300)
+    key = cache.make_key(1, 'all', profile())
+    cache.set(key, RANKING)
+
+    now[0] += 299
+    assert cache.get(key) == RANKING
+    now[0] += 2
+    assert cache.get(key) is None
+    assert cache.stats()['size'] == 0